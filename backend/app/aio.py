@@ -0,0 +1,66 @@
+"""
+Асинхронный фасад над слоями онтологии и авторизации для маршрутов: те же функции,
+но каждый вызов выполняется в пуле потоков своего вида нагрузки (см. executors).
+Чтения проекции идут в пуле "read" по проекции, которую get_projection() привела
+к текущей версии графа: в цикле событий проекция не собирается и не обходится.
+"""
+from app import auth, bulk_import, graph_store, ontology, photo_store, projection
+from app.executors import offload, run_blocking
+from typing import Callable
+import functools
+
+async def get_projection() -> projection.Projection:
+    """Проекция текущей версии графа: версия проверяется в пуле чтений, устаревшая проекция собирается в пуле онтологии"""
+    current = await run_blocking("read", projection.current_projection)
+    if current is None:
+        current = await run_blocking("ontology", projection.get_projection)
+    return current
+
+def _read_pinned(p: projection.Projection, fn: Callable, args, kwargs):
+    with projection.pinned(p):
+        return fn(*args, **kwargs)
+
+async def read(p: projection.Projection, fn: Callable, *args, **kwargs):
+    """Выполняет чтение fn в пуле чтений по проекции p"""
+    return await run_blocking("read", _read_pinned, p, fn, args, kwargs)
+
+def offload_read(fn: Callable) -> Callable:
+    """Асинхронная обертка над чтением проекции: актуальная проекция, затем fn в пуле чтений"""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        return await read(await get_projection(), fn, *args, **kwargs)
+    return run
+
+# Записи онтологии, импорт и экспорт RDF/XML
+add_asana = offload("ontology", ontology.add_asana)
+add_asana_name = offload("ontology", ontology.add_asana_name)
+add_source = offload("ontology", ontology.add_source)
+add_photo_to_asana = offload("ontology", ontology.add_photo_to_asana)
+delete_asana_from_ontology = offload("ontology", ontology.delete_asana_from_ontology)
+delete_source_from_ontology = offload("ontology", ontology.delete_source_from_ontology)
+delete_asana_name_from_ontology = offload("ontology", ontology.delete_asana_name_from_ontology)
+migrate_base64_photos = offload("ontology", ontology.migrate_base64_photos)
+migrate_photo_dhashes = offload("ontology", ontology.migrate_photo_dhashes)
+parse_rows = offload("ontology", bulk_import.parse_rows)
+open_photo_archive = offload("ontology", bulk_import.open_photo_archive)
+import_catalog = offload("ontology", bulk_import.import_catalog)
+export_ontology = offload("ontology", graph_store.export_ontology)
+import_ontology = offload("ontology", graph_store.import_ontology)
+
+# Запись загруженного фото в хранилище (SHA-256, dHash, размеры) — до записи онтологии
+save_photo_file = offload("photo", photo_store.save_photo_file)
+
+# Чтения проекции вне кэша ответов (см. http_cache.cached_json)
+resolve_photo_target = offload_read(ontology.resolve_photo_target)
+search_asanas_by_name = offload_read(ontology.search_asanas_by_name)
+get_photo_of_asana_from_source = offload_read(ontology.get_photo_of_asana_from_source)
+find_photo_duplicates = offload_read(ontology.find_photo_duplicates)
+find_duplicates_of_photo = offload_read(ontology.find_duplicates_of_photo)
+find_duplicates_of_asana = offload_read(ontology.find_duplicates_of_asana)
+
+# Вход и смена пароля считают bcrypt; остальное — запросы к PostgreSQL
+authenticate_user = offload("auth", auth.authenticate_user)
+register_user = offload("auth", auth.register_user)
+reset_password_confirm = offload("auth", auth.reset_password_confirm)
+confirm_registration = offload("db", auth.confirm_registration)
+reset_password_request = offload("db", auth.reset_password_request)
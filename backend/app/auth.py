@@ -4,7 +4,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from app import config
+from app import config, executors
 from app.models import TokenData, User, UserRole
 import logging
 from sqlalchemy.orm import sessionmaker
@@ -29,11 +29,16 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(username: str, password: str):
-    logger.debug(f"Attempting to authenticate user: {username}")
+def find_user(username: str):
+    """Пользователь из базы по имени (блокирующий запрос — из async-кода вызывайте через пул "db")"""
     db = SessionLocal()
     user = db.query(User).filter(User.username == username).first()
     db.close()
+    return user
+
+def authenticate_user(username: str, password: str):
+    logger.debug(f"Attempting to authenticate user: {username}")
+    user = find_user(username)
     
     if not user:
         logger.warning(f"User not found: {username}")
@@ -78,9 +83,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             logger.warning("Token missing username claim")
             raise credentials_exception
             
-        db = SessionLocal()
-        user = db.query(User).filter(User.username == username).first()
-        db.close()
+        user = await executors.run_blocking("db", find_user, username)
         
         if user is None:
             logger.warning(f"User from token not found: {username}")
@@ -94,9 +97,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
 
 async def get_current_active_user(user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    db_user = db.query(User).filter(User.username == user).first()
-    db.close()
+    db_user = await executors.run_blocking("db", find_user, user)
     
     if not db_user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -106,10 +107,8 @@ async def get_current_active_user(user: str = Depends(get_current_user)):
         
     return user
 
-def is_admin(user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    db_user = db.query(User).filter(User.username == user).first()
-    db.close()
+async def is_admin(user: str = Depends(get_current_user)):
+    db_user = await executors.run_blocking("db", find_user, user)
     
     if not db_user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -122,10 +121,8 @@ def is_admin(user: str = Depends(get_current_user)):
         
     return user
 
-def is_expert_or_admin(user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    db_user = db.query(User).filter(User.username == user).first()
-    db.close()
+async def is_expert_or_admin(user: str = Depends(get_current_user)):
+    db_user = await executors.run_blocking("db", find_user, user)
     
     if not db_user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -305,8 +302,8 @@ def register_user(username: str, email: str, first_name: str, last_name: str, pa
     db.commit()
     db.close()
     
-    # Отправляем письмо с подтверждением
-    send_confirmation_email(email, confirmation_code)
+    # Письмо с подтверждением отправляется в пуле "email": регистрация не ждет SMTP-сессию
+    executors.submit("email", send_confirmation_email, email, confirmation_code)
     
     return {"username": username, "email": email}
 
@@ -342,8 +339,8 @@ def reset_password_request(email: str):
     db.commit()
     db.close()
     
-    # Отправляем письмо для сброса пароля
-    send_password_reset_email(email, reset_code)
+    # Письмо для сброса пароля отправляется в пуле "email", не задерживая ответ
+    executors.submit("email", send_password_reset_email, email, reset_code)
     
     return {"message": "Если указанный email зарегистрирован, на него отправлено письмо для сброса пароля"}
 
@@ -0,0 +1,149 @@
+from app import config, photo_store
+from app.graph_store import ASANA
+from app.ontology import bulk_add_asanas
+from app.resolver import resolve_uri
+from typing import BinaryIO, Dict, Any, List, Tuple, Optional
+import zipfile
+import logging
+import json
+import csv
+import io
+import os
+
+logger = logging.getLogger("asana_service.bulk_import")
+
+# Фото в архиве каталога: имя файла -> (архив, запись в архиве)
+PhotoArchive = Dict[str, Tuple[zipfile.ZipFile, zipfile.ZipInfo]]
+
+# Массовый импорт каталога: строки JSON Lines или CSV с полями
+#   name_id | name_ru, name_sanskrit, transliteration, definition
+#   source_id | source_title, source_author, source_year, source_publisher, source_pages, source_annotation
+#   photo — имя файла в ZIP-архиве с фотографиями
+NAME_FIELDS = {"name_ru": "name_ru", "name_sanskrit": "name_sanskrit", "transliteration": "transliteration", "definition": "definition"}
+SOURCE_FIELDS = {"source_title": "title", "source_author": "author", "source_year": "year",
+                 "source_publisher": "publisher", "source_pages": "pages", "source_annotation": "annotation"}
+
+def parse_rows(content: bytes, filename: str) -> List[Dict[str, Any]]:
+    """Разбирает файл каталога: CSV (по расширению .csv) или JSON Lines"""
+    text = content.decode("utf-8-sig")
+    if filename.lower().endswith(".csv"):
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    rows = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Строка {line_number}: некорректный JSON ({e.msg})")
+        if not isinstance(row, dict):
+            raise ValueError(f"Строка {line_number}: ожидается JSON-объект")
+        rows.append(row)
+    return rows
+
+def open_photo_archive(f: Optional[BinaryIO]) -> PhotoArchive:
+    """
+    Оглавление ZIP-архива с фото: имя файла (без каталогов внутри архива) -> (архив, запись).
+    Содержимое не распаковывается: фото, на которые ссылаются строки, потом читаются из архива потоком.
+    """
+    if f is None:
+        return {}
+    try:
+        archive = zipfile.ZipFile(f)
+    except zipfile.BadZipFile:
+        raise ValueError("Архив с фотографиями не является ZIP-файлом")
+    return {
+        os.path.basename(info.filename): (archive, info)
+        for info in archive.infolist()
+        if not info.is_dir() and os.path.basename(info.filename)
+    }
+
+def _text(row: Dict[str, Any], field: str) -> str:
+    value = row.get(field)
+    return str(value).strip() if value is not None else ""
+
+def _int(row: Dict[str, Any], field: str, errors: List[str]) -> Optional[int]:
+    value = _text(row, field)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        errors.append(f"{field}: ожидается целое число")
+        return None
+
+def _is_image(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bool:
+    """Изображение ли файл архива (по заголовку, без распаковки всего файла)"""
+    with archive.open(info) as member:
+        return photo_store.describe_image(member)["mime_type"].startswith("image/")
+
+def _save_archive_photo(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> Dict[str, Any]:
+    """Распаковывает фото из архива прямо в хранилище, кусками и с пределом PHOTO_MAX_BYTES"""
+    with archive.open(info) as member:
+        return photo_store.save_photo_file(member)
+
+def _validate_row(row: Dict[str, Any], photos: PhotoArchive) -> Tuple[Dict[str, Any], List[str]]:
+    errors = []
+    prepared: Dict[str, Any] = {}
+
+    name_id = _text(row, "name_id")
+    if name_id:
+        name_uri = resolve_uri(name_id, ASANA.AsanaName)
+        if name_uri is None:
+            errors.append(f"name_id: название {name_id} не найдено")
+        prepared["name_id"] = str(name_uri) if name_uri else None
+    elif _text(row, "name_ru"):
+        prepared["name_data"] = {key: _text(row, field) for field, key in NAME_FIELDS.items() if _text(row, field)}
+    else:
+        errors.append("нужно указать name_id или name_ru")
+
+    source_id = _text(row, "source_id")
+    if source_id:
+        source_uri = resolve_uri(source_id, ASANA.AsanaSource)
+        if source_uri is None:
+            errors.append(f"source_id: источник {source_id} не найден")
+        prepared["source_id"] = str(source_uri) if source_uri else None
+    elif all(_text(row, field) for field in ("source_title", "source_author", "source_year")):
+        source_data = {key: _text(row, field) for field, key in SOURCE_FIELDS.items() if _text(row, field)}
+        source_data["year"] = _int(row, "source_year", errors)
+        if "pages" in source_data:
+            source_data["pages"] = _int(row, "source_pages", errors)
+        prepared["source_data"] = source_data
+    else:
+        errors.append("нужно указать source_id или source_title, source_author и source_year")
+
+    photo_name = _text(row, "photo")
+    if not photo_name:
+        errors.append("photo: не указан файл фото")
+    elif photo_name not in photos:
+        errors.append(f"photo: файла {photo_name} нет в архиве")
+    elif config.PHOTO_MAX_BYTES and photos[photo_name][1].file_size > config.PHOTO_MAX_BYTES:
+        # Размер из оглавления архива: слишком большое фото отклоняется без распаковки
+        errors.append(f"photo: {photo_name} больше допустимого размера ({config.PHOTO_MAX_BYTES // (1024 * 1024)} МБ)")
+    elif not _is_image(*photos[photo_name]):
+        errors.append(f"photo: {photo_name} не является изображением")
+    prepared["photo"] = photo_name
+    return prepared, errors
+
+def import_catalog(rows: List[Dict[str, Any]], photos: PhotoArchive) -> Tuple[bool, List[Dict[str, Any]]]:
+    """
+    Проверяет все строки до изменения онтологии; если ошибок нет, сохраняет фото
+    и добавляет все асаны одной транзакцией. Возвращает (успех, результаты по строкам).
+    """
+    prepared_rows, results = [], []
+    for row_number, row in enumerate(rows, start=1):
+        prepared, errors = _validate_row(row, photos)
+        prepared_rows.append(prepared)
+        results.append({"row": row_number, "status": "error" if errors else "ok", "errors": errors})
+    if not rows or any(result["errors"] for result in results):
+        logger.warning(f"Bulk import rejected: {sum(1 for r in results if r['errors'])} of {len(rows)} rows invalid")
+        return False, results
+
+    # Распаковываются только фото, на которые ссылаются строки; одинаковые файлы — один раз
+    photo_meta = {name: _save_archive_photo(*photos[name]) for name in {row["photo"] for row in prepared_rows}}
+    for row in prepared_rows:
+        row["photo_meta"] = photo_meta[row["photo"]]
+    asana_ids = bulk_add_asanas(prepared_rows)
+    for result, asana_id in zip(results, asana_ids):
+        result["id"] = asana_id
+    return True, results
@@ -0,0 +1,19 @@
+from typing import Tuple
+
+# Русский алфавит в порядке словаря: Ё — отдельная буква между Е и Ж
+# (в Unicode "Ё" стоит раньше "А", поэтому обычная сортировка строк его сдвигает)
+RUSSIAN_ALPHABET = "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
+_LETTER_ORDER = {letter: i for i, letter in enumerate(RUSSIAN_ALPHABET)}
+
+def first_letter(text: str) -> str:
+    """Первая буква (названия или запроса) в виде ключа индекса: заглавная после приведения регистра"""
+    return (text or "").strip()[:1].casefold().upper()[:1]
+
+def letter_sort_key(letter: str) -> Tuple[int, str]:
+    """Кириллица по порядку алфавита, затем остальные символы по коду"""
+    order = _LETTER_ORDER.get(letter)
+    return (0, chr(order)) if order is not None else (1, letter)
+
+def sort_key(text: str) -> Tuple:
+    """Ключ сортировки названий: без учета регистра, с Ё сразу после Е"""
+    return tuple(letter_sort_key(letter) for letter in text.strip().casefold().upper())
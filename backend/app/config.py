@@ -7,8 +7,63 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key_here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-# Создаем путь к файлу онтологии внутри контейнера
-OWL_FILE_PATH = "/app/ontology_updated.owl"
+# Создаем путь к файлу онтологии внутри контейнера. Контрольная точка заменяет файл переименованием,
+# поэтому в контейнер монтируется каталог с файлом, а не сам файл
+OWL_FILE_PATH = os.getenv("OWL_FILE_PATH", "/app/ontology_updated.owl")
+# Начальная онтология: копируется в OWL_FILE_PATH, если его еще нет (например, файл прежнего монтирования)
+OWL_SEED_PATH = os.getenv("OWL_SEED_PATH", "")
+
+# Хранилище онтологии: "file" — RDF/XML с журналом изменений, "sqlite" — индексированная база триплетов
+ONTOLOGY_STORAGE = os.getenv("ONTOLOGY_STORAGE", "file")
+ONTOLOGY_SQLITE_PATH = os.getenv("ONTOLOGY_SQLITE_PATH", "/app/data/ontology.sqlite3")
+
+# Журнал изменений онтологии и условия записи контрольной точки (полного RDF/XML)
+OWL_JOURNAL_PATH = os.getenv("OWL_JOURNAL_PATH", f"{OWL_FILE_PATH}.journal")
+JOURNAL_CHECKPOINT_BYTES = int(os.getenv("JOURNAL_CHECKPOINT_BYTES", str(8 * 1024 * 1024)))
+JOURNAL_CHECKPOINT_INTERVAL = float(os.getenv("JOURNAL_CHECKPOINT_INTERVAL", "600"))
+
+# Групповая запись: транзакции, пришедшие в течение окна (в секундах), сохраняются одной записью
+# на диск, и каждый вызов ждет сохранения своей группы. 0 — каждая транзакция сохраняется сразу.
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", "0"))
+# Группа сохраняется раньше окончания окна, если в ней набралось столько транзакций
+GROUP_COMMIT_MAX_OPS = int(os.getenv("GROUP_COMMIT_MAX_OPS", "64"))
+
+# Бинарный снимок графа для быстрого старта (пересоздается при изменении файла онтологии)
+OWL_SNAPSHOT_PATH = os.getenv("OWL_SNAPSHOT_PATH", f"{OWL_FILE_PATH}.snapshot")
+
+# Хранилище фото (файлы по SHA-256 содержимого)
+PHOTO_STORE_DIR = os.getenv("PHOTO_STORE_DIR", "/app/data/photos")
+
+# Уменьшенные копии фото (ширина в пикселях) и число потоков, которые их готовят
+PHOTO_THUMBNAIL_WIDTH = int(os.getenv("PHOTO_THUMBNAIL_WIDTH", "320"))
+PHOTO_MEDIUM_WIDTH = int(os.getenv("PHOTO_MEDIUM_WIDTH", "1024"))
+PHOTO_VARIANT_WORKERS = int(os.getenv("PHOTO_VARIANT_WORKERS", "2"))
+
+# Загрузка фото: предельный размер одного фото, всего тела запроса с файлами и размер куска
+# при потоковой записи в хранилище (байты)
+PHOTO_MAX_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+PHOTO_CHUNK_BYTES = int(os.getenv("PHOTO_CHUNK_BYTES", str(1024 * 1024)))
+
+# Почти дубликаты фото: наибольшее расстояние Хэмминга между 64-битными dHash
+PHOTO_DUPLICATE_DISTANCE = int(os.getenv("PHOTO_DUPLICATE_DISTANCE", "10"))
+
+# Кэш готовых (сериализованных и сжатых) JSON-ответов на чтения онтологии: бюджет памяти в байтах, 0 — без кэша
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Пулы потоков для блокирующей работы вне цикла событий (см. executors): записи, импорт и экспорт
+# онтологии; ответы из проекции (сборка и сериализация JSON); запись и хэширование загруженных фото;
+# запросы к PostgreSQL; bcrypt при входе и регистрации; отправка писем.
+# При групповой записи пул онтологии не меньше GROUP_COMMIT_MAX_OPS.
+ONTOLOGY_WORKERS = int(os.getenv("ONTOLOGY_WORKERS", "2"))
+READ_WORKERS = int(os.getenv("READ_WORKERS", "4"))
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", str(min(4, os.cpu_count() or 1))))
+DB_WORKERS = int(os.getenv("DB_WORKERS", "8"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+
+# Как часто (в секундах) проверять, не изменились ли файлы онтологии снаружи процесса
+GRAPH_RELOAD_CHECK_INTERVAL = float(os.getenv("GRAPH_RELOAD_CHECK_INTERVAL", "2.0"))
 
 # Настройка логирования
 logging.basicConfig(
@@ -0,0 +1,72 @@
+from app import config
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+import functools
+import threading
+import asyncio
+import logging
+
+logger = logging.getLogger("asana_service.executors")
+
+# Все маршруты — async def, а онтология (rdflib), PostgreSQL (SQLAlchemy), bcrypt и smtplib
+# блокируют поток. Такая работа выполняется в пулах потоков, отдельных для каждого вида нагрузки,
+# чтобы долгая запись онтологии или SMTP-сессия не занимали потоки, нужные входу пользователей,
+# и не останавливали цикл событий. Процессы не подходят: граф онтологии общий для процесса,
+# а bcrypt, драйвер PostgreSQL и сокеты отпускают GIL.
+POOL_SIZES = {
+    # Транзакции одной группы ждут ее сохранения каждая в своем потоке: меньший пул
+    # ограничил бы группу числом потоков
+    "ontology": (max(config.ONTOLOGY_WORKERS, config.GROUP_COMMIT_MAX_OPS) if config.GROUP_COMMIT_WINDOW > 0
+                 else config.ONTOLOGY_WORKERS),
+    # Чтения проекции не ждут в очереди за записями онтологии
+    "read": config.READ_WORKERS,
+    # Запись загруженных фото в хранилище и их хэши не занимают потоки записей онтологии
+    "photo": config.PHOTO_WORKERS,
+    # Уменьшенные копии фото готовятся в фоне и не задерживают загрузку новых фото
+    "variants": config.PHOTO_VARIANT_WORKERS,
+    "db": config.DB_WORKERS,
+    "auth": config.AUTH_WORKERS,
+    "email": config.EMAIL_WORKERS
+}
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(kind: str) -> ThreadPoolExecutor:
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=POOL_SIZES[kind], thread_name_prefix=f"{kind}-worker")
+                _pools[kind] = pool
+    return pool
+
+async def run_blocking(kind: str, fn: Callable, *args, **kwargs) -> Any:
+    """Выполняет блокирующую функцию в пуле kind и дожидается результата, не занимая цикл событий"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(kind), functools.partial(fn, *args, **kwargs))
+
+def offload(kind: str, fn: Callable) -> Callable:
+    """Асинхронная обертка над блокирующей функцией: каждый вызов уходит в пул kind"""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        return await run_blocking(kind, fn, *args, **kwargs)
+    return run
+
+def submit(kind: str, fn: Callable, *args, **kwargs) -> Future:
+    """Ставит работу в пул kind без ожидания результата (ошибки только пишутся в лог)"""
+    def log_error(future: Future):
+        if future.exception() is not None:
+            logger.error(f"Background {kind} task {fn.__name__} failed: {str(future.exception())}")
+    future = get_pool(kind).submit(fn, *args, **kwargs)
+    future.add_done_callback(log_error)
+    return future
+
+def shutdown():
+    """Дожидается работы, уже поставленной в пулы (при остановке приложения)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
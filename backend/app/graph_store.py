@@ -0,0 +1,536 @@
+from rdflib import Graph, Namespace, BNode, Literal, RDF
+from app import config, snapshot
+from app.sqlite_store import SQLiteStore
+from contextlib import contextmanager
+import threading
+import logging
+import shutil
+import time
+import os
+
+logger = logging.getLogger("asana_service.graph_store")
+
+ASANA = Namespace("http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#")
+
+# Граф живёт в памяти процесса и перечитывается с диска только при изменении файлов.
+# Изменения дописываются в журнал (N-Triples с префиксом "+"/"-"), а полный RDF/XML
+# переписывается только при контрольной точке.
+# При ONTOLOGY_STORAGE=sqlite граф работает поверх SQLiteStore: файлы не перечитываются,
+# а версия берется из счетчика коммитов в базе.
+_lock = threading.RLock()
+_graph: Graph | None = None
+_file_signature: tuple | None = None
+_write_counter = 0
+_last_check = 0.0
+_last_checkpoint = time.monotonic()
+# Подписчики на успешные записи: fn(old_version, new_version, records); records=None — граф заменен целиком
+_commit_listeners = []
+
+class _CommitBatch:
+    """Группа транзакций, которые уже применены к графу в памяти и ждут общего сохранения на диск"""
+
+    def __init__(self):
+        self.records = []
+        self.transactions = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+# Текущая несохраненная группа (только при GROUP_COMMIT_WINDOW > 0)
+_batch: _CommitBatch | None = None
+# Писатели, которые вошли в graph_transaction, но еще не добавили изменения в группу
+_writers_waiting = 0
+_writers_lock = threading.Lock()
+# Поток внутри graph_transaction(): его чтения видят собственные несохраненные изменения
+_transaction_state = threading.local()
+
+def ensure_ontology_file_exists():
+    """Создает файл онтологии, если он не существует"""
+    try:
+        if not os.path.exists(config.OWL_FILE_PATH) and config.OWL_SEED_PATH and os.path.exists(config.OWL_SEED_PATH):
+            logger.info(f"Copying initial ontology from {config.OWL_SEED_PATH} to {config.OWL_FILE_PATH}")
+            os.makedirs(os.path.dirname(config.OWL_FILE_PATH), exist_ok=True)
+            shutil.copyfile(config.OWL_SEED_PATH, config.OWL_FILE_PATH)
+        if not os.path.exists(config.OWL_FILE_PATH):
+            logger.info(f"Creating new ontology file at {config.OWL_FILE_PATH}")
+            # Создаем базовый граф с основными классами
+            g = Graph()
+            g.bind("asana", ASANA)
+
+            # Добавляем основные классы
+            g.add((ASANA.Asana, RDF.type, RDF.Class))
+            g.add((ASANA.AsanaName, RDF.type, RDF.Class))
+            g.add((ASANA.AsanaSource, RDF.type, RDF.Class))
+            g.add((ASANA.AsanaPhoto, RDF.type, RDF.Class))
+
+            # Создаем директорию, если её нет
+            os.makedirs(os.path.dirname(config.OWL_FILE_PATH), exist_ok=True)
+
+            # Сохраняем граф
+            g.serialize(destination=config.OWL_FILE_PATH, format="xml")
+            logger.info("Successfully created new ontology file")
+        return True
+    except Exception as e:
+        logger.error(f"Error ensuring ontology file exists: {str(e)}")
+        raise
+
+def _uses_sqlite() -> bool:
+    return config.ONTOLOGY_STORAGE == "sqlite"
+
+def _stat_signature(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+def _read_file_signature():
+    """Возвращает (mtime_ns, size) файла онтологии и журнала"""
+    return (*_stat_signature(config.OWL_FILE_PATH), *_stat_signature(config.OWL_JOURNAL_PATH))
+
+def _replay_journal(g: Graph):
+    """Применяет к графу записи журнала по порядку; подряд идущие записи одного знака разбираются одним блоком"""
+    if not os.path.exists(config.OWL_JOURNAL_PATH):
+        return 0
+    applied = 0
+
+    def apply(op, lines):
+        batch = Graph()
+        batch.parse(data="".join(lines), format="nt")
+        for triple in batch:
+            if op == "+":
+                g.add(triple)
+            else:
+                g.remove(triple)
+        return len(lines)
+
+    op, lines = None, []
+    with open(config.OWL_JOURNAL_PATH, encoding="utf-8") as f:
+        for line in f:
+            # Недописанная последняя строка (сбой во время записи) отбрасывается
+            if not line.endswith("\n") or len(line) < 3 or line[0] not in "+-":
+                continue
+            if line[0] != op and lines:
+                applied += apply(op, lines)
+                lines = []
+            op = line[0]
+            lines.append(line[2:])
+    if lines:
+        applied += apply(op, lines)
+    return applied
+
+def _copy_graph(source: Graph, target: Graph):
+    for prefix, namespace in source.namespaces():
+        target.bind(prefix, namespace)
+    target.addN((s, p, o, target) for s, p, o in source)
+
+def _open_sqlite_graph():
+    """Открывает базу триплетов; пустая база заполняется из файла онтологии"""
+    g = Graph(store=SQLiteStore())
+    g.open(config.ONTOLOGY_SQLITE_PATH, create=True)
+    if len(g) == 0:
+        ensure_ontology_file_exists()
+        logger.info(f"SQLite store is empty, importing {config.OWL_FILE_PATH}")
+        source = Graph()
+        source.parse(config.OWL_FILE_PATH, format="xml")
+        _copy_graph(source, g)
+        g.commit()
+    logger.info(f"Using SQLite triple store with {len(g)} triples")
+    return g
+
+def _save_snapshot(g: Graph, owl_hash: bytes):
+    try:
+        snapshot.write_snapshot(g, config.OWL_SNAPSHOT_PATH, owl_hash)
+    except Exception as e:
+        logger.warning(f"Could not write graph snapshot: {str(e)}")
+
+def _load_graph():
+    if _uses_sqlite():
+        return _open_sqlite_graph()
+    ensure_ontology_file_exists()
+    logger.info(f"Loading RDF graph from {config.OWL_FILE_PATH}")
+    started = time.perf_counter()
+    owl_hash = snapshot.file_hash(config.OWL_FILE_PATH)
+    g = snapshot.read_snapshot(config.OWL_SNAPSHOT_PATH, owl_hash)
+    loaded_from = "snapshot"
+    if g is None:
+        g = Graph()
+        g.parse(config.OWL_FILE_PATH, format="xml")
+        loaded_from = "RDF/XML"
+        # Снимок соответствует файлу без журнала, поэтому пишем его до воспроизведения журнала
+        _save_snapshot(g, owl_hash)
+    replayed = _replay_journal(g)
+    logger.info(f"Loaded graph from {loaded_from} with {len(g)} triples ({replayed} journal records) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return g
+
+def _refresh_if_stale():
+    """Перечитывает граф, если файлы изменились снаружи (проверка не чаще GRAPH_RELOAD_CHECK_INTERVAL)"""
+    global _graph, _file_signature, _last_check
+    now = time.monotonic()
+    if _graph is not None and now - _last_check < config.GRAPH_RELOAD_CHECK_INTERVAL:
+        return
+    # Блокировку держит запись (возможно, долгая контрольная точка): читатели не ждут ее ради
+    # плановой проверки — граф в памяти актуален, проверка пройдет при следующем обращении
+    if not _lock.acquire(blocking=_graph is None):
+        return
+    try:
+        _last_check = now
+        if _batch is not None:
+            # В памяти есть несохраненные изменения группы — перечитывание их потеряет
+            return
+        if _uses_sqlite():
+            # Граф читает базу напрямую; изменения других процессов видны сразу, меняется только версия
+            if _graph is None:
+                _graph = _load_graph()
+            _file_signature = (_graph.store.version(),)
+            return
+        signature = _read_file_signature()
+        if _graph is not None and signature == _file_signature:
+            return
+        if _graph is not None:
+            logger.info("Ontology files changed on disk, reloading graph")
+        _graph = _load_graph()
+        _file_signature = _read_file_signature()
+    finally:
+        _lock.release()
+
+def get_graph() -> Graph:
+    """
+    Возвращает общий для процесса граф. Не изменяйте его вне graph_transaction().
+    При групповой записи граф без graph_lock() может содержать еще не сохраненные изменения.
+    """
+    try:
+        _refresh_if_stale()
+        return _graph
+    except Exception as e:
+        logger.error(f"Failed to load RDF graph: {str(e)}")
+        raise
+
+def get_graph_version() -> tuple:
+    """Версия графа: подписи файлов онтологии и журнала плюс счетчик записей этого процесса"""
+    _refresh_if_stale()
+    return (*(_file_signature or ()), _write_counter)
+
+@contextmanager
+def graph_lock():
+    """
+    Блокировка графа на время согласованного чтения (например, при построении кэшей).
+    Ожидающая группа сначала сохраняется: под блокировкой граф содержит только записанное на диск.
+    """
+    with _lock:
+        if not getattr(_transaction_state, "active", False):
+            _flush_pending()
+        yield
+
+def add_commit_listener(listener):
+    """Регистрирует обработчик, вызываемый под блокировкой после каждой сохраненной транзакции"""
+    _commit_listeners.append(listener)
+
+def _notify_commit(old_version, records):
+    new_version = get_graph_version()
+    for listener in _commit_listeners:
+        try:
+            listener(old_version, new_version, records)
+        except Exception as e:
+            logger.error(f"Commit listener failed: {str(e)}", exc_info=True)
+
+# Экранирование литерала N-Triples: Literal.n3() пишет многострочные значения в тройных кавычках,
+# а журнал разбирается построчно
+_NT_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+def _nt_term(term) -> str:
+    if not isinstance(term, Literal):
+        return term.n3()
+    value = f'"{str(term).translate(_NT_ESCAPES)}"'
+    if term.language:
+        return f"{value}@{term.language}"
+    if term.datatype:
+        return f"{value}^^<{term.datatype}>"
+    return value
+
+def _append_journal(records):
+    """Дописывает изменения в журнал и дожидается их записи на диск"""
+    data = "".join(f"{op} {_nt_term(s)} {_nt_term(p)} {_nt_term(o)} .\n" for op, (s, p, o) in records)
+    os.makedirs(os.path.dirname(config.OWL_JOURNAL_PATH) or ".", exist_ok=True)
+    with open(config.OWL_JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _replace_file(tmp_path: str, path: str):
+    """
+    Атомарно заменяет файл. Если файл смонтирован в контейнер отдельно (а не каталогом),
+    переименование невозможно: запись на месте не атомарна, поэтому это ошибка конфигурации.
+    """
+    try:
+        os.replace(tmp_path, path)
+    except OSError as e:
+        os.remove(tmp_path)
+        logger.error(f"Atomic replace of {path} failed: {str(e)}. Mount the directory with the ontology, not the file itself")
+        raise
+
+def _write_checkpoint(g: Graph):
+    """Переписывает RDF/XML целиком (через временный файл и атомарную замену) и очищает журнал"""
+    global _last_checkpoint
+    logger.info(f"Writing ontology checkpoint to {config.OWL_FILE_PATH}")
+    started = time.perf_counter()
+    tmp_path = f"{config.OWL_FILE_PATH}.tmp"
+    g.serialize(destination=tmp_path, format="xml")
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    _replace_file(tmp_path, config.OWL_FILE_PATH)
+    _save_snapshot(g, snapshot.file_hash(config.OWL_FILE_PATH))
+    # Журнал уже отражен в файле; если процесс упадет до очистки, повторное применение безопасно
+    if os.path.exists(config.OWL_JOURNAL_PATH):
+        with open(config.OWL_JOURNAL_PATH, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+    _last_checkpoint = time.monotonic()
+    logger.info(f"Checkpoint written in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+def _checkpoint_due():
+    journal_size = _stat_signature(config.OWL_JOURNAL_PATH)[1]
+    if not journal_size:
+        return False
+    if journal_size >= config.JOURNAL_CHECKPOINT_BYTES:
+        return True
+    return time.monotonic() - _last_checkpoint >= config.JOURNAL_CHECKPOINT_INTERVAL
+
+def _persist(g: Graph, records):
+    global _file_signature, _write_counter
+    if _uses_sqlite():
+        g.commit()
+        _file_signature = (g.store.version(),)
+        _write_counter += 1
+        logger.debug(f"Committed {len(records)} changes to SQLite store")
+        return
+    # Пустые узлы получают новые идентификаторы при каждом разборе RDF/XML, поэтому
+    # изменения с ними нельзя воспроизвести из журнала — сразу пишем контрольную точку
+    if any(isinstance(term, BNode) for _, triple in records for term in triple):
+        _write_checkpoint(g)
+    else:
+        _append_journal(records)
+        if _checkpoint_due():
+            try:
+                _write_checkpoint(g)
+            except OSError as e:
+                # Изменения уже в журнале: транзакция сохранена, контрольная точка повторится позже
+                logger.error(f"Checkpoint failed, changes are kept in the journal: {str(e)}")
+    _file_signature = _read_file_signature()
+    _write_counter += 1
+    logger.debug(f"Persisted {len(records)} journal records")
+
+class GraphTransaction:
+    """
+    Обертка над общим графом на время изменения: пропускает чтения к графу
+    и записывает фактически добавленные и удаленные триплеты для журнала.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.records = []
+
+    @property
+    def changed(self):
+        return bool(self.records)
+
+    def add(self, triple):
+        if triple not in self.graph:
+            self.graph.add(triple)
+            self.records.append(("+", triple))
+
+    def remove(self, pattern):
+        for triple in list(self.graph.triples(pattern)):
+            self.graph.remove(triple)
+            self.records.append(("-", triple))
+
+    def __contains__(self, pattern):
+        return pattern in self.graph
+
+    def __len__(self):
+        return len(self.graph)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+def _undo(g: Graph, records):
+    """Откатывает в памяти изменения, записанные GraphTransaction (в обратном порядке)"""
+    for op, triple in reversed(records):
+        if op == "+":
+            g.remove(triple)
+        else:
+            g.add(triple)
+
+def _join_batch(records):
+    """Добавляет изменения транзакции в текущую группу; первый участник группы становится ведущим"""
+    global _batch
+    leader = _batch is None
+    if leader:
+        _batch = _CommitBatch()
+    batch = _batch
+    batch.records.extend(records)
+    batch.transactions += 1
+    if batch.transactions >= config.GROUP_COMMIT_MAX_OPS:
+        batch.full.set()
+    return batch, leader
+
+def _count_writer(delta: int):
+    """Учитывает ожидающих писателей: когда все они добавили свои изменения, группу можно сохранять не дожидаясь окна"""
+    global _writers_waiting
+    with _writers_lock:
+        _writers_waiting += delta
+        batch = _batch
+        if _writers_waiting == 0 and batch is not None:
+            batch.full.set()
+
+def _flush_batch(batch: _CommitBatch):
+    """Сохраняет группу одной записью на диск и будит всех ее участников"""
+    global _batch
+    with _lock:
+        if batch.done.is_set():
+            # Группу уже сохранили раньше ведущего (контрольная точка или загрузка онтологии)
+            return
+        g = get_graph()
+        old_version = get_graph_version()
+        _batch = None
+        try:
+            _persist(g, batch.records)
+        except Exception as e:
+            logger.error(f"Group commit of {batch.transactions} transactions failed: {str(e)}")
+            if _uses_sqlite():
+                g.rollback()
+            else:
+                _undo(g, batch.records)
+            batch.error = e
+        else:
+            logger.debug(f"Group commit: {batch.transactions} transactions, {len(batch.records)} records")
+            _notify_commit(old_version, batch.records)
+        finally:
+            # Ведущий, если группу сохранили без него, перестает ждать окно
+            batch.full.set()
+            batch.done.set()
+
+@contextmanager
+def graph_transaction():
+    """
+    Изменение графа: отдает общий граф под блокировкой и сохраняет изменения при успешном выходе.
+    При исключении изменения транзакции откатываются в памяти.
+
+    При GROUP_COMMIT_WINDOW > 0 изменения сохраняются группой: первая транзакция группы ждет, пока
+    свои изменения добавят все писатели, стоящие в очереди к блокировке (но не дольше окна и не больше
+    GROUP_COMMIT_MAX_OPS транзакций), и сохраняет всю группу разом, остальные ждут ее. Выход
+    из контекста в любом случае происходит только после того, как изменения записаны на диск.
+    Изменения применяются к общему графу сразу, но версия графа и проекция меняются только после
+    сохранения группы, а graph_lock() перед чтением сохраняет ожидающую группу, поэтому
+    несохраненные изменения видны лишь в сыром графе get_graph(). Не вызывайте запись, удерживая graph_lock().
+    """
+    group_commit = config.GROUP_COMMIT_WINDOW > 0
+    if group_commit:
+        _count_writer(1)
+    try:
+        with _lock:
+            tx = GraphTransaction(get_graph())
+            old_version = get_graph_version()
+            outer = getattr(_transaction_state, "active", False)
+            _transaction_state.active = True
+            try:
+                yield tx
+            except Exception:
+                _undo(tx.graph, tx.records)
+                raise
+            finally:
+                _transaction_state.active = outer
+            if not tx.changed:
+                return
+            if not group_commit:
+                _persist(tx.graph, tx.records)
+                _notify_commit(old_version, tx.records)
+                return
+            batch, leader = _join_batch(tx.records)
+    finally:
+        if group_commit:
+            _count_writer(-1)
+    if leader:
+        batch.full.wait(config.GROUP_COMMIT_WINDOW)
+        _flush_batch(batch)
+    batch.done.wait()
+    if batch.error is not None:
+        raise batch.error
+
+def _flush_pending():
+    if _batch is not None:
+        _flush_batch(_batch)
+
+def checkpoint():
+    """Принудительно сворачивает журнал в файл онтологии (например, при остановке)"""
+    global _file_signature
+    if _uses_sqlite():
+        _flush_pending()
+        return
+    with _lock:
+        _flush_pending()
+        g = get_graph()
+        if _stat_signature(config.OWL_JOURNAL_PATH)[1]:
+            old_version = get_graph_version()
+            _write_checkpoint(g)
+            _file_signature = _read_file_signature()
+            # Данные не изменились, сменилась только подпись файлов: подписчики переходят
+            # на новую версию без пересборки (иначе проекцию пересобрал бы первый читатель)
+            _notify_commit(old_version, [])
+
+def export_ontology() -> str:
+    """Возвращает путь к актуальному RDF/XML всей онтологии (для скачивания)"""
+    if not _uses_sqlite():
+        checkpoint()
+        return config.OWL_FILE_PATH
+    export_path = f"{config.ONTOLOGY_SQLITE_PATH}.export.owl"
+    with _lock:
+        _flush_pending()
+        tmp_path = f"{export_path}.tmp"
+        get_graph().serialize(destination=tmp_path, format="xml")
+        os.replace(tmp_path, export_path)
+    return export_path
+
+def import_ontology(content: bytes):
+    """Заменяет онтологию загруженным RDF/XML: старый журнал к новому файлу не относится"""
+    global _graph, _file_signature, _write_counter, _last_check
+    if _uses_sqlite():
+        source = Graph()
+        source.parse(data=content, format="xml")
+        with _lock:
+            _flush_pending()
+            g = get_graph()
+            old_version = get_graph_version()
+            g.store.clear()
+            _copy_graph(source, g)
+            g.commit()
+            _file_signature = (g.store.version(),)
+            _write_counter += 1
+            _notify_commit(old_version, None)
+        logger.info(f"Imported {len(source)} triples into SQLite store")
+        return
+    # Новый файл пишется рядом и разбирается до замены: некорректная загрузка не портит
+    # текущую онтологию, а читатели никогда не видят файл, записанный наполовину
+    tmp_path = f"{config.OWL_FILE_PATH}.upload"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        g = Graph()
+        g.parse(tmp_path, format="xml")
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    with _lock:
+        _flush_pending()
+        old_version = get_graph_version()
+        _replace_file(tmp_path, config.OWL_FILE_PATH)
+        if os.path.exists(config.OWL_JOURNAL_PATH):
+            os.remove(config.OWL_JOURNAL_PATH)
+        _save_snapshot(g, snapshot.file_hash(config.OWL_FILE_PATH))
+        _graph = g
+        _file_signature = _read_file_signature()
+        _write_counter += 1
+        _last_check = time.monotonic()
+        _notify_commit(old_version, None)
@@ -0,0 +1,268 @@
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from app import aio, config, graph_store, projection
+from app.executors import run_blocking
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+import hashlib
+import logging
+import anyio
+import gzip
+import json
+import os
+import re
+
+logger = logging.getLogger("asana_service.http_cache")
+
+# Клиент может хранить ответ, но обязан сверять его с сервером (If-None-Match) перед каждым использованием
+CACHE_CONTROL = "no-cache"
+
+# Файлы по адресу из хэша содержимого (фото) никогда не меняются: клиент и прокси хранят их год без проверок
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Один диапазон байт: "bytes=0-99", "bytes=100-" или последние N байт "bytes=-N"
+_BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Ответы короче этого не сжимаем: выигрыш меньше накладных расходов gzip
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+GZIP_SUFFIX = "-gzip"
+
+def make_etag(*parts) -> str:
+    """Сильный ETag: хэш от версии данных и параметров запроса"""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _request_key(request: Request) -> str:
+    """Путь и параметры запроса без учета порядка параметров"""
+    return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с одним из If-None-Match (слабое сравнение, как требует RFC 9110 для GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Сжатое представление имеет свой ETag (с суффиксом -gzip), но версия данных у них общая
+    return any(tag.strip().removeprefix("W/").replace(f'{GZIP_SUFFIX}"', '"') == etag for tag in header.split(","))
+
+def check_etag(request: Request, response: Response, etag: str):
+    """Отвечает 304, если у клиента актуальная версия; иначе добавляет ETag к ответу"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, etag):
+        logger.debug(f"Not modified: {request.url.path}")
+        raise HTTPException(status_code=304, headers=headers)
+    request.state.etag = etag
+    response.headers.update(headers)
+
+async def graph_etag(request: Request, response: Response):
+    """
+    Зависимость для чтений онтологии: ETag из версии графа и параметров запроса.
+    При совпадении с If-None-Match обработчик не вызывается и клиент получает 304.
+    Проекция этой версии (устаревшая собирается в пуле онтологии) сохраняется в request.state
+    для cached_json: тело ответа строится по той же версии, что и ETag.
+    """
+    current = await aio.get_projection()
+    version = current.version
+    request.state.projection = current
+    request.state.graph_version = version
+    check_etag(request, response, make_etag(version, _request_key(request)))
+
+def content_etag(request: Request, response: Response, *content):
+    """ETag для данных вне онтологии (например, строк БД) по их содержимому"""
+    check_etag(request, response, make_etag(_request_key(request), *content))
+
+try:
+    import orjson
+
+    def encode_json(data: Any) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    logger.warning("orjson not installed, using stdlib json for cached responses")
+
+    def encode_json(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class _CachedBody:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzipped: Optional[bytes] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+class ResponseCache:
+    """
+    Готовые тела JSON-ответов по ключу (версия графа, путь и параметры), вытеснение LRU
+    по суммарному размеру в байтах. При смене версии графа старые ответы больше не нужны
+    и удаляются все сразу.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CachedBody]" = OrderedDict()
+        self._version = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version, key: str) -> Optional[_CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key: str, entry: _CachedBody):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                # Ответ, собранный до чужой записи, устарел: не вытесняем им ответы новой версии
+                if version != graph_store.get_graph_version():
+                    return
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def resize(self, version, key: str, entry: _CachedBody, old_size: int):
+        """Учитывает выросший размер записи (добавилось сжатое тело)"""
+        with self._lock:
+            if version == self._version and self._entries.get(key) is entry:
+                self._bytes += entry.size - old_size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_BYTES)
+
+def _build_body(request: Request, build: Callable[[], Any], key: str) -> _CachedBody:
+    """Сборка и сериализация тела на проекции, по которой graph_etag посчитал ETag"""
+    version = request.state.graph_version
+    with projection.pinned(request.state.projection):
+        entry = _CachedBody(encode_json(build()))
+    if response_cache.max_bytes > 0:
+        response_cache.put(version, key, entry)
+    return entry
+
+def _gzip_body(version, key: str, entry: _CachedBody) -> bytes:
+    if entry.gzipped is None:
+        old_size = entry.size
+        entry.gzipped = gzip.compress(entry.body, compresslevel=GZIP_LEVEL)
+        response_cache.resize(version, key, entry, old_size)
+    return entry.gzipped
+
+async def cached_json(request: Request, build: Callable[[], Any]) -> Response:
+    """
+    JSON-ответ для маршрута с зависимостью graph_etag: тело (и его gzip-версия) сериализуется
+    один раз на версию графа и параметры запроса, дальше отдается из кэша готовыми байтами.
+    Сборка, сериализация и сжатие идут в пуле чтений, а не в цикле событий.
+    """
+    version = request.state.graph_version
+    etag = request.state.etag
+    key = _request_key(request)
+    entry = response_cache.get(version, key) if response_cache.max_bytes > 0 else None
+    if entry is None:
+        entry = await run_blocking("read", _build_body, request, build, key)
+
+    headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if len(entry.body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        gzipped = entry.gzipped
+        if gzipped is None:
+            gzipped = await run_blocking("read", _gzip_body, version, key, entry)
+        headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = f'{etag[:-1]}{GZIP_SUFFIX}"'
+        return Response(content=gzipped, media_type="application/json", headers=headers)
+    headers["ETag"] = etag
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Диапазон (первый, последний байт включительно) из заголовка Range для файла размера size.
+    None — заголовок не разобран или диапазонов несколько: тогда отдается весь файл.
+    ValueError — диапазон не пересекается с файлом (416).
+    """
+    match = _BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(int(last), size - 1) if last else size - 1
+
+class _FileRangeResponse(FileResponse):
+    """Часть файла с байта start по end включительно; Content-Range и Content-Length задает вызывающий"""
+
+    def __init__(self, path: str, start: int, end: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+def file_response(request: Request, path: str, media_type: str, etag: str, cache_control: str) -> Response:
+    """
+    Файл с ETag, Cache-Control и поддержкой Range: 304 при совпадении If-None-Match,
+    206 для одного диапазона bytes= (If-Range сверяется с ETag), 416 для диапазона за концом файла,
+    иначе весь файл.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+            return _FileRangeResponse(path, start, end, headers=headers, media_type=media_type, stat_result=stat_result)
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
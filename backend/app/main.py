@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form, File, UploadFile, Query, Request, Path
+from fastapi import FastAPI, Depends, HTTPException, status, Form, File, UploadFile, Query, Request, Response, Path
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Optional, List
 from pydantic import BaseModel
@@ -7,16 +7,17 @@ import os
 import logging
 import json
 from starlette.responses import RedirectResponse
-from app.auth import (
-    authenticate_user, create_access_token, get_current_user, is_admin, is_expert_or_admin, 
-    register_user, confirm_registration, reset_password_request, reset_password_confirm
-)
+from app.auth import create_access_token, get_current_user, is_admin, is_expert_or_admin
 from app.ontology import (
-    add_asana_name, add_source, load_asana_names, load_asanas, add_asana, load_sources,
-    delete_source_from_ontology, delete_asana_name_from_ontology, delete_asana_from_ontology, 
-    add_photo_to_asana, get_asanas_by_first_letter, get_asanas_by_source, search_asanas_by_name,
-    get_photo_of_asana_from_source
+    load_asana_names, load_asanas, load_sorted_asanas, get_asana, load_sources, get_source, search_sources, get_source_counts,
+    get_alphabet, get_asanas_by_first_letter, get_asanas_by_source, search_asanas_by_name
+)
+from app import aio, executors, photo_store, paging
+from app.http_cache import (
+    CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, cached_json, content_etag, file_response, graph_etag,
+    response_cache
 )
+from app.graph_store import checkpoint
 from app.config import logger
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
@@ -75,8 +76,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Отклоняет слишком большие загрузки по Content-Length, не читая тело запроса"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > config.UPLOAD_MAX_BYTES:
+        logger.warning(f"Upload rejected: {request.url.path}, {content_length} bytes")
+        return JSONResponse(status_code=413, content={"detail": "Слишком большой запрос"})
+    return await call_next(request)
+
+def check_photo_sizes(*photos: UploadFile):
+    """Размер файлов уже известен после разбора формы: проверяем до изменений онтологии"""
+    for photo in photos:
+        if photo.size is not None and photo.size > config.PHOTO_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Фото {photo.filename} больше допустимого размера "
+                                                        f"({config.PHOTO_MAX_BYTES // (1024 * 1024)} МБ)")
+
 engine = create_engine(config.SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base.metadata.create_all(bind=engine)
@@ -146,11 +164,25 @@ def create_default_users():
 
 create_default_users()
 
+@app.on_event("startup")
+async def migrate_ontology_photos():
+    """Миграции фото при запуске — в пуле онтологии, как и после загрузки онтологии"""
+    # Переносим base64-фото из онтологии в хранилище фото (если они там еще остались)
+    await aio.migrate_base64_photos()
+    # Считаем dHash для фото, у которых его еще нет (нужен для поиска почти дубликатов)
+    await aio.migrate_photo_dhashes()
+
+@app.on_event("shutdown")
+def flush_ontology_journal():
+    """Дожидаемся работы в пулах и сворачиваем журнал онтологии при остановке сервиса"""
+    executors.shutdown()
+    checkpoint()
+
 # Маршруты аутентификации и авторизации
 @app.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info(f"Login attempt for user: {form_data.username}")
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await aio.authenticate_user(form_data.username, form_data.password)
     if not user:
         logger.warning(f"Failed login attempt for user: {form_data.username}")
         raise HTTPException(status_code=400, detail="Incorrect username or password")
@@ -161,7 +193,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 @app.post("/login")
 async def login_form(user_login: UserLogin):
     logger.info(f"Login form attempt for user: {user_login.username}")
-    user = authenticate_user(user_login.username, user_login.password)
+    user = await aio.authenticate_user(user_login.username, user_login.password)
     if not user:
         logger.warning(f"Failed login form attempt for user: {user_login.username}")
         raise HTTPException(status_code=400, detail="Incorrect username or password")
@@ -193,7 +225,7 @@ async def login_form(user_login: UserLogin):
 async def register(user_data: UserRegistration):
     logger.info(f"Registration attempt for username: {user_data.username}, email: {user_data.email}")
     try:
-        result = register_user(
+        result = await aio.register_user(
             username=user_data.username,
             email=user_data.email,
             first_name=user_data.first_name,
@@ -213,7 +245,7 @@ async def register(user_data: UserRegistration):
 async def confirm(code: str):
     logger.info(f"Confirmation attempt with code: {code}")
     try:
-        result = confirm_registration(code)
+        result = await aio.confirm_registration(code)
         logger.info(f"Successfully confirmed user: {result['username']}")
         return result
     except HTTPException as e:
@@ -227,7 +259,7 @@ async def confirm(code: str):
 async def reset_request(reset_data: PasswordReset):
     logger.info(f"Password reset request for email: {reset_data.email}")
     try:
-        result = reset_password_request(reset_data.email)
+        result = await aio.reset_password_request(reset_data.email)
         logger.info(f"Password reset email sent (if email exists)")
         return result
     except Exception as e:
@@ -238,7 +270,7 @@ async def reset_request(reset_data: PasswordReset):
 async def reset_confirm(reset_data: PasswordResetConfirm):
     logger.info(f"Password reset confirmation attempt with code: {reset_data.code}")
     try:
-        result = reset_password_confirm(reset_data.code, reset_data.new_password)
+        result = await aio.reset_password_confirm(reset_data.code, reset_data.new_password)
         logger.info(f"Successfully reset password for user: {result['username']}")
         return result
     except HTTPException as e:
@@ -255,41 +287,78 @@ async def logout():
     return response
 
 # Маршруты для асан
-@app.get("/asanas", tags=["asana"])
-async def get_asanas():
-    """Получить все асаны (доступно всем)"""
-    logger.info("Getting asanas list for all users")
-    asanas = load_asanas()
-    logger.info(f"Retrieved {len(asanas)} asanas")
-    return asanas
-
-@app.get("/asanas/by-letter/{letter}", tags=["asana"])
-async def get_asanas_by_letter(letter: str):
-    """Получить асаны, начинающиеся с определенной буквы (доступно всем)"""
+def asana_page(asanas: list, limit: Optional[int], cursor: Optional[str], fields: Optional[str], include_photos: str):
+    """Страница списка асан: {"items", "total", "next_cursor", "limit"}"""
+    try:
+        return paging.paginate(asanas, limit, cursor, fields, include_photos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Общие параметры списков асан: размер страницы, курсор, набор полей и объем фото
+PAGE_LIMIT = Query(None, ge=1, le=1000, description="Размер страницы; без него возвращается весь список")
+PAGE_CURSOR = Query(None, description="next_cursor из предыдущей страницы")
+PAGE_FIELDS = Query(None, description=f"Поля через запятую: {', '.join(paging.ASANA_FIELDS)}")
+PAGE_PHOTOS = Query("all", regex="^(none|first|all)$", description="Фото в ответе: none, first или all")
+
+@app.get("/asanas", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def get_asanas(request: Request, limit: Optional[int] = PAGE_LIMIT, cursor: Optional[str] = PAGE_CURSOR,
+                     fields: Optional[str] = PAGE_FIELDS, include_photos: str = PAGE_PHOTOS):
+    """Получить асаны постранично в порядке каталога (доступно всем)"""
+    logger.info(f"Getting asanas page: limit={limit}, cursor={cursor}")
+    return await cached_json(request, lambda: asana_page(load_sorted_asanas(), limit, cursor, fields, include_photos))
+
+@app.get("/asanas/alphabet", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def get_asanas_alphabet(request: Request):
+    """Буквы алфавитного каталога с количеством асан на каждую (доступно всем)"""
+    return await cached_json(request, get_alphabet)
+
+@app.get("/asanas/by-letter/{letter}", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def get_asanas_by_letter(request: Request, letter: str, limit: Optional[int] = PAGE_LIMIT, cursor: Optional[str] = PAGE_CURSOR,
+                               fields: Optional[str] = PAGE_FIELDS, include_photos: str = PAGE_PHOTOS):
+    """Получить асаны, начинающиеся с определенной буквы, постранично (доступно всем)"""
     logger.info(f"Getting asanas starting with letter: {letter}")
-    asanas = get_asanas_by_first_letter(letter)
-    return asanas
+    return await cached_json(request, lambda: asana_page(get_asanas_by_first_letter(letter), limit, cursor, fields, include_photos))
 
-@app.get("/asanas/by-source/{source_id}", tags=["asana"])
-async def get_source_asanas(source_id: str):
-    """Получить асаны из определенного источника (доступно всем)"""
+@app.get("/asanas/by-source/{source_id}", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def get_source_asanas(request: Request, source_id: str, limit: Optional[int] = PAGE_LIMIT, cursor: Optional[str] = PAGE_CURSOR,
+                            fields: Optional[str] = PAGE_FIELDS, include_photos: str = PAGE_PHOTOS):
+    """Получить асаны из определенного источника постранично (доступно всем)"""
     logger.info(f"Getting asanas from source: {source_id}")
-    asanas = get_asanas_by_source(source_id)
-    return asanas
+    return await cached_json(request, lambda: asana_page(get_asanas_by_source(source_id), limit, cursor, fields, include_photos))
 
-@app.get("/asanas/search", tags=["asana"])
-async def search_asanas(query: str, fuzzy: bool = True):
+@app.get("/asanas/search", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def search_asanas(request: Request, query: str, fuzzy: bool = True, limit: Optional[int] = Query(None, ge=1)):
     """Поиск асан по названию (доступно всем)"""
-    logger.info(f"Searching asanas with query: {query}, fuzzy: {fuzzy}")
-    if fuzzy:
-        asanas = search_asanas_by_name(query)
-    else:
-        # Простой поиск по подстроке
-        all_asanas = load_asanas()
-        asanas = [a for a in all_asanas if query.lower() in a["name"]["ru"].lower()]
-    
-    logger.info(f"Found {len(asanas)} asanas matching query: {query}")
-    return asanas
+    logger.info(f"Searching asanas with query: {query}, fuzzy: {fuzzy}, limit: {limit}")
+
+    def search():
+        if fuzzy:
+            asanas = search_asanas_by_name(query, limit=limit)
+        else:
+            # Простой поиск по подстроке
+            all_asanas = load_asanas()
+            asanas = [a for a in all_asanas if query.lower() in a["name"]["name_ru"].lower()][:limit]
+        logger.info(f"Found {len(asanas)} asanas matching query: {query}")
+        return asanas
+
+    return await cached_json(request, search)
+
+# Объявлен после остальных /asanas/..., чтобы не перехватывать их пути
+@app.get("/asanas/{asana_id:path}", tags=["asana"], dependencies=[Depends(graph_etag)])
+async def get_asana_record(request: Request, asana_id: str, fields: Optional[str] = PAGE_FIELDS, include_photos: str = PAGE_PHOTOS):
+    """Одна асана по короткому ID или полному URI (доступно всем)"""
+    logger.info(f"Getting asana: {asana_id}")
+
+    def build():
+        asana = get_asana(asana_id)
+        if asana is None:
+            raise HTTPException(status_code=404, detail="Асана не найдена")
+        try:
+            return paging.shape_asana(asana, paging.parse_fields(fields), include_photos)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_json(request, build)
 
 @app.get("/asana/add", tags=["asana"])
 def add_asana_page(request: Request):
@@ -339,8 +408,9 @@ async def post_asana(
         logger.debug(f"Form data received - selected_name: {selected_name}, selected_source: {selected_source}")
         logger.debug(f"New name data: ru={new_name_ru}, sanskrit={new_name_sanskrit}")
         logger.debug(f"New source data: title={new_source_title}, author={new_source_author}, year={new_source_year}")
-        logger.debug(f"Photo filename: {photo.filename}")
-        
+        logger.debug(f"Photo filename: {photo.filename}, size: {photo.size} bytes")
+        check_photo_sizes(photo)
+
         # Обработка названия
         name_id = None
         if selected_name != "new":
@@ -357,7 +427,7 @@ async def post_asana(
                 name_data["transliteration"] = transliteration
             if definition:
                 name_data["definition"] = definition
-            name_id = add_asana_name(name_data)
+            name_id = await aio.add_asana_name(name_data)
             logger.debug(f"Created new name with ID: {name_id}")
         else:
             logger.error("Missing required name fields for new name")
@@ -384,34 +454,61 @@ async def post_asana(
             if new_source_annotation:
                 source_data["annotation"] = new_source_annotation
                 
-            source_id = add_source(source_data)
+            source_id = await aio.add_source(source_data)
             logger.debug(f"Created new source with ID: {source_id}")
         else:
             logger.error("Missing required source fields for new source")
             raise HTTPException(status_code=400, detail="При добавлении нового источника поля автора, названия и года обязательны")
 
-        # Обработка фото
-        logger.info("Processing photo upload")
-        photo_content = await photo.read()
-        photo_base64 = base64.b64encode(photo_content).decode()
-        logger.debug(f"Photo size in bytes: {len(photo_content)}")
-
-        # Добавляем асану
+        # Фото пишется в хранилище потоково из файла, который разобрала форма (в пуле фото),
+        # запись онтологии получает только его метаданные
+        photo_meta = await aio.save_photo_file(photo.file)
         logger.info("Adding asana to ontology")
-        asana_id = add_asana(name_id=name_id, source_id=source_id, photo_base64=photo_base64)
+        asana_id = await aio.add_asana(name_id=name_id, source_id=source_id, photo=photo_meta)
         logger.info(f"Successfully created asana with ID: {asana_id}")
-        
-        return {"message": "Asana added successfully", "id": asana_id}
+        duplicates = await aio.find_duplicates_of_asana(asana_id)
+
+        return {"message": "Asana added successfully", "id": asana_id, "duplicates": duplicates}
+    except HTTPException:
+        raise
+    except photo_store.PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding asana: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/asanas/bulk", tags=["asana"])
+async def post_asanas_bulk(
+    catalog: UploadFile = File(...),
+    photos: Optional[UploadFile] = File(None),
+    user: str = Depends(is_expert_or_admin)
+):
+    """
+    Массовое добавление асан (только эксперты и админы): каталог в JSON Lines или CSV
+    и ZIP-архив с фотографиями. Все строки проверяются заранее и добавляются одной транзакцией.
+    """
+    logger.info(f"Bulk asana import from {catalog.filename} by user: {user}")
+    try:
+        rows = await aio.parse_rows(await catalog.read(), catalog.filename or "")
+        photo_files = await aio.open_photo_archive(photos.file if photos else None)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        imported, results = await aio.import_catalog(rows, photo_files)
+    except photo_store.PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not imported:
+        raise HTTPException(status_code=400, detail={"message": "Каталог не импортирован: исправьте ошибки в строках", "rows": results})
+    logger.info(f"Bulk import added {len(results)} asanas")
+    return {"message": "Asanas imported successfully", "imported": len(results), "rows": results}
+
 @app.delete("/asanas")
 async def delete_asana(user: str = Depends(is_expert_or_admin), uri: str = Query(...)):
     """Удалить асану (только эксперты и админы)"""
     try:
         logger.info(f"Deleting asana with URI: {uri} by user: {user}")
-        success = delete_asana_from_ontology(uri)
+        success = await aio.delete_asana_from_ontology(uri)
         if not success:
             logger.warning(f"Asana not found: {uri}")
             raise HTTPException(status_code=404, detail="Asana not found")
@@ -428,33 +525,42 @@ async def add_asana_photo_endpoint(
     photos: List[UploadFile] = File(...), 
     user: str = Depends(is_expert_or_admin)
 ):
-    """Добавить фото к асане (только эксперты и админы)"""
+    """
+    Добавить фото к асане (только эксперты и админы). Для каждого фото в ответе — уже имеющиеся
+    в каталоге точные копии (exact) и похожие фото (near); точная копия фото той же асаны
+    и того же источника повторно не добавляется.
+    """
+    check_photo_sizes(*photos)
     try:
+        # Асана и источник проверяются до записи файлов в хранилище фото
+        await aio.resolve_photo_target(asana_id, source_id)
         results = []
+        duplicates = []
         for photo in photos:
-            photo_bytes = await photo.read()
-            photo_uri = add_photo_to_asana(asana_id, photo_bytes, source_id)
+            photo_meta = await aio.save_photo_file(photo.file)
+            photo_uri = await aio.add_photo_to_asana(asana_id, photo_meta, source_id)
             results.append(photo_uri)
-        return {"message": "Фото добавлены", "photo_ids": results}
+            duplicates.append({"photo_id": photo_uri, **await aio.find_duplicates_of_photo(photo_uri)})
+        return {"message": "Фото добавлены", "photo_ids": results, "duplicates": duplicates}
+    except photo_store.PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding photo to asana: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 # Маршруты для источников
-@app.get("/sources")
-async def get_sources():
+@app.get("/sources", dependencies=[Depends(graph_etag)])
+async def get_sources(request: Request):
     """Получить все источники (доступно всем)"""
     logger.info("Getting sources list for all users")
-    sources = load_sources()
-    logger.info(f"Retrieved {len(sources)} sources")
-    return sources
+    return await cached_json(request, load_sources)
 
 @app.post("/sources")
 async def post_source(source: SourceCreate, user: str = Depends(is_expert_or_admin)):
     """Добавить новый источник (только эксперты и админы)"""
     logger.info(f"Adding new source by user: {user}")
     try:
-        source_id = add_source(source.dict())
+        source_id = await aio.add_source(source.dict())
         if not source_id:
             logger.warning(f"Failed to add source: {source}")
             raise HTTPException(status_code=400, detail="Source already exists or invalid")
@@ -470,7 +576,7 @@ async def delete_source(user: str = Depends(is_expert_or_admin), uri: str = Quer
     """Удалить источник (только эксперты и админы)"""
     logger.info(f"Deleting source with URI: {uri} by user: {user}")
     try:
-        success = delete_source_from_ontology(uri)
+        success = await aio.delete_source_from_ontology(uri)
         if not success:
             logger.warning(f"Source not found: {uri}")
             raise HTTPException(status_code=404, detail="Source not found")
@@ -481,20 +587,18 @@ async def delete_source(user: str = Depends(is_expert_or_admin), uri: str = Quer
         raise HTTPException(status_code=400, detail=str(e))
 
 # Маршруты для названий асан
-@app.get("/asana-names")
-async def get_asana_names():
+@app.get("/asana-names", dependencies=[Depends(graph_etag)])
+async def get_asana_names(request: Request):
     """Получить все названия асан (доступно всем)"""
     logger.info("Getting asana names list for all users")
-    names = load_asana_names()
-    logger.info(f"Retrieved {len(names)} asana names")
-    return names
+    return await cached_json(request, load_asana_names)
 
 @app.post("/asana-names")
 async def post_asana_name(name: AsanaNameCreate, user: str = Depends(is_expert_or_admin)):
     """Добавить новое название асаны (только эксперты и админы)"""
     logger.info(f"Adding new asana name by user: {user}")
     try:
-        name_id = add_asana_name(name.dict())
+        name_id = await aio.add_asana_name(name.dict())
         if not name_id:
             logger.warning(f"Failed to add asana name: {name}")
             raise HTTPException(status_code=400, detail="Asana name already exists or invalid")
@@ -510,7 +614,7 @@ async def delete_asana_name(user: str = Depends(is_expert_or_admin), uri: str =
     """Удалить название асаны (только эксперты и админы)"""
     logger.info(f"Deleting asana name with URI: {uri} by user: {user}")
     try:
-        success = delete_asana_name_from_ontology(uri)
+        success = await aio.delete_asana_name_from_ontology(uri)
         if not success:
             logger.warning(f"Asana name not found: {uri}")
             raise HTTPException(status_code=404, detail="Asana name not found")
@@ -521,56 +625,54 @@ async def delete_asana_name(user: str = Depends(is_expert_or_admin), uri: str =
         raise HTTPException(status_code=400, detail=str(e))
 
 # Маршруты для информации о проекте и инструкций
+def read_text_content(model):
+    """Текст страницы (о проекте, инструкции) из базы: (id строки, текст) или (None, None)"""
+    db = SessionLocal()
+    row = db.query(model).first()
+    db.close()
+    return (row.id, row.content) if row else (None, None)
+
+def write_text_content(model, content: str):
+    db = SessionLocal()
+    row = db.query(model).first()
+    if not row:
+        row = model(content=content)
+        db.add(row)
+    else:
+        row.content = content
+    db.commit()
+    db.close()
+
 @app.get("/about-project")
-async def get_about_project():
+async def get_about_project(request: Request, response: Response):
     """Получить информацию о проекте (доступно всем)"""
     logger.info("Getting about project info")
-    db = SessionLocal()
-    about = db.query(AboutProject).first()
-    db.close()
-    if not about:
-        return {"content": "Информация о проекте отсутствует"}
-    return {"content": about.content}
+    row_id, content = await executors.run_blocking("db", read_text_content, AboutProject)
+    content = content or "Информация о проекте отсутствует"
+    content_etag(request, response, row_id, content)
+    return {"content": content}
 
 @app.post("/about-project")
 async def update_about_project(data: TextContent, user: str = Depends(is_admin)):
     """Обновить информацию о проекте (только админ)"""
     logger.info(f"Updating about project info by user: {user}")
-    db = SessionLocal()
-    about = db.query(AboutProject).first()
-    if not about:
-        about = AboutProject(content=data.content)
-        db.add(about)
-    else:
-        about.content = data.content
-    db.commit()
-    db.close()
+    await executors.run_blocking("db", write_text_content, AboutProject, data.content)
     return {"message": "About project info updated successfully"}
 
 @app.get("/expert-instructions")
-async def get_expert_instructions():
+async def get_expert_instructions(request: Request, response: Response):
     """Получить инструкции для экспертов (доступно всем)"""
     logger.info("Getting expert instructions")
-    db = SessionLocal()
-    instructions = db.query(ExpertInstructions).first()
-    db.close()
-    if not instructions:
-        return {"content": "Инструкции для экспертов отсутствуют"}
-    return {"content": instructions.content}
+    row_id, content = await executors.run_blocking("db", read_text_content, ExpertInstructions)
+    content = content or "Инструкции для экспертов отсутствуют"
+    content_etag(request, response, row_id, content)
+    return {"content": content}
 
 @app.post("/expert-instructions")
 async def update_expert_instructions(data: TextContent, user: str = Depends(is_admin)):
     """Обновить инструкции для экспертов (только админ)"""
     logger.info(f"Updating expert instructions by user: {user}")
-    db = SessionLocal()
-    instructions = db.query(ExpertInstructions).first()
-    if not instructions:
-        instructions = ExpertInstructions(content=data.content)
-        db.add(instructions)
-    else:
-        instructions.content = data.content
-    db.commit()
-    db.close()
+    await executors.run_blocking("db", write_text_content, ExpertInstructions, data.content)
     return {"message": "Expert instructions updated successfully"}
 
 # Маршрут для скачивания/загрузки онтологии
@@ -578,12 +680,14 @@ async def update_expert_instructions(data: TextContent, user: str = Depends(is_a
 async def download_ontology():
     """Скачать файл онтологии (доступно всем)"""
     logger.info("Downloading ontology file")
-    if not os.path.exists(config.OWL_FILE_PATH):
+    # Актуальный RDF/XML: журнал свернут в файл или база триплетов выгружена
+    ontology_path = await aio.export_ontology()
+    if not os.path.exists(ontology_path):
         logger.error("Ontology file not found")
         raise HTTPException(status_code=404, detail="Файл онтологии не найден")
     logger.info("Ontology file found, sending to client")
     return FileResponse(
-        path=config.OWL_FILE_PATH,
+        path=ontology_path,
         filename="asana_ontology.owl",
         media_type="application/rdf+xml"
     )
@@ -594,24 +698,85 @@ async def upload_ontology(ontology_file: UploadFile = File(...), user: str = Dep
     logger.info(f"Uploading ontology file by user: {user}")
     try:
         content = await ontology_file.read()
-        with open(config.OWL_FILE_PATH, "wb") as f:
-            f.write(content)
+        await aio.import_ontology(content)
+        await aio.migrate_base64_photos()
+        await aio.migrate_photo_dhashes()
         logger.info("Ontology file uploaded successfully")
         return {"message": "Ontology file uploaded successfully"}
     except Exception as e:
         logger.error(f"Error uploading ontology file: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error uploading ontology file: {str(e)}")
 
-@app.get("/asana/{asana_id}/photo-by-source/{source_id}")
+@app.post("/photos/check-duplicates")
+async def check_photo_duplicates(photo: UploadFile = File(...), user: str = Depends(is_expert_or_admin)):
+    """
+    Проверить фото до добавления (только эксперты и админы): точные копии в каталоге (exact)
+    и похожие фото (near) с расстоянием между их dHash. Фото сохраняется в хранилище по хэшу,
+    поэтому последующее добавление того же файла не пишет его повторно.
+    """
+    check_photo_sizes(photo)
+    try:
+        photo_meta = await aio.save_photo_file(photo.file)
+    except photo_store.PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {"hash": photo_meta["hash"], "dhash": photo_meta["dhash"],
+            **await aio.find_photo_duplicates(photo_meta["hash"], photo_meta["dhash"])}
+
+@app.get("/photos/{photo_hash}")
+async def get_photo(request: Request, photo_hash: str):
+    """
+    Отдать фото из хранилища по SHA-256 его содержимого (доступно всем). Содержимое по этому
+    адресу не меняется, поэтому ответ кэшируется как неизменяемый; поддерживаются Range и If-None-Match.
+    """
+    if not photo_store.has_photo(photo_hash):
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    return file_response(request, photo_store.photo_path(photo_hash), photo_store.read_mime_type(photo_hash),
+                         f'"{photo_hash}"', IMMUTABLE_CACHE_CONTROL)
+
+@app.get("/photos/{photo_hash}/{variant}")
+async def get_photo_variant(request: Request, photo_hash: str, variant: str):
+    """
+    Отдать копию фото: thumb, medium или original (доступно всем). Пока копия не готова,
+    отдается оригинал без долгого кэширования, а подготовка копий ставится в очередь.
+    """
+    if variant not in photo_store.VARIANTS:
+        raise HTTPException(status_code=404, detail="Неизвестный вариант фото")
+    if not photo_store.has_photo(photo_hash):
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    if photo_store.has_variant(photo_hash, variant):
+        if variant != "original":
+            return file_response(request, photo_store.variant_path(photo_hash, variant), photo_store.VARIANT_MIME_TYPE,
+                                 f'"{photo_hash}-{variant}"', IMMUTABLE_CACHE_CONTROL)
+        return file_response(request, photo_store.photo_path(photo_hash), photo_store.read_mime_type(photo_hash),
+                             f'"{photo_hash}"', IMMUTABLE_CACHE_CONTROL)
+    photo_store.schedule_variants(photo_hash)
+    # Позже по этому адресу будет уменьшенная копия — клиент должен перепроверить ответ
+    return file_response(request, photo_store.photo_path(photo_hash), photo_store.read_mime_type(photo_hash),
+                         f'"{photo_hash}"', CACHE_CONTROL)
+
+@app.get("/asana/{asana_id}/photo-by-source/{source_id}", dependencies=[Depends(graph_etag)])
 async def get_asana_photo_by_source(asana_id: str, source_id: str):
     """
-    Получить фото асаны из конкретного источника (если есть)
+    Получить метаданные фото асаны из конкретного источника (если есть); сами байты — по photo.url
     """
-    photo = get_photo_of_asana_from_source(asana_id, source_id)
+    photo = await aio.get_photo_of_asana_from_source(asana_id, source_id)
     if photo:
         return {"photo": photo}
     return {"photo": None}
 
+@app.get("/asana/{asana_id}/photo-by-source/{source_id}/image")
+async def get_asana_photo_image_by_source(asana_id: str, source_id: str, variant: str = Query("original", regex="^(thumb|medium|original)$")):
+    """
+    Фото асаны из источника как изображение: перенаправление на адрес фото по хэшу содержимого,
+    который браузер и прокси кэшируют как неизменяемый (доступно всем)
+    """
+    photo = await aio.get_photo_of_asana_from_source(asana_id, source_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    url = photo["url"] if variant == "original" else photo_store.variant_url(photo["hash"], variant)
+    # Связь асаны и источника может измениться, поэтому само перенаправление не кэшируется надолго
+    return RedirectResponse(url=url, status_code=307, headers={"Cache-Control": CACHE_CONTROL})
+
 templates = Jinja2Templates(directory="frontend/app/templates")
 
 def get_user_role_from_request(request: Request) -> str:
@@ -630,33 +795,18 @@ def get_asana_by_id(asana_id: str):
     """
     logger.info(f"get_asana_by_id called with ID: {asana_id}")
     
-    # Если передан не полный URI, добавляем префикс
-    if not asana_id.startswith('http'):
-        # Проверяем, начинается ли ID с 'asana_'
-        if not asana_id.startswith('asana_'):
-            asana_id = f"asana_{asana_id}"
-        asana_id = f"http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#{asana_id}"
-    
-    logger.info(f"Searching for asana with URI: {asana_id}")
-    asanas = load_asanas()
-    logger.info(f"Loaded {len(asanas)} asanas")
-    
-    for asana in asanas:
-        logger.debug(f"Comparing with asana ID: {asana['id']}")
-        if asana["id"] == asana_id:
-            logger.info(f"Found matching asana: {asana['name']['name_ru']}")
-            return asana
+    asana = get_asana(asana_id)
+    if asana:
+        logger.info(f"Found matching asana: {asana['name']['name_ru']}")
+        return asana
     
     logger.warning(f"No asana found with ID: {asana_id}")
     return None
 
 @app.get("/asanas-page")
 def asanas_page(request: Request, search_query: str = '', current_letter: str = ''):
-    asanas = load_asanas()
-    grouped_asanas = {}  # группировка по буквам
-    for asana in asanas:
-        first_letter = asana["name"]["ru"][0].upper() if asana["name"]["ru"] else "?"
-        grouped_asanas.setdefault(first_letter, []).append(asana)
+    # группировка по буквам из алфавитного индекса
+    grouped_asanas = {item["letter"]: get_asanas_by_first_letter(item["letter"]) for item in get_alphabet()}
     
     # Получаем роль пользователя
     user_role = get_user_role_from_request(request)
@@ -688,15 +838,6 @@ def asana_detail_page(request: Request, asana_id: str = Path(...)):
     if asana_id.endswith('-page'):
         asana_id = asana_id[:-5]
     
-    # Если передан не полный URI, добавляем префикс
-    if not asana_id.startswith('http'):
-        # Проверяем, начинается ли ID с 'asana_'
-        if not asana_id.startswith('asana_'):
-            asana_id = f"asana_{asana_id}"
-        full_uri = f"http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#{asana_id}"
-        logger.info(f"Converted ID to full URI: {full_uri}")
-        asana_id = full_uri
-    
     logger.info(f"Looking for asana with ID: {asana_id}")
     asana = get_asana_by_id(asana_id)
     
@@ -799,24 +940,58 @@ def add_source_page(request: Request):
         }
     )
 
+@app.get("/sources/search", dependencies=[Depends(graph_etag)])
+async def search_sources_route(request: Request, q: str = Query(..., min_length=1), limit: Optional[int] = PAGE_LIMIT,
+                               cursor: Optional[str] = PAGE_CURSOR):
+    """Поиск источников по началу слов названия, автора и издательства, постранично (доступно всем)"""
+    logger.info(f"Searching sources with query: {q}, limit: {limit}")
+
+    def build():
+        try:
+            return paging.paginate_sources(search_sources(q), limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_json(request, build)
+
+@app.get("/sources/counts", dependencies=[Depends(graph_etag)])
+async def get_sources_counts(request: Request):
+    """Число асан и фото в каждом источнике: {id источника: {"asanas", "photos"}} (доступно всем)"""
+    return await cached_json(request, get_source_counts)
+
+# Объявлен после /sources/add, /sources/search и /sources/counts, чтобы не перехватывать их пути
+@app.get("/sources/{source_id:path}", dependencies=[Depends(graph_etag)])
+async def get_source_record(request: Request, source_id: str):
+    """Один источник по короткому ID или полному URI (доступно всем)"""
+    logger.info(f"Getting source: {source_id}")
+
+    def build():
+        source = get_source(source_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Источник не найден")
+        return source
+
+    return await cached_json(request, build)
+
 # API routes
 @app.get("/api/asanas/search")
 async def api_search_asanas(query: str, fuzzy: bool = True):
     """Поиск асан по имени"""
     try:
-        asanas = search_asanas_by_name(query, fuzzy)
+        asanas = await aio.search_asanas_by_name(query, fuzzy)
         return {"asanas": asanas}
     except Exception as e:
         logger.error(f"Error searching asanas: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/admin/update-user-role")
-async def update_user_role(role_update: UserRoleUpdate, admin: str = Depends(is_admin)):
-    """Обновить роль пользователя (только для администратора)"""
-    logger.info(f"Updating user role. Admin: {admin}, User: {role_update.username}, New role: {role_update.new_role}")
-    
+@app.get("/admin/response-cache")
+async def get_response_cache_stats(admin: str = Depends(is_admin)):
+    """Счетчики кэша готовых ответов: попадания, промахи, вытеснения и занятая память (только админ)"""
+    return response_cache.stats()
+
+def set_user_role(username: str, new_role: UserRole):
     db = SessionLocal()
-    user = db.query(User).filter(User.username == role_update.username).first()
+    user = db.query(User).filter(User.username == username).first()
     
     if not user:
         db.close()
@@ -831,12 +1006,18 @@ async def update_user_role(role_update: UserRoleUpdate, admin: str = Depends(is_
         db.close()
         raise HTTPException(status_code=403, detail="Невозможно изменить роль администратора")
     
-    user.role = role_update.new_role
+    user.role = new_role
     db.commit()
     db.close()
-    
+    return {"username": username, "new_role": new_role}
+
+@app.post("/admin/update-user-role")
+async def update_user_role(role_update: UserRoleUpdate, admin: str = Depends(is_admin)):
+    """Обновить роль пользователя (только для администратора)"""
+    logger.info(f"Updating user role. Admin: {admin}, User: {role_update.username}, New role: {role_update.new_role}")
+    result = await executors.run_blocking("db", set_user_role, role_update.username, role_update.new_role)
     logger.info(f"Successfully updated role for user {role_update.username} to {role_update.new_role}")
-    return {"username": user.username, "new_role": user.role}
+    return result
 
 @app.get("/api/auth/check")
 async def check_auth(request: Request):
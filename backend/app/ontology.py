@@ -1,6 +1,11 @@
 from rdflib import Graph, Namespace, URIRef, Literal, RDF
-from app import config
-from typing import Optional, Dict, Any
+from app import config, graph_store
+from app.graph_store import ASANA, ensure_ontology_file_exists, graph_transaction
+from app import photo_store, perceptual_hash, collation, text_search
+from app.projection import get_projection
+from app.paging import asana_sort_key, source_sort_key
+from app.resolver import resolve_uri
+from typing import BinaryIO, Optional, Dict, Any, List, Tuple, Union
 import uuid
 import logging
 import os
@@ -8,261 +13,214 @@ import base64
 
 logger = logging.getLogger("asana_service.ontology")
 
-ASANA = Namespace("http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#")
-
-def ensure_ontology_file_exists():
-    """Создает файл онтологии, если он не существует"""
-    try:
-        if not os.path.exists(config.OWL_FILE_PATH):
-            logger.info(f"Creating new ontology file at {config.OWL_FILE_PATH}")
-            # Создаем базовый граф с основными классами
-            g = Graph()
-            g.bind("asana", ASANA)
-            
-            # Добавляем основные классы
-            g.add((ASANA.Asana, RDF.type, RDF.Class))
-            g.add((ASANA.AsanaName, RDF.type, RDF.Class))
-            g.add((ASANA.AsanaSource, RDF.type, RDF.Class))
-            g.add((ASANA.AsanaPhoto, RDF.type, RDF.Class))
-            
-            # Создаем директорию, если её нет
-            os.makedirs(os.path.dirname(config.OWL_FILE_PATH), exist_ok=True)
-            
-            # Сохраняем граф
-            g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-            logger.info("Successfully created new ontology file")
-        return True
-    except Exception as e:
-        logger.error(f"Error ensuring ontology file exists: {str(e)}")
-        raise
-
 def get_graph():
-    try:
-        ensure_ontology_file_exists()
-        logger.info(f"Loading RDF graph from {config.OWL_FILE_PATH}")
-        g = Graph()
-        g.parse(config.OWL_FILE_PATH, format="xml")
-        logger.debug(f"Successfully loaded graph with {len(g)} triples")
-        return g
-    except Exception as e:
-        logger.error(f"Failed to load RDF graph: {str(e)}")
-        raise
+    """Возвращает закэшированный в процессе граф онтологии"""
+    return graph_store.get_graph()
+
+def _add_photo_triples(g, photo_uri: URIRef, photo_meta: Dict[str, Any]):
+    g.add((photo_uri, RDF.type, ASANA.AsanaPhoto))
+    g.add((photo_uri, ASANA.photoHash, Literal(photo_meta["hash"])))
+    g.add((photo_uri, ASANA.photoMimeType, Literal(photo_meta["mime_type"])))
+    g.add((photo_uri, ASANA.photoSize, Literal(photo_meta["size"])))
+    g.add((photo_uri, ASANA.photoWidth, Literal(photo_meta["width"])))
+    g.add((photo_uri, ASANA.photoHeight, Literal(photo_meta["height"])))
+    if photo_meta.get("dhash"):
+        g.add((photo_uri, ASANA.photoDHash, Literal(photo_meta["dhash"])))
 
 def load_asanas():
-    logger.info("Starting to load asanas from graph")
-    g = get_graph()
-    asanas = []
-    all_asanas = list(g.subjects(RDF.type, ASANA.Asana))
-    logger.info(f"Found {len(all_asanas)} asanas in graph")
-    for asana in all_asanas:
-        logger.debug(f"Processing asana: {asana}")
-        name_obj = g.value(asana, ASANA.hasName)
-        photo_objs = list(g.objects(asana, ASANA.hasPhoto))
-        logger.debug(f"Name object: {name_obj}")
-        logger.debug(f"Photo objects: {photo_objs}")
-        name_data = {
-            "name_ru": str(g.value(name_obj, ASANA.nameInRussian)) if name_obj else "",
-            "name_sanskrit": str(g.value(name_obj, ASANA.nameInSanskrit)) if name_obj and g.value(name_obj, ASANA.nameInSanskrit) else "",
-            "transliteration": str(g.value(name_obj, ASANA.nameInTranslit)) if name_obj and g.value(name_obj, ASANA.nameInTranslit) else "",
-            "definition": str(g.value(name_obj, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a)) if name_obj and g.value(name_obj, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a) else ""
-        }
-        source_obj = None
-        if photo_objs:
-            source_obj = g.value(photo_objs[0], ASANA.hasSource)
-            logger.debug(f"Source object: {source_obj}")
-        source_data = {}
-        if source_obj:
-            source_data = {
-                "title": str(g.value(source_obj, ASANA.sourseTitle)),
-                "author": str(g.value(source_obj, ASANA.sourceAuthor)),
-                "year": int(g.value(source_obj, ASANA.sourceYear)),
-                "publisher": str(g.value(source_obj, ASANA.sourcePublisher)) if g.value(source_obj, ASANA.sourcePublisher) else "",
-                "pages": int(g.value(source_obj, ASANA.sourcePages)) if g.value(source_obj, ASANA.sourcePages) else 0,
-                "annotation": str(g.value(source_obj, ASANA.sourceAnnotation)) if g.value(source_obj, ASANA.sourceAnnotation) else ""
-            }
-        photos_base64 = [str(g.value(photo, ASANA.base64Photo)) for photo in photo_objs if g.value(photo, ASANA.base64Photo)]
-        logger.debug(f"Photos count: {len(photos_base64)}")
-        asana_data = {
-            "id": str(asana),
-            "name": name_data,
-            "source": source_data,
-            "photos": photos_base64,
-            "photo": photos_base64[0] if photos_base64 else ""
-        }
-        logger.debug(f"Adding asana with ID: {asana_data['id']}")
-        asanas.append(asana_data)
+    logger.info("Loading asanas from projection")
+    # Карты проекции обходятся по частям, а не по порядку добавления — отдаем в порядке каталога
+    asanas = list(get_projection().sorted_asanas())
     logger.info(f"Successfully loaded {len(asanas)} asanas")
     return asanas
 
-def add_asana(name_id: str, source_id: str, photo_base64: str):
+def load_sorted_asanas():
+    """Все асаны в порядке каталога (для постраничной выдачи)"""
+    return get_projection().sorted_asanas()
+
+def get_asana(asana_id: str) -> Optional[Dict[str, Any]]:
+    """Одна асана по полному URI или короткому ID (поиск по индексу проекции); None — нет такой асаны"""
+    asana_uri = resolve_uri(asana_id, ASANA.Asana)
+    return get_projection().asanas.get(str(asana_uri)) if asana_uri else None
+
+def _add_asana_triples(g, name_uri: URIRef, source_uri: URIRef, photo_meta: Dict[str, Any]) -> URIRef:
+    # Create new asana instance
+    asana_uri = URIRef(f"{ASANA}asana_{uuid.uuid4()}")
+    logger.debug(f"Created asana URI: {asana_uri}")
+
+    g.add((asana_uri, RDF.type, ASANA.Asana))
+    # Link existing name
+    g.add((asana_uri, ASANA.hasName, name_uri))
+
+    # Create and link photo
+    photo_uri = URIRef(f"{ASANA}photo_{uuid.uuid4()}")
+    _add_photo_triples(g, photo_uri, photo_meta)
+    g.add((photo_uri, ASANA.hasSource, source_uri))
+    g.add((asana_uri, ASANA.hasPhoto, photo_uri))
+    logger.debug(f"Linked name {name_uri} and photo {photo_uri}")
+    return asana_uri
+
+def _store_photo(photo: Union[bytes, BinaryIO, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Фото из памяти или из файла загрузки (файл пишется в хранилище потоково); предел размера — PHOTO_MAX_BYTES.
+    Словарь — метаданные фото, уже сохраненного в хранилище (save_photo_file в пуле фото).
+    """
+    if isinstance(photo, dict):
+        return photo
+    if isinstance(photo, bytes):
+        return photo_store.save_photo(photo)
+    return photo_store.save_photo_file(photo)
+
+def add_asana(name_id: str, source_id: str, photo: Union[bytes, BinaryIO, Dict[str, Any]]):
     try:
         logger.info("Starting to add new asana")
-        logger.debug(f"Parameters: name_id={name_id}, source_id={source_id}, photo_base64=<truncated>")
-        
-        g = get_graph()
-        
-        # Create new asana instance
-        asana_uri = URIRef(f"{ASANA}asana_{uuid.uuid4()}")
-        logger.debug(f"Created asana URI: {asana_uri}")
-        
-        g.add((asana_uri, RDF.type, ASANA.Asana))
-        logger.debug("Added asana type triple")
-        
-        # Link existing name
-        name_uri = URIRef(name_id)
-        g.add((asana_uri, ASANA.hasName, name_uri))
-        logger.debug(f"Linked name: {name_uri}")
-        
-        # Create and link photo
-        photo_uri = URIRef(f"{ASANA}photo_{uuid.uuid4()}")
-        logger.debug(f"Created photo URI: {photo_uri}")
-        
-        g.add((photo_uri, RDF.type, ASANA.AsanaPhoto))
-        g.add((photo_uri, ASANA.base64Photo, Literal(photo_base64)))
-        g.add((photo_uri, ASANA.hasSource, URIRef(source_id)))
-        g.add((asana_uri, ASANA.hasPhoto, photo_uri))
-        logger.debug("Added photo and source triples")
-        
-        logger.info(f"Saving graph to {config.OWL_FILE_PATH}")
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        logger.info("Successfully saved graph")
-        
-        return str(asana_uri)
+        logger.debug(f"Parameters: name_id={name_id}, source_id={source_id}")
+
+        # Фото пишем в хранилище до изменения графа, в граф попадают только метаданные
+        photo_meta = _store_photo(photo)
+
+        with graph_transaction() as g:
+            return str(_add_asana_triples(g, URIRef(name_id), URIRef(source_id), photo_meta))
     except Exception as e:
         logger.error(f"Error adding asana: {str(e)}", exc_info=True)
         raise
 
 def load_sources():
-    logger.info("Starting to load sources from graph")
-    g = get_graph()
-    sources = []
-    for source in g.subjects(RDF.type, ASANA.AsanaSource):
-        source_data = {
-            "id": str(source),
-            "title": str(g.value(source, ASANA.sourseTitle)),
-            "author": str(g.value(source, ASANA.sourceAuthor)),
-            "year": int(g.value(source, ASANA.sourceYear)),
-            "publisher": str(g.value(source, ASANA.sourcePublisher)) if g.value(source, ASANA.sourcePublisher) else "",
-            "pages": int(g.value(source, ASANA.sourcePages)) if g.value(source, ASANA.sourcePages) else 0,
-            "annotation": str(g.value(source, ASANA.sourceAnnotation)) if g.value(source, ASANA.sourceAnnotation) else ""
-        }
-        logger.debug(f"Loaded source: {source_data}")
-        sources.append(source_data)
+    logger.info("Loading sources from projection")
+    sources = sorted(get_projection().sources.values(), key=source_sort_key)
     logger.info(f"Successfully loaded {len(sources)} sources")
     return sources
 
+def get_source(source_id: str) -> Optional[Dict[str, Any]]:
+    """Один источник по полному URI или короткому ID; None — нет такого источника"""
+    source_uri = resolve_uri(source_id, ASANA.AsanaSource)
+    return get_projection().sources.get(str(source_uri)) if source_uri else None
+
+def search_sources(query: str) -> List[Dict[str, Any]]:
+    """
+    Источники, у которых каждое слово запроса — начало слова в названии, авторе или издательстве
+    (индекс начал слов в проекции), в порядке списка источников (автор, название)
+    """
+    projection = get_projection()
+    sources = [projection.sources[source_id] for source_id in projection.search_sources(query)]
+    sources.sort(key=source_sort_key)
+    logger.info(f"Found {len(sources)} sources matching query: {query}")
+    return sources
+
+def _add_source_triples(g, source_data: Dict[str, Any]) -> URIRef:
+    source_uri = URIRef(f"{ASANA}source_{uuid.uuid4()}")
+    logger.debug(f"Created source URI: {source_uri}")
+
+    g.add((source_uri, RDF.type, ASANA.AsanaSource))
+    g.add((source_uri, ASANA.sourseTitle, Literal(source_data["title"])))
+    g.add((source_uri, ASANA.sourceAuthor, Literal(source_data["author"])))
+    g.add((source_uri, ASANA.sourceYear, Literal(source_data["year"])))
+
+    # Добавляем новые поля источника, если они есть
+    if "publisher" in source_data and source_data["publisher"]:
+        g.add((source_uri, ASANA.sourcePublisher, Literal(source_data["publisher"])))
+
+    if "pages" in source_data and source_data["pages"]:
+        g.add((source_uri, ASANA.sourcePages, Literal(source_data["pages"])))
+
+    if "annotation" in source_data and source_data["annotation"]:
+        g.add((source_uri, ASANA.sourceAnnotation, Literal(source_data["annotation"])))
+    return source_uri
+
 def add_source(source_data: Dict[str, Any]) -> str:
     try:
         logger.info("Starting to add new source")
         logger.debug(f"Source data: {source_data}")
         
-        g = get_graph()
-        source_uri = URIRef(f"{ASANA}source_{uuid.uuid4()}")
-        logger.debug(f"Created source URI: {source_uri}")
-        
-        g.add((source_uri, RDF.type, ASANA.AsanaSource))
-        g.add((source_uri, ASANA.sourseTitle, Literal(source_data["title"])))
-        g.add((source_uri, ASANA.sourceAuthor, Literal(source_data["author"])))
-        g.add((source_uri, ASANA.sourceYear, Literal(source_data["year"])))
-        
-        # Добавляем новые поля источника, если они есть
-        if "publisher" in source_data and source_data["publisher"]:
-            g.add((source_uri, ASANA.sourcePublisher, Literal(source_data["publisher"])))
-        
-        if "pages" in source_data and source_data["pages"]:
-            g.add((source_uri, ASANA.sourcePages, Literal(source_data["pages"])))
-        
-        if "annotation" in source_data and source_data["annotation"]:
-            g.add((source_uri, ASANA.sourceAnnotation, Literal(source_data["annotation"])))
-            
-        logger.debug("Added source triples")
-        
-        logger.info(f"Saving graph to {config.OWL_FILE_PATH}")
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        logger.info("Successfully saved graph")
-        
-        return str(source_uri)
+        with graph_transaction() as g:
+            return str(_add_source_triples(g, source_data))
     except Exception as e:
         logger.error(f"Error adding source: {str(e)}", exc_info=True)
         raise
 
 def load_asana_names():
-    logger.info("Starting to load asana names from graph")
-    g = get_graph()
-    names = []
-    for name in g.subjects(RDF.type, ASANA.AsanaName):
-        name_data = {
-            "id": str(name),
-            "name_ru": str(g.value(name, ASANA.nameInRussian)),
-            "name_sanskrit": str(g.value(name, ASANA.nameInSanskrit)) if g.value(name, ASANA.nameInSanskrit) else "",
-            "transliteration": str(g.value(name, ASANA.nameInTranslit)) if g.value(name, ASANA.nameInTranslit) else "",
-            "definition": str(g.value(name, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a)) if g.value(name, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a) else ""
-        }
-        logger.debug(f"Loaded asana name: {name_data}")
-        names.append(name_data)
+    logger.info("Loading asana names from projection")
+    names = sorted(get_projection().names.values(), key=lambda name: (collation.sort_key(name["name_ru"]), name["id"]))
     logger.info(f"Successfully loaded {len(names)} asana names")
     return names
 
+def _add_name_triples(g, name_data: Dict[str, str]) -> URIRef:
+    name_uri = URIRef(f"{ASANA}name_{uuid.uuid4()}")
+    logger.debug(f"Created name URI: {name_uri}")
+
+    g.add((name_uri, RDF.type, ASANA.AsanaName))
+    g.add((name_uri, ASANA.nameInRussian, Literal(name_data["name_ru"])))
+    if "name_sanskrit" in name_data and name_data["name_sanskrit"]:
+        g.add((name_uri, ASANA.nameInSanskrit, Literal(name_data["name_sanskrit"])))
+    if "transliteration" in name_data and name_data["transliteration"]:
+        g.add((name_uri, ASANA.nameInTranslit, Literal(name_data["transliteration"])))
+    if "definition" in name_data and name_data["definition"]:
+        g.add((name_uri, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a, Literal(name_data["definition"])))
+    return name_uri
+
 def add_asana_name(name_data: Dict[str, str]) -> str:
     try:
         logger.info("Starting to add new asana name")
         logger.debug(f"Name data: {name_data}")
         
-        g = get_graph()
-        name_uri = URIRef(f"{ASANA}name_{uuid.uuid4()}")
-        logger.debug(f"Created name URI: {name_uri}")
-        
-        g.add((name_uri, RDF.type, ASANA.AsanaName))
-        g.add((name_uri, ASANA.nameInRussian, Literal(name_data["name_ru"])))
-        if "name_sanskrit" in name_data and name_data["name_sanskrit"]:
-            g.add((name_uri, ASANA.nameInSanskrit, Literal(name_data["name_sanskrit"])))
-        if "transliteration" in name_data and name_data["transliteration"]:
-            g.add((name_uri, ASANA.nameInTranslit, Literal(name_data["transliteration"])))
-        if "definition" in name_data and name_data["definition"]:
-            g.add((name_uri, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a, Literal(name_data["definition"])))
-        logger.debug("Added name triples")
-        logger.info(f"Saving graph to {config.OWL_FILE_PATH}")
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        logger.info("Successfully saved graph")
-        return str(name_uri)
+        with graph_transaction() as g:
+            return str(_add_name_triples(g, name_data))
     except Exception as e:
         logger.error(f"Error adding asana name: {str(e)}", exc_info=True)
         raise
 
+def bulk_add_asanas(rows: List[Dict[str, Any]]) -> List[str]:
+    """
+    Добавляет уже проверенные строки массового импорта одной транзакцией (один коммит в журнал).
+    Строка: name_id или name_data, source_id или source_data, photo_meta (фото уже в хранилище).
+    Одинаковые новые названия и источники внутри пакета создаются один раз.
+    """
+    logger.info(f"Bulk adding {len(rows)} asanas")
+    created_names: Dict[tuple, URIRef] = {}
+    created_sources: Dict[tuple, URIRef] = {}
+    asana_ids = []
+    with graph_transaction() as g:
+        for row in rows:
+            if row.get("name_id"):
+                name_uri = URIRef(row["name_id"])
+            else:
+                key = tuple(sorted(row["name_data"].items()))
+                if key not in created_names:
+                    created_names[key] = _add_name_triples(g, row["name_data"])
+                name_uri = created_names[key]
+            if row.get("source_id"):
+                source_uri = URIRef(row["source_id"])
+            else:
+                key = tuple(sorted(row["source_data"].items()))
+                if key not in created_sources:
+                    created_sources[key] = _add_source_triples(g, row["source_data"])
+                source_uri = created_sources[key]
+            asana_ids.append(str(_add_asana_triples(g, name_uri, source_uri, row["photo_meta"])))
+    logger.info(f"Bulk added {len(asana_ids)} asanas, {len(created_names)} new names, {len(created_sources)} new sources")
+    return asana_ids
+
 def delete_any_by_uri(uri: str) -> bool:
     try:
-        g = get_graph()
-        obj_uri = URIRef(uri)
-        found = False
-        # Пробуем точное совпадение
-        if (obj_uri, None, None) in g or (None, None, obj_uri) in g:
-            found = True
-            g.remove((obj_uri, None, None))
-            g.remove((None, None, obj_uri))
-        else:
-            # Если не найдено — ищем по окончанию (UUID)
-            suffix = uri.split("_")[-1]
-            candidates = [s for s in g.subjects() if str(s).endswith(suffix)]
-            for cand in candidates:
-                g.remove((cand, None, None))
-                g.remove((None, None, cand))
+        with graph_transaction() as g:
+            obj_uri = URIRef(uri)
+            found = False
+            # Пробуем точное совпадение
+            if (obj_uri, None, None) in g or (None, None, obj_uri) in g:
                 found = True
-            # Если всё равно не найдено — ищем по подстроке UUID
+            else:
+                # Если не найдено — ищем по короткому id (UUID) в индексе
+                obj_uri = resolve_uri(uri)
+                found = obj_uri is not None
+            if found:
+                g.remove((obj_uri, None, None))
+                g.remove((None, None, obj_uri))
             if not found:
-                uuid_part = suffix
-                candidates = [s for s in g.subjects() if uuid_part in str(s)]
-                for cand in candidates:
-                    g.remove((cand, None, None))
-                    g.remove((None, None, cand))
-                    found = True
-        if not found:
-            print(f'НЕ НАЙДЕН В ГРАФЕ: {uri}')
-            return False
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        print(f'УДАЛЁН(Ы): {uri}')
-        return True
+                logger.warning(f"Entity to delete not found in graph: {uri}")
+                return False
+            logger.info(f"Deleted entity: {uri}")
+            return True
     except Exception as e:
-        print(f'ОШИБКА ПРИ УДАЛЕНИИ: {e}')
+        logger.error(f"Error deleting entity {uri}: {str(e)}", exc_info=True)
         raise
 
 def delete_source_from_ontology(source_id: str) -> bool:
@@ -273,199 +231,245 @@ def delete_asana_name_from_ontology(name_id: str) -> bool:
 
 def delete_asana_from_ontology(asana_id: str) -> bool:
     try:
-        g = get_graph()
-        ASANA = Namespace("http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#")
-        asana_uri = URIRef(asana_id)
-        # Если не найдено точное совпадение — ищем по UUID
-        if (asana_uri, None, None) not in g:
-            suffix = asana_id.split("_")[-1]
-            candidates = [s for s in g.subjects(RDF.type, ASANA.Asana) if str(s).endswith(suffix)]
-            if not candidates:
-                print(f'Асана не найдена: {asana_id}')
+        with graph_transaction() as g:
+            asana_uri = resolve_uri(asana_id, ASANA.Asana)
+            if asana_uri is None:
+                logger.warning(f"Asana to delete not found: {asana_id}")
                 return False
-            asana_uri = candidates[0]
-        # Найти все связанные фото
-        photo_uris = list(g.objects(asana_uri, ASANA.hasPhoto))
-        for photo_uri in photo_uris:
-            # Удалить все триплеты, где фигурирует фото
-            g.remove((photo_uri, None, None))
-            g.remove((None, None, photo_uri))
-        # Удалить все триплеты, где фигурирует асана
-        g.remove((asana_uri, None, None))
-        g.remove((None, None, asana_uri))
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        print(f'Удалена асана и связанные фото: {asana_id}')
-        return True
+            # Найти все связанные фото
+            photo_uris = list(g.objects(asana_uri, ASANA.hasPhoto))
+            for photo_uri in photo_uris:
+                # Удалить все триплеты, где фигурирует фото
+                g.remove((photo_uri, None, None))
+                g.remove((None, None, photo_uri))
+            # Удалить все триплеты, где фигурирует асана
+            g.remove((asana_uri, None, None))
+            g.remove((None, None, asana_uri))
+            logger.info(f"Deleted asana {asana_id} and its photos")
+            return True
     except Exception as e:
-        print(f'ОШИБКА ПРИ УДАЛЕНИИ АСАНЫ: {e}')
+        logger.error(f"Error deleting asana {asana_id}: {str(e)}", exc_info=True)
         raise
 
-def add_photo_to_asana(asana_id: str, photo_bytes: bytes, source_id: str = None):
-    try:
-        g = get_graph()
-        asana_uri = URIRef(asana_id)
-        # Если не найдено точное совпадение — ищем по UUID
-        if (asana_uri, None, None) not in g:
-            suffix = asana_id.split("_")[-1]
-            candidates = [s for s in g.subjects(RDF.type, ASANA.Asana) if str(s).endswith(suffix)]
-            if not candidates:
-                raise Exception("Асана не найдена")
-            asana_uri = candidates[0]
-        photo_base64 = base64.b64encode(photo_bytes).decode()
+def resolve_photo_target(asana_id: str, source_id: str = None) -> Tuple[URIRef, Optional[URIRef]]:
+    """Полные URI асаны и источника для нового фото; проверяется до записи фото в хранилище"""
+    asana_uri = resolve_uri(asana_id, ASANA.Asana)
+    if asana_uri is None:
+        raise Exception("Асана не найдена")
+    # Источник может прийти коротким ID, а в графе у фото — полный URI
+    source_uri = resolve_uri(source_id, ASANA.AsanaSource) if source_id else None
+    if source_id and source_uri is None:
+        raise Exception("Источник не найден")
+    return asana_uri, source_uri
+
+def _attached_photo(g, asana_uri: URIRef, source_uri: Optional[URIRef], photo_hash: str) -> Optional[URIRef]:
+    """
+    Фото асаны с тем же содержимым и источником. Ищется в графе транзакции, а не в проекции:
+    в графе есть и изменения группы, которая еще не сохранена (GROUP_COMMIT_WINDOW).
+    """
+    for existing in g.subjects(ASANA.photoHash, Literal(photo_hash)):
+        if (asana_uri, ASANA.hasPhoto, existing) in g and g.value(existing, ASANA.hasSource) == source_uri:
+            return existing
+    return None
+
+def add_photo_to_asana(asana_id: str, photo: Union[bytes, BinaryIO, Dict[str, Any]], source_id: str = None):
+    # Асана и источник проверяются до записи фото, чтобы в хранилище не оставались фото без асаны
+    asana_uri, source_uri = resolve_photo_target(asana_id, source_id)
+    photo_meta = _store_photo(photo)
+    with graph_transaction() as g:
+        if (asana_uri, RDF.type, ASANA.Asana) not in g:
+            raise Exception("Асана не найдена")
+        if source_uri is not None and (source_uri, RDF.type, ASANA.AsanaSource) not in g:
+            raise Exception("Источник не найден")
+        # То же фото того же источника у асаны уже есть — второй узел фото не создаем
+        existing = _attached_photo(g, asana_uri, source_uri, photo_meta["hash"])
+        if existing is not None:
+            logger.info(f"Photo {photo_meta['hash']} is already attached to asana {asana_uri}")
+            return str(existing)
         photo_uri = URIRef(f"{ASANA}photo_{uuid.uuid4()}")
-        g.add((photo_uri, RDF.type, ASANA.AsanaPhoto))
-        g.add((photo_uri, ASANA.base64Photo, Literal(photo_base64)))
-        
+        _add_photo_triples(g, photo_uri, photo_meta)
+
         # Если указан источник, добавляем его
-        if source_id:
-            source_uri = URIRef(source_id)
+        if source_uri is not None:
             g.add((photo_uri, ASANA.hasSource, source_uri))
-            
+
         g.add((asana_uri, ASANA.hasPhoto, photo_uri))
-        g.serialize(destination=config.OWL_FILE_PATH, format="xml")
-        
+
         return str(photo_uri)
-    except Exception as e:
-        raise
 
 # Получение асан по первой букве (для каталога по алфавиту)
 def get_asanas_by_first_letter(letter: str):
     logger.info(f"Getting asanas starting with letter: {letter}")
-    asanas = load_asanas()
-    filtered_asanas = [asana for asana in asanas if asana["name"]["name_ru"] and asana["name"]["name_ru"][0].upper() == letter.upper()]
+    projection = get_projection()
+    asana_ids = projection.letters.get(collation.first_letter(letter), ())
+    filtered_asanas = sorted((projection.asanas[asana_id] for asana_id in asana_ids), key=asana_sort_key)
     logger.info(f"Found {len(filtered_asanas)} asanas starting with letter: {letter}")
     return filtered_asanas
 
+# Алфавит каталога: буквы, на которые есть асаны, и количество асан на каждую
+def get_alphabet():
+    projection = get_projection()
+    letters = sorted(projection.letters, key=collation.letter_sort_key)
+    return [{"letter": letter, "count": len(projection.letters[letter])} for letter in letters]
+
 # Получение асан по источнику
 def get_asanas_by_source(source_id: str):
     logger.info(f"Getting asanas for source ID: {source_id}")
-    g = get_graph()
-    
-    # Формируем полный URI источника, если передан только ID
-    if not source_id.startswith('http://'):
-        source_id = f"http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#source_{source_id}"
-    source_uri = URIRef(source_id)
-    
-    # Найти все фото, связанные с источником
-    photo_uris = list(g.subjects(ASANA.hasSource, source_uri))
-    logger.debug(f"Found {len(photo_uris)} photos for source")
-    
-    # Найти все асаны, связанные с этими фото
-    asana_uris = set()
-    for photo_uri in photo_uris:
-        asanas = list(g.subjects(ASANA.hasPhoto, photo_uri))
-        asana_uris.update(asanas)
+    projection = get_projection()
     
-    # Также найти асаны, напрямую связанные с источником
-    direct_asanas = list(g.subjects(ASANA.hasSource, source_uri))
-    asana_uris.update(direct_asanas)
+    # Полный URI источника по полному URI или короткому ID
+    source_uri = resolve_uri(source_id, ASANA.AsanaSource)
+    if source_uri is None:
+        logger.info(f"Source not found: {source_id}")
+        return []
+    source_id = str(source_uri)
     
-    logger.debug(f"Found {len(asana_uris)} total asana URIs")
-    
-    # Загрузить данные для каждой асаны
+    # Обратный индекс проекции: только асаны этого источника и их фото из него
     asanas = []
-    for asana_uri in asana_uris:
-        # Проверяем, что это действительно асана
-        if (asana_uri, RDF.type, ASANA.Asana) not in g:
-            logger.debug(f"Skipping {asana_uri} - not an asana")
-            continue
-            
-        name_obj = g.value(asana_uri, ASANA.hasName)
-        if not name_obj:
-            logger.debug(f"Skipping {asana_uri} - no name object")
+    for asana_id, photo_ids in projection.source_asanas.get(source_id, {}).items():
+        asana = projection.asanas.get(asana_id)
+        # Асаны без названия не показываем
+        if asana is None or not projection.asana_name.get(asana_id):
             continue
-            
-        photo_objs = list(g.objects(asana_uri, ASANA.hasPhoto))
-        
-        # Фильтруем фото только от указанного источника
-        source_photo_objs = [photo for photo in photo_objs if g.value(photo, ASANA.hasSource) == source_uri]
-        
-        name_ru = str(g.value(name_obj, ASANA.nameInRussian)) if name_obj else ""
-        name_sanskrit = str(g.value(name_obj, ASANA.nameInSanskrit)) if name_obj and g.value(name_obj, ASANA.nameInSanskrit) else ""
-        transliteration = str(g.value(name_obj, ASANA.nameInTranslit)) if name_obj and g.value(name_obj, ASANA.nameInTranslit) else ""
-        definition = str(g.value(name_obj, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a)) if name_obj and g.value(name_obj, ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a) else ""
-        
-        name_data = {
-            "name_ru": name_ru,
-            "name_sanskrit": name_sanskrit,
-            "transliteration": transliteration,
-            "definition": definition
-        }
-        
-        photos_base64 = [str(g.value(photo, ASANA.base64Photo)) for photo in source_photo_objs if g.value(photo, ASANA.base64Photo)]
-        logger.debug(f"Found {len(photos_base64)} photos for asana {name_ru}")
-        
-        asana_data = {
-            "id": str(asana_uri),
-            "name": name_data,
-            "photos": photos_base64,
-            "photo": photos_base64[0] if photos_base64 else ""
-        }
-        asanas.append(asana_data)
+        photos = [projection.photos[photo_id] for photo_id in photo_ids]
+        asanas.append({
+            "id": asana["id"],
+            "name": asana["name"],
+            "photos": photos,
+            "photo": photos[0]["thumbnail_url"]
+        })
+    asanas.sort(key=asana_sort_key)
     
     logger.info(f"Found {len(asanas)} asanas for source ID: {source_id}")
     return asanas
 
+def get_source_counts() -> Dict[str, Dict[str, int]]:
+    """Число асан и фото каждого источника: {id источника: {"asanas", "photos"}}"""
+    projection = get_projection()
+    return {source_id: projection.source_counts(source_id) for source_id in projection.sources}
+
 # Поиск асан по названию (с поддержкой нечеткого поиска)
-def search_asanas_by_name(query: str, fuzzy_threshold: float = 0.7):
+def search_asanas_by_name(query: str, fuzzy_threshold: float = 0.7, limit: Optional[int] = None):
     logger.info(f"Searching asanas with query: {query}")
+    projection = get_projection()
+    # Сравниваем запрос только с названиями, у которых достаточно общих триграмм
+    candidate_ids = text_search.candidates(projection.trigrams, projection.indexed_names.keys(), query)
+    names = {asana_id: projection.search_names[asana_id] for asana_id in candidate_ids}
+
+    # Приводим запрос к нижнему регистру для регистронезависимого поиска
+    query_lower = query.lower()
     try:
-        from rapidfuzz import fuzz
-        
-        asanas = load_asanas()
-        results = []
-        
-        # Приводим запрос к нижнему регистру для регистронезависимого поиска
-        query_lower = query.lower()
-        
-        for asana in asanas:
-            name_ru = asana["name"]["name_ru"].lower()
-            
-            # Точное совпадение
-            if query_lower in name_ru:
-                asana["match_score"] = 1.0
-                results.append(asana)
-                continue
-                
-            # Нечеткое совпадение
-            ratio = fuzz.ratio(query_lower, name_ru) / 100.0
-            partial_ratio = fuzz.partial_ratio(query_lower, name_ru) / 100.0
-            
-            # Используем максимальный из показателей схожести
-            match_score = max(ratio, partial_ratio)
-            
-            if match_score >= fuzzy_threshold:
-                asana["match_score"] = match_score
-                results.append(asana)
-        
-        # Сортируем результаты по релевантности
-        results.sort(key=lambda a: a["match_score"], reverse=True)
-        
-        logger.info(f"Found {len(results)} asanas matching query: {query}")
-        return results
+        scores = text_search.score_names(query_lower, names, fuzzy_threshold, limit)
     except ImportError:
         # Если библиотека rapidfuzz не установлена, используем обычный поиск
         logger.warning("rapidfuzz not installed, using simple search")
-        asanas = load_asanas()
-        query_lower = query.lower()
-        results = [asana for asana in asanas if query_lower in asana["name"]["name_ru"].lower()]
-        logger.info(f"Found {len(results)} asanas matching query: {query}")
-        return results
+        scores = [(asana_id, 1.0) for asana_id, name in names.items() if query_lower in name]
 
-def get_photo_of_asana_from_source(asana_id: str, source_id: str) -> str | None:
+    # Сортируем результаты по релевантности, при равенстве — по алфавиту
+    scores.sort(key=lambda item: (-item[1], collation.sort_key(projection.indexed_names[item[0]])))
+    if limit is not None:
+        scores = scores[:limit]
+    # Записи проекции общие для всех запросов, поэтому оценку добавляем в копию
+    results = [{**projection.asanas[asana_id], "match_score": score} for asana_id, score in scores]
+    logger.info(f"Found {len(results)} asanas matching query: {query}")
+    return results
+
+def get_photo_of_asana_from_source(asana_id: str, source_id: str) -> Dict[str, Any] | None:
     """
-    Возвращает base64 фото асаны по id асаны и id источника, если такое фото есть
+    Возвращает метаданные фото асаны (хэш, ссылку, тип, размеры) по id асаны и id источника, если такое фото есть
     """
-    g = get_graph()
-    ASANA = Namespace("http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#")
-    asana_uri = URIRef(asana_id)
-    source_uri = URIRef(source_id)
-    # Найти все фото, связанные с асаной
-    photo_uris = list(g.objects(asana_uri, ASANA.hasPhoto))
-    for photo_uri in photo_uris:
+    asana_uri = resolve_uri(asana_id, ASANA.Asana)
+    source_uri = resolve_uri(source_id, ASANA.AsanaSource)
+    if asana_uri is None or source_uri is None:
+        return None
+    asana = get_projection().asanas.get(str(asana_uri))
+    if asana is None:
+        return None
+    source_id = str(source_uri)
+    for photo in asana["photos"]:
         # Проверяем, связано ли фото с нужным источником
-        if g.value(photo_uri, ASANA.hasSource) == source_uri:
-            base64_photo = g.value(photo_uri, ASANA.base64Photo)
-            if base64_photo:
-                return str(base64_photo)
-    return None
\ No newline at end of file
+        if photo["source"] == source_id:
+            return photo
+    return None
+
+def _photo_match(projection, photo_id: str, distance: Optional[int] = None) -> Dict[str, Any]:
+    match = {"photo_id": photo_id, "asana_id": projection.photo_asana.get(photo_id),
+             "hash": projection.photos[photo_id]["hash"]}
+    if distance is not None:
+        match["distance"] = distance
+    return match
+
+def find_photo_duplicates(photo_hash: str, dhash: str = "", exclude: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Фото каталога, совпадающие с данным по содержимому (exact, тот же SHA-256) и похожие на него
+    (near, расстояние Хэмминга между dHash не больше PHOTO_DUPLICATE_DISTANCE) — ближайшие первыми.
+    Кандидаты берутся из многоиндексных таблиц проекции, полный перебор фото не нужен.
+    """
+    projection = get_projection()
+    exact_ids = projection.photo_hashes.get(photo_hash, set()) - {exclude}
+    near = []
+    if dhash:
+        near = [(distance, photo_id) for distance, photo_id in projection.similar_photos(dhash, config.PHOTO_DUPLICATE_DISTANCE)
+                if photo_id not in exact_ids and photo_id != exclude]
+    return {
+        "exact": [_photo_match(projection, photo_id) for photo_id in sorted(exact_ids)],
+        "near": [_photo_match(projection, photo_id, distance) for distance, photo_id in near]
+    }
+
+def find_duplicates_of_photo(photo_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Дубликаты и почти дубликаты уже добавленного фото (само фото в ответ не входит)"""
+    photo = get_projection().photos.get(photo_id)
+    if photo is None:
+        return {"exact": [], "near": []}
+    return find_photo_duplicates(photo["hash"], photo["dhash"], exclude=photo_id)
+
+def find_duplicates_of_asana(asana_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Дубликаты и почти дубликаты первого фото асаны (после добавления асаны)"""
+    photo_ids = get_projection().asana_photos.get(asana_id, [])
+    return find_duplicates_of_photo(photo_ids[0]) if photo_ids else {"exact": [], "near": []}
+
+def migrate_photo_dhashes() -> int:
+    """
+    Считает dHash для фото, добавленных до появления поиска почти дубликатов, и записывает
+    его в граф. Повторный запуск ничего не делает.
+    """
+    photos = [photo for photo in get_projection().photos.values()
+              if not photo["dhash"] and photo["mime_type"].startswith("image/") and photo_store.has_photo(photo["hash"])]
+    if not photos:
+        return 0
+    dhashes = {}
+    for photo in photos:
+        dhash = perceptual_hash.dhash_file(photo_store.photo_path(photo["hash"]))
+        if dhash is not None:
+            dhashes[photo["id"]] = perceptual_hash.to_hex(dhash)
+    with graph_transaction() as g:
+        for photo_id, dhash in dhashes.items():
+            g.add((URIRef(photo_id), ASANA.photoDHash, Literal(dhash)))
+    logger.info(f"Computed perceptual hashes for {len(dhashes)} photos")
+    return len(dhashes)
+
+def migrate_base64_photos() -> int:
+    """
+    Переносит фото, хранящиеся в графе как base64-литералы, в хранилище фото.
+    В графе остаются только хэш и метаданные. Повторный запуск ничего не делает.
+    """
+    g = get_graph()
+    if (None, ASANA.base64Photo, None) not in g:
+        return 0
+    migrated = 0
+    with graph_transaction() as g:
+        for photo_uri, literal in list(g.subject_objects(ASANA.base64Photo)):
+            try:
+                photo_bytes = base64.b64decode(str(literal))
+            except Exception as e:
+                logger.error(f"Skipping photo {photo_uri} with invalid base64: {str(e)}")
+                continue
+            # Фото уже лежат в онтологии — переносим их без предела размера загрузки
+            photo_meta = photo_store.save_photo(photo_bytes, max_bytes=0)
+            _add_photo_triples(g, photo_uri, photo_meta)
+            g.remove((photo_uri, ASANA.base64Photo, None))
+            migrated += 1
+    # Файл онтологии сразу переписываем без base64, а не ждем контрольной точки
+    graph_store.checkpoint()
+    logger.info(f"Migrated {migrated} base64 photos to the photo store")
+    return migrated
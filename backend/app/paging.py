@@ -0,0 +1,99 @@
+from app import collation
+from typing import Dict, Any, List, Optional, Set, Tuple
+import bisect
+import base64
+import json
+
+# Поля записи асаны, которые можно запросить через fields=
+ASANA_FIELDS = ("id", "name", "source", "photos", "photo")
+# include_photos: none — без списка фото, first — только первое фото, all — все фото
+PHOTO_MODES = ("none", "first", "all")
+
+def asana_sort_key(asana: Dict[str, Any]) -> Tuple:
+    """Порядок каталога: по русскому названию (Ё после Е), при совпадении названий — по id"""
+    return (collation.sort_key(asana["name"]["name_ru"]), asana["id"])
+
+def source_sort_key(source: Dict[str, Any]) -> Tuple:
+    """Порядок списка источников: автор, название, id"""
+    return (collation.sort_key(source["author"]), collation.sort_key(source["title"]), source["id"])
+
+def _encode(values: List[str]) -> str:
+    raw = json.dumps(values, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode(cursor: str, size: int) -> List[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, str) for value in values):
+        raise ValueError("Некорректный курсор")
+    return values
+
+def encode_cursor(asana: Dict[str, Any]) -> str:
+    """Курсор следующей страницы: название и id последней отданной асаны"""
+    return _encode([asana["name"]["name_ru"], asana["id"]])
+
+def decode_cursor(cursor: str) -> Tuple:
+    name_ru, asana_id = _decode(cursor, 2)
+    return (collation.sort_key(name_ru), asana_id)
+
+def encode_source_cursor(source: Dict[str, Any]) -> str:
+    """Курсор следующей страницы источников: автор, название и id последнего отданного источника"""
+    return _encode([source["author"], source["title"], source["id"]])
+
+def decode_source_cursor(cursor: str) -> Tuple:
+    author, title, source_id = _decode(cursor, 3)
+    return (collation.sort_key(author), collation.sort_key(title), source_id)
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """Разбирает fields= ("id,name,photo"); None — все поля"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(ASANA_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}. Доступны: {', '.join(ASANA_FIELDS)}")
+    return requested
+
+def shape_asana(asana: Dict[str, Any], fields: Optional[Set[str]], include_photos: str) -> Dict[str, Any]:
+    """Копия записи только с запрошенными полями; список фото урезается по include_photos"""
+    shaped = {key: value for key, value in asana.items() if fields is None or key in fields}
+    if "photos" in shaped:
+        if include_photos == "none":
+            del shaped["photos"]
+        elif include_photos == "first":
+            shaped["photos"] = shaped["photos"][:1]
+    return shaped
+
+def paginate(asanas: List[Dict[str, Any]], limit: Optional[int] = None, cursor: Optional[str] = None,
+             fields: Optional[str] = None, include_photos: str = "all") -> Dict[str, Any]:
+    """
+    Страница списка асан, уже отсортированного по asana_sort_key. Курсор указывает на последнюю
+    асану предыдущей страницы, поэтому добавления и удаления не сдвигают следующие страницы.
+    Ответ: {"items", "total", "next_cursor", "limit"}; без limit отдается весь список.
+    """
+    if include_photos not in PHOTO_MODES:
+        raise ValueError(f"include_photos: ожидается одно из {', '.join(PHOTO_MODES)}")
+    requested_fields = parse_fields(fields)
+    start = bisect.bisect_right(asanas, decode_cursor(cursor), key=asana_sort_key) if cursor else 0
+    end = len(asanas) if limit is None else min(start + limit, len(asanas))
+    page = asanas[start:end]
+    return {
+        "items": [shape_asana(asana, requested_fields, include_photos) for asana in page],
+        "total": len(asanas),
+        "next_cursor": encode_cursor(page[-1]) if page and end < len(asanas) else None,
+        "limit": limit
+    }
+
+def paginate_sources(sources: List[Dict[str, Any]], limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Страница списка источников, отсортированного по source_sort_key; ответ как у paginate"""
+    start = bisect.bisect_right(sources, decode_source_cursor(cursor), key=source_sort_key) if cursor else 0
+    end = len(sources) if limit is None else min(start + limit, len(sources))
+    page = sources[start:end]
+    return {
+        "items": page,
+        "total": len(sources),
+        "next_cursor": encode_source_cursor(page[-1]) if page and end < len(sources) else None,
+        "limit": limit
+    }
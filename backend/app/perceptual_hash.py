@@ -0,0 +1,67 @@
+from typing import List, Optional, Tuple
+from itertools import combinations
+from functools import lru_cache
+import logging
+
+logger = logging.getLogger("asana_service.perceptual_hash")
+
+# dHash: 64 бита — знак разности яркости соседних пикселей в уменьшенном до 9x8 изображении.
+# Пересжатие, масштабирование и небольшая цветокоррекция меняют лишь несколько бит.
+DHASH_WIDTH = 9
+DHASH_HEIGHT = 8
+DHASH_BITS = (DHASH_WIDTH - 1) * DHASH_HEIGHT
+
+# Многоиндексное хэширование: хэш делится на MIH_CHUNKS частей по CHUNK_BITS бит, каждая часть —
+# ключ своей таблицы. Если хэши отличаются не более чем на r бит, то хотя бы одна часть
+# отличается не более чем на r // MIH_CHUNKS бит — достаточно перебрать соседей каждой части.
+MIH_CHUNKS = 4
+CHUNK_BITS = DHASH_BITS // MIH_CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+def dhash_file(path: str) -> Optional[int]:
+    """dHash изображения из файла; None, если файл не читается как изображение"""
+    try:
+        from PIL import Image, ImageOps
+        with Image.open(path) as img:
+            # JPEG декодируется сразу в уменьшенном масштабе — полный кадр для 9x8 не нужен
+            img.draft("L", (DHASH_WIDTH * 8, DHASH_HEIGHT * 8))
+            img = ImageOps.exif_transpose(img).convert("L")
+            pixels = list(img.resize((DHASH_WIDTH, DHASH_HEIGHT), Image.LANCZOS).getdata())
+    except ImportError:
+        logger.warning("Pillow not installed, perceptual hashes are not available")
+        return None
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash for {path}: {str(e)}")
+        return None
+    value = 0
+    for row in range(DHASH_HEIGHT):
+        for col in range(DHASH_WIDTH - 1):
+            left = pixels[row * DHASH_WIDTH + col]
+            value = (value << 1) | (left < pixels[row * DHASH_WIDTH + col + 1])
+    return value
+
+def to_hex(value: int) -> str:
+    return f"{value:0{DHASH_BITS // 4}x}"
+
+def from_hex(text: str) -> int:
+    return int(text, 16)
+
+def distance(a: int, b: int) -> int:
+    """Расстояние Хэмминга между хэшами"""
+    return (a ^ b).bit_count()
+
+def chunk_keys(value: int) -> List[int]:
+    """Ключи хэша в таблицах многоиндексного хэширования: номер части и ее значение в одном числе"""
+    return [(chunk << CHUNK_BITS) | ((value >> (chunk * CHUNK_BITS)) & CHUNK_MASK) for chunk in range(MIH_CHUNKS)]
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> Tuple[int, ...]:
+    """Маски, переворачивающие от 0 до radius бит части"""
+    return (0, *(sum(1 << bit for bit in bits)
+                 for flipped in range(1, radius + 1)
+                 for bits in combinations(range(CHUNK_BITS), flipped)))
+
+def probe_keys(value: int, max_distance: int) -> List[int]:
+    """Ключи всех частей на расстоянии до max_distance // MIH_CHUNKS от частей хэша"""
+    masks = _flip_masks(max_distance // MIH_CHUNKS)
+    return [key ^ mask for key in chunk_keys(value) for mask in masks]
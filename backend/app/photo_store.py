@@ -0,0 +1,206 @@
+from app import config, executors, perceptual_hash
+from concurrent.futures import Future, wait
+from typing import BinaryIO, Dict, Any, Optional, Union
+from io import BytesIO
+import threading
+import tempfile
+import hashlib
+import logging
+import re
+import os
+
+logger = logging.getLogger("asana_service.photo_store")
+
+# Фото хранятся один раз по SHA-256 содержимого: <PHOTO_STORE_DIR>/ab/cd/abcd...
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Уменьшенные копии (JPEG фиксированной ширины) лежат рядом с оригиналом: <путь оригинала>_<вариант>
+VARIANT_WIDTHS = {"thumb": config.PHOTO_THUMBNAIL_WIDTH, "medium": config.PHOTO_MEDIUM_WIDTH}
+VARIANTS = (*VARIANT_WIDTHS, "original")
+VARIANT_MIME_TYPE = "image/jpeg"
+VARIANT_QUALITY = 85
+
+# Копии готовятся в пуле "variants" (см. executors), а не в обработчике запроса: Pillow отпускает GIL
+# на декодировании, масштабировании и кодировании, поэтому потоки работают параллельно
+_variant_lock = threading.Lock()
+_variants_pending: Dict[str, Future] = {}
+
+class PhotoTooLarge(ValueError):
+    """Загружаемое фото больше PHOTO_MAX_BYTES"""
+
+def is_valid_hash(photo_hash: str) -> bool:
+    return bool(HASH_RE.match(photo_hash or ""))
+
+def photo_path(photo_hash: str) -> str:
+    if not is_valid_hash(photo_hash):
+        raise ValueError(f"Invalid photo hash: {photo_hash}")
+    return os.path.join(config.PHOTO_STORE_DIR, photo_hash[:2], photo_hash[2:4], photo_hash)
+
+def photo_url(photo_hash: str) -> str:
+    return f"/photos/{photo_hash}"
+
+def variant_path(photo_hash: str, variant: str) -> str:
+    path = photo_path(photo_hash)
+    return path if variant == "original" else f"{path}_{variant}"
+
+def variant_url(photo_hash: str, variant: str) -> str:
+    return f"/photos/{photo_hash}/{variant}"
+
+def has_variant(photo_hash: str, variant: str) -> bool:
+    return is_valid_hash(photo_hash) and os.path.exists(variant_path(photo_hash, variant))
+
+def has_photo(photo_hash: str) -> bool:
+    return is_valid_hash(photo_hash) and os.path.exists(photo_path(photo_hash))
+
+def sniff_mime_type(header: bytes) -> str:
+    """MIME-тип по сигнатуре файла — для отдачи фото без разбора изображения"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+def describe_image(source: Union[bytes, str, BinaryIO]) -> Dict[str, Any]:
+    """
+    Определяет MIME-тип и размеры изображения по заголовку (Pillow не декодирует пиксели).
+    source — байты фото, путь к файлу или открытый файл (например, файл в ZIP-архиве).
+    """
+    try:
+        from PIL import Image
+        with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as img:
+            return {
+                "mime_type": Image.MIME.get(img.format, "application/octet-stream"),
+                "width": img.width,
+                "height": img.height
+            }
+    except ImportError:
+        logger.warning("Pillow not installed, image metadata is not available")
+    except Exception as e:
+        logger.warning(f"Could not read image metadata: {str(e)}")
+    if isinstance(source, bytes):
+        header = source[:16]
+    elif isinstance(source, str):
+        with open(source, "rb") as f:
+            header = f.read(16)
+    else:
+        source.seek(0)
+        header = source.read(16)
+    return {"mime_type": sniff_mime_type(header), "width": 0, "height": 0}
+
+def save_photo_file(f: BinaryIO, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Сохраняет фото из файлового объекта: читает кусками по PHOTO_CHUNK_BYTES во временный файл
+    хранилища и по ходу считает SHA-256, так что в памяти одновременно не больше одного куска.
+    Фото больше max_bytes (по умолчанию PHOTO_MAX_BYTES, 0 — без ограничения) отклоняется
+    с PhotoTooLarge, как только превышен предел. Возвращает метаданные фото.
+    """
+    max_bytes = config.PHOTO_MAX_BYTES if max_bytes is None else max_bytes
+    os.makedirs(config.PHOTO_STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=config.PHOTO_STORE_DIR, prefix=".upload-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = f.read(config.PHOTO_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise PhotoTooLarge(f"Фото больше допустимого размера ({max_bytes // (1024 * 1024)} МБ)")
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        photo_hash = digest.hexdigest()
+        path = photo_path(photo_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            logger.info(f"Stored photo {photo_hash} ({size} bytes)")
+        else:
+            logger.debug(f"Photo {photo_hash} already stored")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    meta = {"hash": photo_hash, "size": size, **describe_image(path), "dhash": ""}
+    if meta["mime_type"].startswith("image/"):
+        dhash = perceptual_hash.dhash_file(path)
+        if dhash is not None:
+            meta["dhash"] = perceptual_hash.to_hex(dhash)
+        schedule_variants(photo_hash)
+    return meta
+
+def save_photo(data: bytes, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Сохраняет фото, уже прочитанное в память; предел размера — как у save_photo_file"""
+    return save_photo_file(BytesIO(data), max_bytes=max_bytes)
+
+def read_mime_type(photo_hash: str) -> str:
+    with open(photo_path(photo_hash), "rb") as f:
+        return sniff_mime_type(f.read(16))
+
+def read_photo(photo_hash: str) -> bytes:
+    with open(photo_path(photo_hash), "rb") as f:
+        return f.read()
+
+def _write_variant(img, photo_hash: str, variant: str, width: int):
+    from PIL import Image
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    if img.mode != "RGB":
+        # JPEG без прозрачности: прозрачные области заливаем белым
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        rgba = img.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        img = background
+    path = variant_path(photo_hash, variant)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    img.save(tmp_path, format="JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+def generate_variants(photo_hash: str):
+    """Готовит недостающие уменьшенные копии фото (уменьшает, но не увеличивает)"""
+    from PIL import Image, ImageOps
+    missing = [variant for variant in VARIANT_WIDTHS if not has_variant(photo_hash, variant)]
+    if not missing:
+        return
+    with Image.open(photo_path(photo_hash)) as original:
+        # Копии теряют EXIF, поэтому поворот из EXIF применяем к пикселям
+        img = ImageOps.exif_transpose(original)
+        img.load()
+    for variant in missing:
+        _write_variant(img, photo_hash, variant, VARIANT_WIDTHS[variant])
+    logger.info(f"Generated variants {', '.join(missing)} for photo {photo_hash}")
+
+def _generate_in_pool(photo_hash: str):
+    try:
+        generate_variants(photo_hash)
+    except Exception as e:
+        logger.warning(f"Could not generate variants for photo {photo_hash}: {str(e)}")
+
+def _variants_done(photo_hash: str):
+    with _variant_lock:
+        _variants_pending.pop(photo_hash, None)
+
+def schedule_variants(photo_hash: str):
+    """Ставит подготовку копий фото в очередь пула (повторные вызовы для того же фото не дублируются)"""
+    if all(has_variant(photo_hash, variant) for variant in VARIANT_WIDTHS):
+        return
+    with _variant_lock:
+        if photo_hash in _variants_pending:
+            return
+        future = executors.submit("variants", _generate_in_pool, photo_hash)
+        _variants_pending[photo_hash] = future
+    future.add_done_callback(lambda _: _variants_done(photo_hash))
+
+def wait_for_variants(timeout: float = 60.0):
+    """Дожидается подготовки поставленных в очередь копий (для скриптов)"""
+    with _variant_lock:
+        pending = list(_variants_pending.values())
+    wait(pending, timeout=timeout)
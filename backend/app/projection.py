@@ -0,0 +1,717 @@
+from rdflib import URIRef, RDF
+from app import graph_store, photo_store, perceptual_hash
+from app.collation import first_letter
+from app.text_search import name_trigrams, word_prefixes, words
+from app.paging import asana_sort_key
+from app.graph_store import ASANA
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, List
+import itertools
+import threading
+import logging
+import asyncio
+import time
+
+logger = logging.getLogger("asana_service.projection")
+
+DEFINITION = ASANA.OWLDataProperty_c8100b71_09ff_49ec_8fbf_63fa1be3947a
+
+# Термины онтологии заранее: обращение к атрибуту Namespace каждый раз создает новый URIRef
+RDF_TYPE = RDF.type
+ASANA_CLASS = ASANA.Asana
+NAME_CLASS = ASANA.AsanaName
+SOURCE_CLASS = ASANA.AsanaSource
+PHOTO_CLASS = ASANA.AsanaPhoto
+HAS_NAME = ASANA.hasName
+HAS_PHOTO = ASANA.hasPhoto
+HAS_SOURCE = ASANA.hasSource
+NAME_RU = ASANA.nameInRussian
+NAME_SANSKRIT = ASANA.nameInSanskrit
+NAME_TRANSLIT = ASANA.nameInTranslit
+SOURCE_TITLE = ASANA.sourseTitle
+SOURCE_AUTHOR = ASANA.sourceAuthor
+SOURCE_YEAR = ASANA.sourceYear
+SOURCE_PUBLISHER = ASANA.sourcePublisher
+SOURCE_PAGES = ASANA.sourcePages
+SOURCE_ANNOTATION = ASANA.sourceAnnotation
+PHOTO_HASH = ASANA.photoHash
+PHOTO_MIME_TYPE = ASANA.photoMimeType
+PHOTO_SIZE = ASANA.photoSize
+PHOTO_WIDTH = ASANA.photoWidth
+PHOTO_HEIGHT = ASANA.photoHeight
+PHOTO_DHASH = ASANA.photoDHash
+
+# Классы сущностей, которые можно найти по короткому id
+ENTITY_CLASSES = (ASANA_CLASS, NAME_CLASS, SOURCE_CLASS, PHOTO_CLASS)
+
+def short_id(identifier: str) -> str:
+    """Ключ для поиска по короткому id: UUID после последнего "_" в локальном имени URI"""
+    local_name = identifier.rsplit("#", 1)[-1]
+    return local_name.rsplit("_", 1)[-1]
+
+# Число частей карты проекции (степень двойки): новая версия копирует список частей
+# и только те части, в которых меняет ключи
+_SHARDS = 256
+_SHARD_MASK = _SHARDS - 1
+
+class _CowMap:
+    """
+    Словарь проекции с копированием при записи по частям: ключи разложены по _SHARDS словарям,
+    copy() копирует только список частей, а часть копируется при первом изменении в новой версии.
+    Запись в новую версию стоит O(_SHARDS + размер затронутых частей), а не O(всей карты).
+    Порядок обхода — по частям, а не по порядку добавления.
+    """
+    __slots__ = ("_shards", "_owned", "_size")
+
+    def __init__(self):
+        self._shards = [{} for _ in range(_SHARDS)]
+        # Части, скопированные в этой версии (None — все части свои, карта строится с нуля)
+        self._owned: Optional[set] = None
+        self._size = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_CowMap":
+        cow = cls()
+        shards = cow._shards
+        for key, value in data.items():
+            shards[hash(key) & _SHARD_MASK][key] = value
+        cow._size = len(data)
+        return cow
+
+    def copy(self) -> "_CowMap":
+        other = type(self).__new__(type(self))
+        other._shards = list(self._shards)
+        other._owned = set()
+        other._size = self._size
+        return other
+
+    def _writable(self, key) -> dict:
+        index = hash(key) & _SHARD_MASK
+        if self._owned is not None and index not in self._owned:
+            self._shards[index] = dict(self._shards[index])
+            self._owned.add(index)
+        return self._shards[index]
+
+    def get(self, key, default=None):
+        return self._shards[hash(key) & _SHARD_MASK].get(key, default)
+
+    def __getitem__(self, key):
+        return self._shards[hash(key) & _SHARD_MASK][key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._shards[hash(key) & _SHARD_MASK]
+
+    def __setitem__(self, key, value):
+        shard = self._writable(key)
+        if key not in shard:
+            self._size += 1
+        shard[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        del self._writable(key)[key]
+        self._size -= 1
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._size -= 1
+        return self._writable(key).pop(key)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._shards)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return itertools.chain.from_iterable(shard.values() for shard in self._shards)
+
+    def items(self):
+        return itertools.chain.from_iterable(shard.items() for shard in self._shards)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, _CowMap):
+            other = dict(other.items())
+        return isinstance(other, dict) and len(other) == self._size and dict(self.items()) == other
+
+class _CowSet(_CowMap):
+    """Множество поверх _CowMap — для больших корзин индексов (буква, частая триграмма)"""
+    __slots__ = ()
+
+    @classmethod
+    def from_set(cls, items: set) -> "_CowSet":
+        return cls.from_dict(dict.fromkeys(items))
+
+    def add(self, item):
+        self[item] = None
+
+    def discard(self, item):
+        self.pop(item, None)
+
+    def __and__(self, other) -> set:
+        return set(self) & set(other)
+
+    __rand__ = __and__
+
+    def __sub__(self, other) -> set:
+        return set(self) - set(other)
+
+    def __rsub__(self, other) -> set:
+        return set(other) - set(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, _CowSet):
+            other = set(other)
+        return isinstance(other, (set, frozenset)) and len(other) == len(self) and all(item in self for item in other)
+
+def _copy_bucket(bucket):
+    """
+    Копия корзины индекса для новой версии проекции. Корзина больше _SHARDS становится
+    _CowSet/_CowMap, и следующие версии копируют из нее только измененные части.
+    """
+    if isinstance(bucket, _CowMap):
+        return bucket.copy()
+    if len(bucket) > _SHARDS:
+        return _CowSet.from_set(bucket) if isinstance(bucket, set) else _CowMap.from_dict(bucket)
+    return type(bucket)(bucket)
+
+class Projection:
+    """
+    Денормализованное представление онтологии для чтения: записи асан, названий,
+    источников и фото в том виде, в котором их отдает API, плюс карты id -> запись.
+    Строится один раз на версию графа; после записи пересобираются только затронутые записи.
+
+    Опубликованная проекция не изменяется: запись собирает новую версию через copy()
+    и подменяет текущую одним присваиванием, поэтому читатели никогда не видят
+    частично примененных изменений и могут без блокировок обходить словари и индексы.
+    Карты верхнего уровня — _CowMap: новая версия делит с предыдущей все части карт,
+    кроме тех, где запись меняет ключи, поэтому стоимость записи не растет с размером каталога.
+    """
+
+    # Карты верхнего уровня (_CowMap), общие по частям с предыдущей версией
+    _MAPS = ("asanas", "names", "sources", "photos", "asana_name", "asana_photos", "letters",
+             "trigrams", "short_ids", "entity_types", "indexed_names", "search_names",
+             "photo_asana", "photo_hashes", "dhash_chunks", "source_prefixes", "indexed_sources",
+             "source_asanas", "photo_links")
+    # Карты, значения которых — корзины индексов (множества или словари id)
+    _BUCKET_MAPS = ("letters", "trigrams", "short_ids", "photo_hashes", "dhash_chunks", "source_prefixes", "source_asanas")
+
+    def __init__(self, version, map_type: Callable = _CowMap):
+        self.version = version
+        self.asanas: Dict[str, Dict[str, Any]] = map_type()
+        self.names: Dict[str, Dict[str, Any]] = map_type()
+        self.sources: Dict[str, Dict[str, Any]] = map_type()
+        self.photos: Dict[str, Dict[str, Any]] = map_type()
+        # Связи, которые не попадают в записи API
+        self.asana_name: Dict[str, str] = map_type()
+        self.asana_photos: Dict[str, list] = map_type()
+        # Алфавитный индекс: первая буква названия -> id асан
+        self.letters: Dict[str, set] = map_type()
+        # Триграммный индекс для поиска: триграмма нормализованного названия -> id асан
+        self.trigrams: Dict[str, set] = map_type()
+        # Короткий id (UUID) -> {URI сущности: её класс}
+        self.short_ids: Dict[str, Dict[str, URIRef]] = map_type()
+        self.entity_types: Dict[str, URIRef] = map_type()
+        # Русское название, по которому асана сейчас лежит в индексах
+        self.indexed_names: Dict[str, str] = map_type()
+        # Те же названия в нижнем регистре — готовые варианты для нечеткого сравнения
+        self.search_names: Dict[str, str] = map_type()
+        # Фото -> асана, к которой оно привязано
+        self.photo_asana: Dict[str, str] = map_type()
+        # Индексы дубликатов: SHA-256 содержимого -> id фото и многоиндексное хэширование dHash:
+        # ключ части хэша -> {id фото: dHash} (см. perceptual_hash)
+        self.photo_hashes: Dict[str, set] = map_type()
+        self.dhash_chunks: Dict[int, Dict[str, int]] = map_type()
+        # Поиск источников: начало слова названия, автора или издательства -> id источников
+        self.source_prefixes: Dict[str, set] = map_type()
+        # Начала слов, по которым источник сейчас лежит в индексе
+        self.indexed_sources: Dict[str, frozenset] = map_type()
+        # Обратный индекс источник -> {асана -> кортеж id её фото из этого источника}
+        # и связь (источник, асана), по которой фото сейчас лежит в нем
+        self.source_asanas: Dict[str, Dict[str, tuple]] = map_type()
+        self.photo_links: Dict[str, tuple] = map_type()
+        # Корзины индексов, скопированные в этой версии (None — все корзины свои, проекция строится с нуля)
+        self._owned_buckets: Optional[set] = None
+        # Асаны в порядке каталога; считаются при первом запросе страницы в этой версии
+        self._sorted_asanas: Optional[List[Dict[str, Any]]] = None
+
+    def share_maps(self):
+        """
+        Переводит карты, собранные обычными словарями (полная сборка быстрее без частей), в _CowMap,
+        а большие корзины индексов — в _CowSet/_CowMap
+        """
+        for name in self._MAPS:
+            index = getattr(self, name)
+            if name in self._BUCKET_MAPS:
+                for key, bucket in index.items():
+                    if len(bucket) > _SHARDS:
+                        index[key] = _copy_bucket(bucket)
+            setattr(self, name, _CowMap.from_dict(index))
+
+    def sorted_asanas(self) -> List[Dict[str, Any]]:
+        """Все асаны в порядке каталога (paging.asana_sort_key), одна сортировка на версию проекции"""
+        if self._sorted_asanas is None:
+            self._sorted_asanas = sorted(self.asanas.values(), key=asana_sort_key)
+        return self._sorted_asanas
+
+    def copy(self, version) -> "Projection":
+        """Новая версия: части карт копируются при первом изменении ключа, корзины индексов — при первом изменении корзины"""
+        p = Projection.__new__(Projection)
+        p.version = version
+        for name in self._MAPS:
+            setattr(p, name, getattr(self, name).copy())
+        p._owned_buckets = set()
+        p._sorted_asanas = None
+        return p
+
+    def _bucket(self, index_name: str, key: str, empty):
+        """Корзина индекса для изменения; общая с предыдущей версией корзина сначала копируется"""
+        index = getattr(self, index_name)
+        bucket = index.get(key)
+        if self._owned_buckets is None:
+            return index.setdefault(key, empty) if bucket is None else bucket
+        marker = (index_name, key)
+        if marker not in self._owned_buckets:
+            bucket = _copy_bucket(bucket) if bucket is not None else empty
+            index[key] = bucket
+            self._owned_buckets.add(marker)
+        elif bucket is None:
+            # Своя корзина уже опустела и удалена в этой версии (_discard) — заводим новую
+            bucket = index[key] = empty
+        return bucket
+
+    def _discard(self, index_name: str, key: str, item: str):
+        index = getattr(self, index_name)
+        if key not in index:
+            return
+        bucket = self._bucket(index_name, key, type(index[key])())
+        if isinstance(bucket, (set, _CowSet)):
+            bucket.discard(item)
+        else:
+            bucket.pop(item, None)
+        if not bucket:
+            del index[key]
+
+    def index_entity(self, uri: str, types):
+        """Обновляет индекс коротких id для узла с данными rdf:type"""
+        entity_type = next((cls for cls in ENTITY_CLASSES if cls in types), None)
+        if self.entity_types.get(uri) == entity_type:
+            return
+        key = short_id(uri)
+        if entity_type is None:
+            del self.entity_types[uri]
+            self._discard("short_ids", key, uri)
+            return
+        self.entity_types[uri] = entity_type
+        self._bucket("short_ids", key, {})[uri] = entity_type
+
+    def index_photo(self, photo_id: str, record: Optional[Dict[str, Any]]):
+        """Заменяет запись фото и обновляет индексы дубликатов и источников (record=None — фото удалено)"""
+        old = self.photos.get(photo_id)
+        if old is not None:
+            if record is not None and (old["hash"], old["dhash"]) == (record["hash"], record["dhash"]):
+                self.photos[photo_id] = record
+                self.link_photo(photo_id)
+                return
+            del self.photos[photo_id]
+            self._discard("photo_hashes", old["hash"], photo_id)
+            if old["dhash"]:
+                for key in perceptual_hash.chunk_keys(perceptual_hash.from_hex(old["dhash"])):
+                    self._discard("dhash_chunks", key, photo_id)
+        if record is not None:
+            self.photos[photo_id] = record
+            self._bucket("photo_hashes", record["hash"], set()).add(photo_id)
+            if record["dhash"]:
+                value = perceptual_hash.from_hex(record["dhash"])
+                for key in perceptual_hash.chunk_keys(value):
+                    self._bucket("dhash_chunks", key, {})[photo_id] = value
+        self.link_photo(photo_id)
+
+    def similar_photos(self, dhash: str, max_distance: int) -> List[tuple]:
+        """Фото с dHash на расстоянии Хэмминга не больше max_distance: [(расстояние, id фото)], ближайшие первыми"""
+        value = perceptual_hash.from_hex(dhash)
+        chunks = self.dhash_chunks
+        found = {}
+        for key in perceptual_hash.probe_keys(value, max_distance):
+            bucket = chunks.get(key)
+            if bucket:
+                # Фото может попасть в кандидаты через несколько частей — расстояние от этого не меняется
+                for photo_id, other in bucket.items():
+                    distance = (value ^ other).bit_count()
+                    if distance <= max_distance:
+                        found[photo_id] = distance
+        return sorted((distance, photo_id) for photo_id, distance in found.items())
+
+    def unlink_photos(self, asana_id: str):
+        """Убирает связи фото с асаной (перед пересборкой или удалением асаны)"""
+        for photo_id in self.asana_photos.pop(asana_id, ()):
+            if self.photo_asana.get(photo_id) == asana_id:
+                del self.photo_asana[photo_id]
+                self.link_photo(photo_id)
+
+    def link_photo(self, photo_id: str):
+        """Обновляет обратный индекс источников по текущим источнику и асане фото"""
+        photo = self.photos.get(photo_id)
+        asana_id = self.photo_asana.get(photo_id)
+        link = (photo["source"], asana_id) if photo and photo["source"] and asana_id else None
+        old = self.photo_links.get(photo_id)
+        if old == link:
+            return
+        if old is not None:
+            del self.photo_links[photo_id]
+            source_id, old_asana = old
+            photos = tuple(other for other in self.source_asanas[source_id][old_asana] if other != photo_id)
+            if photos:
+                self._bucket("source_asanas", source_id, {})[old_asana] = photos
+            else:
+                self._discard("source_asanas", source_id, old_asana)
+        if link is not None:
+            self.photo_links[photo_id] = link
+            source_id, asana_id = link
+            bucket = self._bucket("source_asanas", source_id, {})
+            bucket[asana_id] = tuple(sorted(bucket.get(asana_id, ()) + (photo_id,)))
+
+    def source_counts(self, source_id: str) -> Dict[str, int]:
+        """Число асан и фото источника"""
+        asanas = self.source_asanas.get(source_id, {})
+        return {"asanas": len(asanas), "photos": sum(len(photos) for photos in asanas.values())}
+
+    def index_source(self, source_id: str, record: Optional[Dict[str, Any]]):
+        """Обновляет индекс поиска источников; record=None — источник удален"""
+        prefixes = frozenset(word_prefixes(" ".join((record["title"], record["author"], record["publisher"])))) if record else frozenset()
+        indexed = self.indexed_sources.get(source_id, frozenset())
+        if prefixes == indexed:
+            return
+        for prefix in indexed - prefixes:
+            self._discard("source_prefixes", prefix, source_id)
+        for prefix in prefixes - indexed:
+            self._bucket("source_prefixes", prefix, set()).add(source_id)
+        if prefixes:
+            self.indexed_sources[source_id] = prefixes
+        else:
+            self.indexed_sources.pop(source_id, None)
+
+    def search_sources(self, query: str) -> List[str]:
+        """Id источников, в которых каждое слово запроса — начало какого-либо слова (без сортировки)"""
+        found: Optional[set] = None
+        for word in set(words(query)):
+            matches = self.source_prefixes.get(word, set())
+            found = set(matches) if found is None else found & matches
+            if not found:
+                return []
+        return list(found or ())
+
+    def index_name(self, asana_id: str, name_ru: str):
+        if self.indexed_names.get(asana_id) == name_ru:
+            return
+        self.unindex_name(asana_id)
+        if not name_ru:
+            return
+        self.indexed_names[asana_id] = name_ru
+        self.search_names[asana_id] = name_ru.lower()
+        letter = first_letter(name_ru)
+        if letter:
+            self._bucket("letters", letter, set()).add(asana_id)
+        for trigram in name_trigrams(name_ru):
+            self._bucket("trigrams", trigram, set()).add(asana_id)
+
+    def unindex_name(self, asana_id: str):
+        name_ru = self.indexed_names.pop(asana_id, None)
+        if name_ru is None:
+            return
+        del self.search_names[asana_id]
+        self._discard("letters", first_letter(name_ru), asana_id)
+        for trigram in name_trigrams(name_ru):
+            self._discard("trigrams", trigram, asana_id)
+
+_current: Optional[Projection] = None
+# Проекция, закрепленная за потоком на время построения ответа (см. pinned)
+_pinned = threading.local()
+
+def _text(value) -> str:
+    return str(value) if value else ""
+
+def _put(props: Dict, predicate, value):
+    """Добавляет значение в словарь свойств узла: типы — множеством, фото — списком, остальное — первое значение"""
+    if predicate == RDF_TYPE:
+        props.setdefault(predicate, set()).add(value)
+    elif predicate == HAS_PHOTO:
+        props.setdefault(predicate, []).append(value)
+    else:
+        props.setdefault(predicate, value)
+
+def _node_props(g, node) -> Dict:
+    """Все свойства одного узла за один проход по его триплетам"""
+    props = {}
+    for predicate, value in g.predicate_objects(node):
+        _put(props, predicate, value)
+    return props
+
+# Однозначные свойства, из которых собираются записи
+_RECORD_PROPERTIES = (
+    HAS_NAME, HAS_SOURCE, NAME_RU, NAME_SANSKRIT, NAME_TRANSLIT, DEFINITION,
+    SOURCE_TITLE, SOURCE_AUTHOR, SOURCE_YEAR, SOURCE_PUBLISHER, SOURCE_PAGES, SOURCE_ANNOTATION,
+    PHOTO_HASH, PHOTO_MIME_TYPE, PHOTO_SIZE, PHOTO_WIDTH, PHOTO_HEIGHT, PHOTO_DHASH
+)
+
+def _index_graph(g) -> Dict:
+    """Свойства всех узлов по одному проходу на предикат: subject -> {predicate: value}"""
+    index = {}
+    for s, _, value in g.triples((None, RDF_TYPE, None)):
+        index.setdefault(s, {}).setdefault(RDF_TYPE, set()).add(value)
+    for s, _, value in g.triples((None, HAS_PHOTO, None)):
+        index.setdefault(s, {}).setdefault(HAS_PHOTO, []).append(value)
+    for predicate in _RECORD_PROPERTIES:
+        for s, _, value in g.triples((None, predicate, None)):
+            index.setdefault(s, {}).setdefault(predicate, value)
+    return index
+
+def _build_name(name_id: str, props: Dict) -> Dict[str, Any]:
+    return {
+        "id": name_id,
+        "name_ru": _text(props.get(NAME_RU)),
+        "name_sanskrit": _text(props.get(NAME_SANSKRIT)),
+        "transliteration": _text(props.get(NAME_TRANSLIT)),
+        "definition": _text(props.get(DEFINITION))
+    }
+
+def _build_source(source_id: str, props: Dict) -> Dict[str, Any]:
+    return {
+        "id": source_id,
+        "title": str(props.get(SOURCE_TITLE)),
+        "author": str(props.get(SOURCE_AUTHOR)),
+        "year": int(props.get(SOURCE_YEAR) or 0),
+        "publisher": _text(props.get(SOURCE_PUBLISHER)),
+        "pages": int(props.get(SOURCE_PAGES) or 0),
+        "annotation": _text(props.get(SOURCE_ANNOTATION))
+    }
+
+def _build_photo(photo_id: str, props: Dict) -> Optional[Dict[str, Any]]:
+    """Метаданные фото из графа; сами байты лежат в хранилище фото по хэшу"""
+    photo_hash = props.get(PHOTO_HASH)
+    if not photo_hash:
+        return None
+    return {
+        "id": photo_id,
+        "hash": str(photo_hash),
+        "url": photo_store.photo_url(str(photo_hash)),
+        "thumbnail_url": photo_store.variant_url(str(photo_hash), "thumb"),
+        "medium_url": photo_store.variant_url(str(photo_hash), "medium"),
+        "mime_type": _text(props.get(PHOTO_MIME_TYPE)),
+        "size": int(props.get(PHOTO_SIZE) or 0),
+        "width": int(props.get(PHOTO_WIDTH) or 0),
+        "height": int(props.get(PHOTO_HEIGHT) or 0),
+        "dhash": _text(props.get(PHOTO_DHASH)),
+        "source": _text(props.get(HAS_SOURCE))
+    }
+
+def _without_id(record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in record.items() if k != "id"} if record else {}
+
+_EMPTY_NAME = {"name_ru": "", "name_sanskrit": "", "transliteration": "", "definition": ""}
+
+def _build_asana(asana_id: str, props: Dict, p: Projection, props_of: Callable) -> Dict[str, Any]:
+    """Запись асаны из уже собранных названий, источников и фото; props_of(uri) — свойства фото без хэша"""
+    name = props.get(HAS_NAME)
+    # Порядок триплетов в графе не определен — сортируем, чтобы "первое" фото было стабильным
+    photo_ids = sorted(str(photo) for photo in props.get(HAS_PHOTO, ()))
+    p.asana_name[asana_id] = str(name) if name else ""
+    p.unlink_photos(asana_id)
+    p.asana_photos[asana_id] = photo_ids
+    for photo_id in photo_ids:
+        p.photo_asana[photo_id] = asana_id
+        p.link_photo(photo_id)
+
+    name_data = _without_id(p.names.get(str(name))) if name else {}
+    # Источник асаны — источник ее первого фото
+    source_data = {}
+    if photo_ids:
+        first_photo = p.photos.get(photo_ids[0])
+        source = first_photo["source"] if first_photo else _text(props_of(URIRef(photo_ids[0])).get(HAS_SOURCE))
+        source_data = _without_id(p.sources.get(source))
+    photos = [p.photos[photo_id] for photo_id in photo_ids if photo_id in p.photos]
+    p.index_name(asana_id, name_data.get("name_ru", ""))
+    return {
+        "id": asana_id,
+        "name": name_data or dict(_EMPTY_NAME),
+        "source": source_data,
+        "photos": photos,
+        # Для карточек списков достаточно миниатюры
+        "photo": photos[0]["thumbnail_url"] if photos else ""
+    }
+
+def _build(g, version) -> Projection:
+    """Полная сборка: по проходу на предикат, затем записи собираются из словарей за O(триплетов)"""
+    started = time.perf_counter()
+    index = _index_graph(g)
+    p = Projection(version, map_type=dict)
+    asanas = []
+    for node, props in index.items():
+        types = props.get(RDF_TYPE, ())
+        node_id = str(node)
+        if isinstance(node, URIRef):
+            p.index_entity(node_id, types)
+        if NAME_CLASS in types:
+            p.names[node_id] = _build_name(node_id, props)
+        if SOURCE_CLASS in types:
+            p.sources[node_id] = _build_source(node_id, props)
+            p.index_source(node_id, p.sources[node_id])
+        if PHOTO_CLASS in types:
+            record = _build_photo(node_id, props)
+            if record:
+                p.index_photo(node_id, record)
+        if ASANA_CLASS in types:
+            asanas.append((node_id, props))
+    # Асаны собираются последними: им нужны готовые записи названий, источников и фото
+    props_of = lambda node: index.get(node, {})
+    for asana_id, props in asanas:
+        p.asanas[asana_id] = _build_asana(asana_id, props, p, props_of)
+    p.share_maps()
+    logger.info(f"Built projection with {len(p.asanas)} asanas in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return p
+
+def is_current(version: tuple) -> bool:
+    """Собрана ли проекция для версии графа version (без блокировки и сборки)"""
+    return _current is not None and _current.version == version
+
+def current_projection() -> Optional[Projection]:
+    """Проекция, если она собрана для текущей версии графа; None — нужна сборка (get_projection)"""
+    current = _current
+    return current if current is not None and current.version == graph_store.get_graph_version() else None
+
+@contextmanager
+def pinned(p: Projection):
+    """Внутри блока get_projection() этого потока возвращает p: весь ответ строится по одной версии"""
+    previous = getattr(_pinned, "projection", None)
+    _pinned.projection = p
+    try:
+        yield p
+    finally:
+        _pinned.projection = previous
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def get_projection() -> Projection:
+    """
+    Проекция для текущей версии графа (строится при первом обращении или после внешнего изменения файлов).
+    Внутри pinned() — закрепленная за потоком проекция. В цикле событий граф не перечитывается
+    и проекция не собирается: async-маршруты получают ее через aio.get_projection() (сборка
+    в пуле онтологии), а здесь отдается последняя опубликованная. Записи и загрузка онтологии
+    в этом процессе обновляют ее сразу (см. _apply_commit).
+    """
+    global _current
+    pinned_projection = getattr(_pinned, "projection", None)
+    if pinned_projection is not None:
+        return pinned_projection
+    current = _current
+    if _on_event_loop():
+        if current is None:
+            raise RuntimeError("Проекция не собрана: в цикле событий ее получают через aio.get_projection()")
+        return current
+    version = graph_store.get_graph_version()
+    if _current is not None and _current.version == version:
+        return _current
+    with graph_store.graph_lock():
+        version = graph_store.get_graph_version()
+        if _current is None or _current.version != version:
+            _current = _build(graph_store.get_graph(), version)
+        return _current
+
+def _apply_commit(old_version, new_version, records):
+    """
+    Собирает новую версию проекции, пересобирая только записи, затронутые изменёнными триплетами.
+    records=None — граф заменен целиком (загрузка онтологии): проекция собирается заново.
+    """
+    global _current
+    if records is None:
+        _current = _build(graph_store.get_graph(), new_version)
+        return
+    current = _current
+    if current is None or current.version != old_version:
+        # Проекция уже устарела — соберем её заново при следующем чтении
+        _current = None
+        return
+    p = current.copy(new_version)
+    g = graph_store.get_graph()
+    touched = set()
+    for _, (s, _p, o) in records:
+        touched.add(s)
+        if isinstance(o, URIRef):
+            touched.add(o)
+
+    affected_asanas = set()
+    changed_sources = set()
+    for term in touched:
+        term_id = str(term)
+        props = _node_props(g, term)
+        types = props.get(RDF_TYPE, ())
+        if isinstance(term, URIRef):
+            p.index_entity(term_id, types)
+        old_name = p.names.get(term_id)
+        if NAME_CLASS in types:
+            p.names[term_id] = _build_name(term_id, props)
+        else:
+            p.names.pop(term_id, None)
+        old_source = p.sources.get(term_id)
+        if SOURCE_CLASS in types:
+            p.sources[term_id] = _build_source(term_id, props)
+        else:
+            p.sources.pop(term_id, None)
+        p.index_source(term_id, p.sources.get(term_id))
+        p.index_photo(term_id, _build_photo(term_id, props) if PHOTO_CLASS in types else None)
+
+        # Асана пересобирается, если изменились её триплеты или её фото. Новая ссылка на название
+        # или источник меняет триплеты асаны или фото, поэтому остальные асаны с тем же названием
+        # или источником трогаем, только если изменилась сама запись названия или источника
+        if ASANA_CLASS in types or term_id in p.asanas:
+            affected_asanas.add(term)
+        affected_asanas.update(g.subjects(HAS_PHOTO, term))
+        if p.names.get(term_id) != old_name:
+            affected_asanas.update(g.subjects(HAS_NAME, term))
+        if p.sources.get(term_id) != old_source:
+            changed_sources.add(term_id)
+
+    props_of = lambda node: _node_props(g, node)
+    for asana in affected_asanas:
+        asana_id = str(asana)
+        props = _node_props(g, asana)
+        if ASANA_CLASS in props.get(RDF_TYPE, ()):
+            p.asanas[asana_id] = _build_asana(asana_id, props, p, props_of)
+        else:
+            p.asanas.pop(asana_id, None)
+            p.unindex_name(asana_id)
+            p.asana_name.pop(asana_id, None)
+            p.unlink_photos(asana_id)
+    # Источник в записи асаны — копия записи источника её первого фото: при изменении источника
+    # обновляется только это поле у асан из обратного индекса, без пересборки
+    for source_id in changed_sources:
+        source_data = _without_id(p.sources.get(source_id))
+        for asana_id in {*current.source_asanas.get(source_id, ()), *p.source_asanas.get(source_id, ())}:
+            asana = p.asanas.get(asana_id)
+            photo_ids = p.asana_photos.get(asana_id)
+            first_photo = p.photos.get(photo_ids[0]) if photo_ids else None
+            if asana and first_photo and first_photo["source"] == source_id and asana["source"] != source_data:
+                p.asanas[asana_id] = {**asana, "source": source_data}
+    # Публикуем новую версию целиком: читатели старой версии дочитывают её без изменений
+    _current = p
+    logger.debug(f"Projection updated: {len(touched)} terms, {len(affected_asanas)} asanas rebuilt")
+
+graph_store.add_commit_listener(_apply_commit)
@@ -0,0 +1,25 @@
+from rdflib import URIRef
+from app.projection import get_projection, short_id
+from typing import Optional
+import logging
+
+logger = logging.getLogger("asana_service.resolver")
+
+def resolve_uri(identifier: str, entity_type: Optional[URIRef] = None) -> Optional[URIRef]:
+    """
+    Полный URI сущности по полному URI или короткому id ("asana_<uuid>", "source_<uuid>", "<uuid>").
+    Если задан entity_type, учитываются только сущности этого класса. Возвращает None, если не найдено.
+    """
+    if not identifier:
+        return None
+    projection = get_projection()
+    if identifier.startswith("http"):
+        known_type = projection.entity_types.get(identifier)
+        if known_type is not None and (entity_type is None or known_type == entity_type):
+            return URIRef(identifier)
+    candidates = projection.short_ids.get(short_id(identifier), {})
+    for uri, candidate_type in candidates.items():
+        if entity_type is None or candidate_type == entity_type:
+            return URIRef(uri)
+    logger.debug(f"Could not resolve id: {identifier}")
+    return None
@@ -0,0 +1,89 @@
+from rdflib import Graph
+from app.sqlite_store import encode_term, decode_term
+from array import array
+from typing import Optional
+import hashlib
+import logging
+import struct
+import sys
+import os
+
+logger = logging.getLogger("asana_service.snapshot")
+
+# Бинарный снимок графа: заголовок, таблица уникальных термов и массив троек индексов.
+#   MAGIC | sha256 файла онтологии (32 байта) | число термов | длина таблицы | длина префиксов | число троек
+#   таблица термов: закодированные термы через "\0" (UTF-8)
+#   префиксы пространств имен: строки "prefix\turi\n" (UTF-8)
+#   тройки: uint32 little-endian, по три индекса на триплет
+MAGIC = b"ASNAP01\n"
+_HEADER = struct.Struct("<32sIQQQ")
+
+def file_hash(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def write_snapshot(g: Graph, path: str, source_hash: bytes):
+    """Сохраняет граф в снимок, привязанный к хэшу исходного RDF/XML"""
+    terms = {}
+    indexes = array("I")
+    for triple in g:
+        for term in triple:
+            index = terms.get(term)
+            if index is None:
+                index = terms[term] = len(terms)
+            indexes.append(index)
+    if indexes.itemsize != 4:
+        raise RuntimeError("array('I') is not 32-bit on this platform")
+    table = "\0".join(encode_term(term) for term in terms).encode("utf-8")
+    namespaces = "".join(f"{prefix}\t{uri}\n" for prefix, uri in g.namespaces()).encode("utf-8")
+    if sys.byteorder != "little":
+        indexes.byteswap()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(source_hash, len(terms), len(table), len(namespaces), len(indexes) // 3))
+        f.write(table)
+        f.write(namespaces)
+        indexes.tofile(f)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote graph snapshot {path}: {len(terms)} terms, {len(indexes) // 3} triples")
+
+def read_snapshot(path: str, source_hash: bytes) -> Optional[Graph]:
+    """Загружает граф из снимка, если он построен из файла с тем же хэшем; иначе None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                logger.warning(f"Snapshot {path} has unknown format, ignoring")
+                return None
+            snapshot_hash, term_count, table_size, namespaces_size, triple_count = _HEADER.unpack(f.read(_HEADER.size))
+            if snapshot_hash != source_hash:
+                logger.info("Snapshot does not match ontology file, ignoring")
+                return None
+            table = f.read(table_size).decode("utf-8")
+            namespaces = f.read(namespaces_size).decode("utf-8")
+            indexes = array("I")
+            indexes.fromfile(f, triple_count * 3)
+        if sys.byteorder != "little":
+            indexes.byteswap()
+        terms = [decode_term(value) for value in table.split("\0")] if term_count else []
+        if len(terms) != term_count:
+            raise ValueError(f"expected {term_count} terms, got {len(terms)}")
+        g = Graph()
+        for line in namespaces.splitlines():
+            prefix, uri = line.split("\t", 1)
+            g.bind(prefix, uri, override=True, replace=True)
+        # Пишем прямо в хранилище: Graph.add проверяет термы и рассылает события для каждого триплета
+        store_add = g.store.add
+        for i in range(0, len(indexes), 3):
+            store_add((terms[indexes[i]], terms[indexes[i + 1]], terms[indexes[i + 2]]), g, False)
+        return g
+    except Exception as e:
+        logger.warning(f"Could not read snapshot {path}: {str(e)}")
+        return None
@@ -0,0 +1,171 @@
+from rdflib import URIRef, BNode, Literal
+from rdflib.store import Store
+from typing import Optional, Iterator
+import threading
+import sqlite3
+import logging
+import json
+import os
+
+logger = logging.getLogger("asana_service.sqlite_store")
+
+# Термы хранятся строкой с префиксом вида: "U" + URI, "B" + id пустого узла,
+# "L" + JSON [значение, язык, тип данных]. Одинаковые термы дают одинаковые строки,
+# поэтому по ним работают индексы SPO/POS/OSP.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS triples (
+    s TEXT NOT NULL,
+    p TEXT NOT NULL,
+    o TEXT NOT NULL,
+    PRIMARY KEY (s, p, o)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s);
+CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p);
+CREATE TABLE IF NOT EXISTS namespaces (
+    prefix TEXT PRIMARY KEY,
+    uri TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+def encode_term(term) -> str:
+    if isinstance(term, URIRef):
+        return "U" + str(term)
+    if isinstance(term, BNode):
+        return "B" + str(term)
+    if isinstance(term, Literal):
+        datatype = str(term.datatype) if term.datatype else None
+        return "L" + json.dumps([str(term), term.language, datatype], ensure_ascii=False)
+    raise ValueError(f"Unsupported RDF term: {term!r}")
+
+def decode_term(value: str):
+    kind, body = value[0], value[1:]
+    if kind == "U":
+        return URIRef(body)
+    if kind == "B":
+        return BNode(body)
+    lexical, language, datatype = json.loads(body)
+    return Literal(lexical, lang=language, datatype=URIRef(datatype) if datatype else None)
+
+class SQLiteStore(Store):
+    """
+    Хранилище триплетов rdflib поверх SQLite: каждый запрос с привязанными термами
+    идет по индексу и читает только нужные строки, запись затрагивает только изменяемые строки.
+    Изменения видны другим процессам после commit(); счетчик версии в таблице meta
+    позволяет им заметить, что кэши нужно обновить.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = False
+
+    def __init__(self, configuration: Optional[str] = None, identifier=None):
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration: str, create: bool = True):
+        directory = os.path.dirname(configuration)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Соединение общее для потоков процесса; запись сериализуется блокировкой графа
+        self._connection = sqlite3.connect(configuration, check_same_thread=False, isolation_level="DEFERRED")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+        logger.info(f"Opened SQLite triple store at {configuration}")
+
+    def close(self, commit_pending_transaction: bool = False):
+        if self._connection is None:
+            return
+        if commit_pending_transaction:
+            self._connection.commit()
+        else:
+            self._connection.rollback()
+        self._connection.close()
+        self._connection = None
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params)
+
+    def add(self, triple, context=None, quoted: bool = False):
+        s, p, o = triple
+        self._execute(
+            "INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)",
+            (encode_term(s), encode_term(p), encode_term(o))
+        )
+        super().add(triple, context, quoted)
+
+    def addN(self, quads):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)",
+                ((encode_term(s), encode_term(p), encode_term(o)) for s, p, o, _ in quads)
+            )
+
+    def _where(self, pattern):
+        clauses, params = [], []
+        for column, term in zip("spo", pattern):
+            if term is not None:
+                clauses.append(f"{column} = ?")
+                params.append(encode_term(term))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def remove(self, pattern, context=None):
+        where, params = self._where(pattern)
+        self._execute(f"DELETE FROM triples{where}", params)
+        super().remove(pattern, context)
+
+    def triples(self, pattern, context=None) -> Iterator:
+        where, params = self._where(pattern)
+        # Строки забираются сразу: курсор не должен жить дольше блокировки соединения
+        rows = self._execute(f"SELECT s, p, o FROM triples{where}", params).fetchall()
+        for s, p, o in rows:
+            yield (decode_term(s), decode_term(p), decode_term(o)), iter(())
+
+    def __len__(self, context=None) -> int:
+        return self._execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix: str, namespace, override: bool = True):
+        if not override and self.namespace(prefix) is not None:
+            return
+        self._execute("INSERT OR REPLACE INTO namespaces (prefix, uri) VALUES (?, ?)", (prefix, str(namespace)))
+
+    def namespace(self, prefix: str):
+        row = self._execute("SELECT uri FROM namespaces WHERE prefix = ?", (prefix,)).fetchone()
+        return URIRef(row[0]) if row else None
+
+    def prefix(self, namespace):
+        row = self._execute("SELECT prefix FROM namespaces WHERE uri = ?", (str(namespace),)).fetchone()
+        return row[0] if row else None
+
+    def namespaces(self):
+        for prefix, uri in self._execute("SELECT prefix, uri FROM namespaces").fetchall():
+            yield prefix, URIRef(uri)
+
+    def commit(self):
+        """Фиксирует транзакцию и увеличивает счетчик версии хранилища"""
+        with self._lock:
+            self._connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._connection.rollback()
+
+    def clear(self):
+        """Удаляет все триплеты (перед импортом онтологии целиком)"""
+        self._execute("DELETE FROM triples")
+
+    def version(self) -> int:
+        return self._execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
@@ -0,0 +1,66 @@
+from typing import Dict, Set, Iterable, List, Tuple, Optional
+import math
+import re
+
+# Доля триграмм запроса, которая должна встретиться в названии, чтобы оно попало в кандидаты
+# на нечеткое сравнение. Точные вхождения запроса содержат все его триграммы и не теряются.
+MIN_TRIGRAM_OVERLAP = 0.3
+
+_SPACES = re.compile(r"\s+")
+_WORDS = re.compile(r"\w+")
+
+def normalize(text: str) -> str:
+    """Название для индекса: без учета регистра, Ё как Е, пробелы схлопнуты"""
+    return _SPACES.sub(" ", (text or "").casefold().replace("ё", "е")).strip()
+
+def words(text: str) -> List[str]:
+    """Слова нормализованного текста (для поиска источников по началу слова)"""
+    return _WORDS.findall(normalize(text))
+
+def word_prefixes(text: str) -> Set[str]:
+    """Все начала всех слов текста: "йога света" -> й, йо, йог, йога, с, св, ..."""
+    return {word[:i] for word in words(text) for i in range(1, len(word) + 1)}
+
+def name_trigrams(name: str) -> Set[str]:
+    """Триграммы названия; пробелы по краям дают триграммы начала и конца слова"""
+    padded = f" {normalize(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} if len(padded) > 3 else set()
+
+def query_trigrams(query: str) -> Set[str]:
+    """Триграммы запроса без краевых пробелов: запрос может быть началом или серединой слова"""
+    query = normalize(query)
+    return {query[i:i + 3] for i in range(len(query) - 2)}
+
+def candidates(index: Dict[str, Set[str]], all_ids: Iterable[str], query: str) -> Iterable[str]:
+    """
+    Id названий, которые стоит сравнивать с запросом. Для запросов короче трех символов
+    триграмм нет, и кандидатами остаются все названия.
+    """
+    trigrams = query_trigrams(query)
+    if not trigrams:
+        return all_ids
+    counts: Dict[str, int] = {}
+    for trigram in trigrams:
+        for asana_id in index.get(trigram, ()):
+            counts[asana_id] = counts.get(asana_id, 0) + 1
+    required = max(1, math.ceil(len(trigrams) * MIN_TRIGRAM_OVERLAP))
+    return [asana_id for asana_id, count in counts.items() if count >= required]
+
+def score_names(query: str, names: Dict[str, str], threshold: float, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    Оценки совпадения запроса с названиями (id -> название в нижнем регистре): 1.0 для вхождения
+    подстроки, иначе максимум fuzz.ratio и fuzz.partial_ratio. Нечеткие оценки считаются пакетно
+    в rapidfuzz.process.extract, названия ниже порога отсекаются внутри rapidfuzz (score_cutoff).
+    Возвращает пары (id, оценка) без сортировки.
+    """
+    from rapidfuzz import fuzz, process
+
+    scores = {asana_id: 100.0 for asana_id, name in names.items() if query in name}
+    # Если точных вхождений хватает на всю выдачу, нечеткие совпадения в нее не попадут
+    if limit is None or len(scores) < limit:
+        fuzzy_names = {asana_id: name for asana_id, name in names.items() if asana_id not in scores}
+        for scorer in (fuzz.ratio, fuzz.partial_ratio):
+            for _, score, asana_id in process.extract(query, fuzzy_names, scorer=scorer, score_cutoff=threshold * 100, limit=None):
+                if score > scores.get(asana_id, 0.0):
+                    scores[asana_id] = score
+    return [(asana_id, score / 100.0) for asana_id, score in scores.items()]
@@ -0,0 +1,179 @@
+"""
+Задержка чтений GET /asanas, пока в том же процессе идет долгая блокирующая работа:
+запись онтологии с контрольной точкой (полный g.serialize), отправка письма
+при регистрации (bcrypt и SMTP-сервер, который долго не отвечает) или полная пересборка
+проекции, отставшей от графа (как после записи другого процесса в общую базу SQLite).
+
+Каждый сценарий прогоняется дважды: работа вызывается прямо в async-обработчике
+(как раньше) и через пулы executors (как сейчас в маршрутах). Для пересборки проекции
+"inline" — прежний порядок: зависимость дает только версию графа, проекцию собирает обработчик.
+Столбец "lag" — наибольшее опоздание таймера цикла событий за сценарий. Приложение —
+уменьшенная копия маршрутов бэкенда без PostgreSQL; запросы идут через ASGI
+в том же цикле событий, поэтому блокировка цикла видна в задержке чтений.
+
+Запуск из каталога backend:
+    python scripts/bench_event_loop.py [асан в онтологии]
+"""
+import threading
+import tempfile
+import logging
+import asyncio
+import socket
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+import httpx
+from fastapi import Depends, FastAPI, Request, Response
+from app import auth, config, executors, graph_store, ontology, paging, projection
+from app.http_cache import cached_json, check_etag, graph_etag, make_etag
+from bench_projection import make_graph
+
+READERS = 4
+SMTP_DELAY = 1.5
+
+def slow_smtp_server() -> int:
+    """SMTP-сервер, который держит соединение SMTP_DELAY секунд и закрывает его без ответа"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        while True:
+            conn, _ = server.accept()
+            threading.Timer(SMTP_DELAY, conn.close).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+def large_write():
+    """Запись, после которой журнал сворачивается в файл онтологии (полная сериализация графа)"""
+    ontology.add_source({"title": "Нагрузка", "author": "Тест", "year": 2024})
+    graph_store.checkpoint()
+
+def registration_work():
+    """Хэш пароля при регистрации и письмо с кодом подтверждения"""
+    auth.get_password_hash("password123")
+    auth.send_confirmation_email("user@example.com", "123456")
+
+def stale_projection():
+    """Проекция отстает от версии графа: следующее чтение собирает ее заново"""
+    projection._current = projection._current.copy(("stale",))
+
+def inline_etag(request: Request, response: Response):
+    """Прежняя graph_etag: только версия графа, проекцию потом собирает обработчик в цикле событий"""
+    version = graph_store.get_graph_version()
+    request.state.graph_version = version
+    check_etag(request, response, make_etag(version, request.url.path))
+
+def inline_projection(version: tuple):
+    """Прежняя get_projection, вызванная из обработчика: сборка в цикле событий"""
+    if not projection.is_current(version):
+        with graph_store.graph_lock():
+            if not projection.is_current(version):
+                projection._current = projection._build(graph_store.get_graph(), version)
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/asanas", dependencies=[Depends(graph_etag)])
+    async def get_asanas(request: Request):
+        return await cached_json(request, lambda: paging.paginate(ontology.load_sorted_asanas(), limit=50))
+
+    @app.get("/asanas/inline", dependencies=[Depends(inline_etag)])
+    async def get_asanas_inline(request: Request):
+        inline_projection(request.state.graph_version)
+        request.state.projection = projection._current
+        return await cached_json(request, lambda: paging.paginate(ontology.load_sorted_asanas(), limit=50))
+
+    @app.post("/stale")
+    async def stale():
+        stale_projection()
+
+    @app.post("/write/inline")
+    async def write_inline():
+        large_write()
+
+    @app.post("/write/pool")
+    async def write_pool():
+        await executors.run_blocking("ontology", large_write)
+
+    @app.post("/register/inline")
+    async def register_inline():
+        registration_work()
+
+    @app.post("/register/pool")
+    async def register_pool():
+        # Как register_user: bcrypt в пуле "auth", письмо уходит в пул "email" без ожидания
+        await executors.run_blocking("auth", auth.get_password_hash, "password123")
+        executors.submit("email", auth.send_confirmation_email, "user@example.com", "123456")
+
+    return app
+
+async def read_loop(client: httpx.AsyncClient, read_path: str, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(read_path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.002)
+
+async def loop_lag(stop: asyncio.Event, lags: list):
+    """Опоздание таймера на 1 мс: сколько цикл событий был занят чужой работой"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+async def scenario(client: httpx.AsyncClient, path: str | None, read_path: str = "/asanas"):
+    latencies, lags, stop, stop_monitor = [], [], asyncio.Event(), asyncio.Event()
+    readers = [asyncio.create_task(read_loop(client, read_path, stop, latencies)) for _ in range(READERS)]
+    monitor = asyncio.create_task(loop_lag(stop_monitor, lags))
+    await asyncio.sleep(0.3)
+    started = time.perf_counter()
+    if path:
+        (await client.post(path)).raise_for_status()
+    # Чтения продолжаются, пока фоновая работа (письмо, сборка проекции) еще идет
+    await asyncio.sleep(max(0.0, SMTP_DELAY + 0.5 - (time.perf_counter() - started)))
+    stop.set()
+    # Таймер меряется, пока не завершится последнее чтение (оно может ждать сборки проекции)
+    await asyncio.gather(*readers)
+    stop_monitor.set()
+    await monitor
+    latencies.sort()
+    percentile = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    return len(latencies), percentile(0.5), percentile(0.99), latencies[-1] * 1000, max(lags) * 1000
+
+async def run(asana_count: int):
+    async with httpx.AsyncClient(app=make_app(), base_url="http://bench") as client:
+        (await client.get("/asanas")).raise_for_status()
+        print(f"asanas={asana_count} readers={READERS} smtp delay={SMTP_DELAY} s")
+        print(f"{'scenario':>16} {'reads':>6} {'p50, ms':>8} {'p99, ms':>8} {'max, ms':>8} {'lag, ms':>8}")
+        for label, path, read_path in (
+                ("idle", None, "/asanas"), ("write inline", "/write/inline", "/asanas"),
+                ("write pool", "/write/pool", "/asanas"), ("register inline", "/register/inline", "/asanas"),
+                ("register pool", "/register/pool", "/asanas"), ("rebuild inline", "/stale", "/asanas/inline"),
+                ("rebuild pool", "/stale", "/asanas")):
+            reads, p50, p99, worst, lag = await scenario(client, path, read_path)
+            print(f"{label:>16} {reads:>6} {p50:>8.1f} {p99:>8.1f} {worst:>8.1f} {lag:>8.1f}")
+    executors.shutdown()
+
+def main(asana_count: int):
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        config.OWL_FILE_PATH = os.path.join(tmp, "ontology.owl")
+        config.OWL_JOURNAL_PATH = os.path.join(tmp, "ontology.owl.journal")
+        config.OWL_SNAPSHOT_PATH = os.path.join(tmp, "ontology.owl.snapshot")
+        config.PHOTO_STORE_DIR = os.path.join(tmp, "photos")
+        config.SMTP_SERVER, config.SMTP_PORT = "127.0.0.1", slow_smtp_server()
+        make_graph(asana_count).serialize(destination=config.OWL_FILE_PATH, format="xml")
+        asyncio.run(run(asana_count))
+
+if __name__ == "__main__":
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]] or [3000]))
@@ -0,0 +1,89 @@
+"""
+Пропускная способность записи в онтологию: полный g.serialize на каждую операцию (прежний способ),
+журнал с fsync на каждую операцию и групповая запись (GROUP_COMMIT_WINDOW), для файла и SQLite.
+
+Параллельные писатели добавляют названия асан в синтетическую онтологию заданного размера;
+для каждого режима выводятся операции в секунду и задержка вызова (медиана и 99-й перцентиль).
+
+Запуск из каталога backend:
+    python scripts/bench_group_commit.py [асан в онтологии] [писателей] [записей на писателя]
+"""
+import threading
+import tempfile
+import logging
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from app import config, graph_store, ontology, projection
+from bench_projection import make_graph
+
+# (название, хранилище, окно группы в секундах, порог журнала для контрольной точки)
+MODES = [
+    ("file, g.serialize per op", "file", 0, 1),
+    ("file, journal fsync per op", "file", 0, 8 * 1024 * 1024),
+    ("file, group commit 50 ms", "file", 0.05, 8 * 1024 * 1024),
+    ("sqlite, commit per op", "sqlite", 0, 8 * 1024 * 1024),
+    ("sqlite, group commit 50 ms", "sqlite", 0.05, 8 * 1024 * 1024),
+]
+
+def reset(tmp: str, storage: str, window: float, checkpoint_bytes: int, base_owl: str):
+    config.ONTOLOGY_STORAGE = storage
+    config.GROUP_COMMIT_WINDOW = window
+    config.JOURNAL_CHECKPOINT_BYTES = checkpoint_bytes
+    config.OWL_FILE_PATH = base_owl
+    config.OWL_JOURNAL_PATH = os.path.join(tmp, "ontology.owl.journal")
+    config.OWL_SNAPSHOT_PATH = os.path.join(tmp, "ontology.owl.snapshot")
+    config.ONTOLOGY_SQLITE_PATH = os.path.join(tmp, "ontology.sqlite3")
+    graph_store._graph = None
+    graph_store._file_signature = None
+    projection._current = None
+
+def run(writers: int, writes: int):
+    latencies, errors = [], []
+
+    def writer(number: int):
+        try:
+            for i in range(writes):
+                started = time.perf_counter()
+                ontology.add_asana_name({"name_ru": f"Поза {number}-{i}", "name_sanskrit": "Asana"})
+                latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    latencies.sort()
+    return elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def main(size: int, writers: int, writes: int):
+    logging.disable(logging.CRITICAL)
+    print(f"catalog={size} asanas, writers={writers}, writes/writer={writes}")
+    print(f"{'mode':<28} {'ops/s':>8} {'p50, ms':>9} {'p99, ms':>9} {'names':>7}")
+    source = make_graph(size)
+    for title, storage, window, checkpoint_bytes in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            base_owl = os.path.join(tmp, "ontology.owl")
+            source.serialize(destination=base_owl, format="xml")
+            reset(tmp, storage, window, checkpoint_bytes, base_owl)
+            names_before = len(ontology.load_asana_names())
+            elapsed, p50, p99 = run(writers, writes)
+            added = len(ontology.load_asana_names()) - names_before
+            print(f"{title:<28} {writers * writes / elapsed:>8.0f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} {added:>7}")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(main(*(args + [1000, 16, 20][len(args):])))
@@ -0,0 +1,78 @@
+"""
+Поиск почти дубликатов фото по dHash: многоиндексное хэширование проекции
+(Projection.similar_photos) против полного перебора всех фото.
+
+dHash синтетические: случайные хэши плюс для части фото — копии с несколькими
+перевернутыми битами (как у пересжатого или уменьшенного снимка).
+
+Запуск из каталога backend:
+    python scripts/bench_photo_duplicates.py 10000 50000
+"""
+import logging
+import random
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from app import config, perceptual_hash
+from app.projection import Projection
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(perceptual_hash.DHASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+def make_projection(size: int, rng: random.Random):
+    p = Projection((size,))
+    originals = []
+    for i in range(size):
+        if originals and i % 10 == 0:
+            value = flip_bits(rng.choice(originals), rng.randint(1, config.PHOTO_DUPLICATE_DISTANCE), rng)
+        else:
+            value = rng.getrandbits(perceptual_hash.DHASH_BITS)
+            originals.append(value)
+        photo_id = f"photo_{i}"
+        p.index_photo(photo_id, {"id": photo_id, "hash": f"{i:064x}", "dhash": perceptual_hash.to_hex(value)})
+    return p, originals
+
+def linear_scan(p: Projection, dhash: str, max_distance: int):
+    value = perceptual_hash.from_hex(dhash)
+    found = []
+    for photo_id, photo in p.photos.items():
+        distance = perceptual_hash.distance(value, perceptual_hash.from_hex(photo["dhash"]))
+        if distance <= max_distance:
+            found.append((distance, photo_id))
+    return sorted(found)
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    rng = random.Random(1)
+    max_distance = config.PHOTO_DUPLICATE_DISTANCE
+    print(f"max distance={max_distance} bits, {perceptual_hash.MIH_CHUNKS} tables x {perceptual_hash.CHUNK_BITS} bits")
+    print(f"{'photos':>8} {'index, ms':>10} {'MIH, ms':>9} {'scan, ms':>9} {'found':>7} {'same':>6}")
+    for size in sizes:
+        started = time.perf_counter()
+        p, originals = make_projection(size, rng)
+        index_time = time.perf_counter() - started
+        queries = [perceptual_hash.to_hex(flip_bits(rng.choice(originals), rng.randint(0, max_distance), rng)) for _ in range(200)]
+
+        started = time.perf_counter()
+        indexed = [p.similar_photos(query, max_distance) for query in queries]
+        mih_time = (time.perf_counter() - started) / len(queries)
+        scan_queries = queries[:20]
+        started = time.perf_counter()
+        scanned = [linear_scan(p, query, max_distance) for query in scan_queries]
+        scan_time = (time.perf_counter() - started) / len(scan_queries)
+
+        same = indexed[:len(scan_queries)] == scanned
+        found = sum(len(result) for result in indexed) / len(indexed)
+        print(f"{size:>8} {index_time * 1000:>10.0f} {mih_time * 1000:>9.3f} {scan_time * 1000:>9.2f} {found:>7.1f} {str(same):>6}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000])
@@ -0,0 +1,65 @@
+"""
+Пиковая память на загрузку фото: чтение файла целиком (await photo.read() + save_photo)
+против потоковой записи в хранилище (save_photo_file) для файлов разного размера.
+
+Файл загрузки имитирует то, что отдает разбор формы Starlette: временный файл на диске.
+Память считается через tracemalloc (аллокации Python, куда попадают и буферы байтов).
+
+Запуск из каталога backend:
+    python scripts/bench_photo_upload.py [размеры в МБ...]
+"""
+import tracemalloc
+import tempfile
+import logging
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from app import config, photo_store
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+def main(sizes_mb):
+    logging.disable(logging.CRITICAL)
+    print(f"chunk={config.PHOTO_CHUNK_BYTES // 1024} KB")
+    print(f"{'upload, MB':>10} {'read(), MB peak':>16} {'stream, MB peak':>16} {'read(), ms':>11} {'stream, ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        config.PHOTO_STORE_DIR = os.path.join(tmp, "photos")
+        for size_mb in sizes_mb:
+            upload_path = os.path.join(tmp, f"upload_{size_mb}")
+            with open(upload_path, "wb") as f:
+                # Не изображение: копии не готовятся, меряется только путь записи
+                f.write(os.urandom(size_mb * 1024 * 1024))
+
+            def read_whole():
+                with open(upload_path, "rb") as upload:
+                    photo_store.save_photo(upload.read(), max_bytes=0)
+
+            def stream():
+                with open(upload_path, "rb") as upload:
+                    photo_store.save_photo_file(upload, max_bytes=0)
+
+            read_peak, read_time = measure(read_whole)
+            # Второй раз фото уже в хранилище: сносим его, чтобы оба варианта писали файл
+            for root, _, files in os.walk(config.PHOTO_STORE_DIR):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+            stream_peak, stream_time = measure(stream)
+            print(f"{size_mb:>10} {read_peak / 2 ** 20:>16.1f} {stream_peak / 2 ** 20:>16.1f} "
+                  f"{read_time * 1000:>11.0f} {stream_time * 1000:>11.0f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [5, 20, 80])
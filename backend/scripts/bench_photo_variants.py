@@ -0,0 +1,59 @@
+"""
+Вес фото на странице каталога: оригиналы против миниатюр (thumb) и средних копий (medium),
+и время подготовки копий в пуле потоков.
+
+Фото — синтетические JPEG размером с типичный снимок с телефона (шум плюс градиент,
+чтобы сжатие было похоже на реальные фотографии).
+
+Запуск из каталога backend:
+    python scripts/bench_photo_variants.py [фото] [ширина оригинала]
+"""
+import tempfile
+import logging
+import random
+import sys
+import time
+import io
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from PIL import Image
+from app import config, photo_store
+
+def make_photo(width: int, seed: int) -> bytes:
+    height = width * 3 // 4
+    rng = random.Random(seed)
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    img = Image.blend(noise, gradient, 0.6)
+    img = Image.blend(img, Image.new("RGB", (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256))), 0.3)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def main(count: int, width: int):
+    logging.disable(logging.CRITICAL)
+    photos = [make_photo(width, seed) for seed in range(count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        config.PHOTO_STORE_DIR = tmp
+        started = time.perf_counter()
+        hashes = [photo_store.save_photo(data)["hash"] for data in photos]
+        saved = time.perf_counter() - started
+        photo_store.wait_for_variants()
+        generated = time.perf_counter() - started
+
+        sizes = {variant: sum(os.path.getsize(photo_store.variant_path(h, variant)) for h in hashes) for variant in photo_store.VARIANTS}
+        print(f"photos={count} original width={width} workers={config.PHOTO_VARIANT_WORKERS}")
+        print(f"save_photo (request path): {saved * 1000 / count:.1f} ms/photo; variants ready after {generated:.2f} s")
+        for variant in photo_store.VARIANTS:
+            print(f"{variant:>9}: {sizes[variant] / 1024:>9.0f} KB total, {sizes[variant] / 1024 / count:>7.1f} KB/photo, "
+                  f"{sizes['original'] / sizes[variant]:>5.1f}x smaller than original")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(main(*(args + [30, 3000][len(args):])))
@@ -0,0 +1,100 @@
+"""
+Бенчмарк сборки проекции асан: поузловые g.value() против одного прохода по триплетам.
+
+Запуск из каталога backend (внутри контейнера переменные БД уже заданы):
+    python scripts/bench_projection.py 1000 10000 100000
+"""
+import logging
+import sys
+import time
+import os
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from rdflib import Graph, Literal, RDF, URIRef
+from rdflib.namespace import XSD
+from app.graph_store import ASANA
+from app import projection
+
+def make_graph(asana_count: int) -> Graph:
+    """Синтетическая онтология: на асану — название, фото и один из asana_count // 10 источников"""
+    g = Graph()
+    sources = []
+    for i in range(max(1, asana_count // 10)):
+        source = ASANA[f"source_{uuid.uuid4()}"]
+        g.add((source, RDF.type, ASANA.AsanaSource))
+        g.add((source, ASANA.sourseTitle, Literal(f"Книга {i}")))
+        g.add((source, ASANA.sourceAuthor, Literal(f"Автор {i}")))
+        g.add((source, ASANA.sourceYear, Literal(1950 + i % 70, datatype=XSD.integer)))
+        g.add((source, ASANA.sourcePages, Literal(100 + i % 300, datatype=XSD.integer)))
+        sources.append(source)
+    for i in range(asana_count):
+        name = ASANA[f"name_{uuid.uuid4()}"]
+        g.add((name, RDF.type, ASANA.AsanaName))
+        g.add((name, ASANA.nameInRussian, Literal(f"Асана {i}")))
+        g.add((name, ASANA.nameInSanskrit, Literal(f"Asana {i}")))
+        g.add((name, ASANA.nameInTranslit, Literal(f"asana {i}")))
+        photo = ASANA[f"photo_{uuid.uuid4()}"]
+        g.add((photo, RDF.type, ASANA.AsanaPhoto))
+        g.add((photo, ASANA.photoHash, Literal(uuid.uuid4().hex * 2)))
+        g.add((photo, ASANA.photoMimeType, Literal("image/jpeg")))
+        g.add((photo, ASANA.photoSize, Literal(50000, datatype=XSD.integer)))
+        g.add((photo, ASANA.hasSource, sources[i % len(sources)]))
+        asana = ASANA[f"asana_{uuid.uuid4()}"]
+        g.add((asana, RDF.type, ASANA.Asana))
+        g.add((asana, ASANA.hasName, name))
+        g.add((asana, ASANA.hasPhoto, photo))
+    return g
+
+def build_per_node(g: Graph):
+    """Прежний способ: для каждой асаны отдельные g.value() по названию, фото и источнику"""
+    asanas = []
+    for asana in g.subjects(RDF.type, ASANA.Asana):
+        name = g.value(asana, ASANA.hasName)
+        photos = list(g.objects(asana, ASANA.hasPhoto))
+        name_data = {
+            "name_ru": str(g.value(name, ASANA.nameInRussian)) if name else "",
+            "name_sanskrit": str(g.value(name, ASANA.nameInSanskrit)) if name and g.value(name, ASANA.nameInSanskrit) else "",
+            "transliteration": str(g.value(name, ASANA.nameInTranslit)) if name and g.value(name, ASANA.nameInTranslit) else "",
+            "definition": str(g.value(name, projection.DEFINITION)) if name and g.value(name, projection.DEFINITION) else ""
+        }
+        source = g.value(photos[0], ASANA.hasSource) if photos else None
+        source_data = {}
+        if source:
+            source_data = {
+                "title": str(g.value(source, ASANA.sourseTitle)),
+                "author": str(g.value(source, ASANA.sourceAuthor)),
+                "year": int(g.value(source, ASANA.sourceYear)),
+                "publisher": str(g.value(source, ASANA.sourcePublisher)) if g.value(source, ASANA.sourcePublisher) else "",
+                "pages": int(g.value(source, ASANA.sourcePages)) if g.value(source, ASANA.sourcePages) else 0,
+                "annotation": str(g.value(source, ASANA.sourceAnnotation)) if g.value(source, ASANA.sourceAnnotation) else ""
+            }
+        hashes = [str(g.value(photo, ASANA.photoHash)) for photo in photos if g.value(photo, ASANA.photoHash)]
+        asanas.append({"id": str(asana), "name": name_data, "source": source_data, "photos": hashes})
+    return asanas
+
+def timed(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    print(f"{'asanas':>8} {'triples':>9} {'per-node, ms':>13} {'single pass, ms':>16} {'speedup':>8}")
+    for size in sizes:
+        g = make_graph(size)
+        repeat = 1 if size >= 100000 else 3
+        per_node = timed(build_per_node, g, repeat=repeat)
+        single_pass = timed(projection._build, g, None, repeat=repeat)
+        print(f"{size:>8} {len(g):>9} {per_node * 1000:>13.1f} {single_pass * 1000:>16.1f} {per_node / single_pass:>7.1f}x")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,85 @@
+"""
+Стоимость одной записи для проекции при разных размерах каталога: обновление проекции
+после добавления асаны (_apply_commit) и отдельно создание новой версии (copy()) против
+прежнего поверхностного копирования всех карт целиком.
+
+Онтология синтетическая (см. bench_projection.make_graph), запись — ontology.add_asana
+с уже сохраненным фото, так что в замер попадает только работа над графом и проекцией.
+
+Запуск из каталога backend:
+    python scripts/bench_projection_write.py 1000 10000 30000
+"""
+import statistics
+import tempfile
+import logging
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from PIL import Image
+from io import BytesIO
+from app import config, graph_store, ontology, photo_store, projection
+from bench_projection import make_graph
+
+WRITES = 50
+
+def photo_meta() -> dict:
+    buffer = BytesIO()
+    Image.new("RGB", (32, 24), "teal").save(buffer, "PNG")
+    return photo_store.save_photo(buffer.getvalue())
+
+def full_copy(p: projection.Projection):
+    """Прежний copy(): каждая карта копируется целиком"""
+    return {name: dict(getattr(p, name).items()) for name in p._MAPS}
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print(f"{'asanas':>8} {'apply, ms':>10} {'copy, ms':>9} {'full copy, ms':>14}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            config.OWL_FILE_PATH = os.path.join(tmp, "ontology.owl")
+            config.OWL_JOURNAL_PATH = os.path.join(tmp, "ontology.owl.journal")
+            config.OWL_SNAPSHOT_PATH = os.path.join(tmp, "ontology.owl.snapshot")
+            config.PHOTO_STORE_DIR = os.path.join(tmp, "photos")
+            # Контрольная точка (полная сериализация) в замер не входит
+            config.JOURNAL_CHECKPOINT_BYTES = 1 << 40
+            config.JOURNAL_CHECKPOINT_INTERVAL = 1e9
+            make_graph(size).serialize(destination=config.OWL_FILE_PATH, format="xml")
+            config.GRAPH_RELOAD_CHECK_INTERVAL = 0
+            current = projection.get_projection()
+            config.GRAPH_RELOAD_CHECK_INTERVAL = 3600
+            name_id, source_id, meta = next(iter(current.names)), next(iter(current.sources)), photo_meta()
+
+            applied = []
+            def timed_apply(old_version, new_version, records):
+                started = time.perf_counter()
+                projection._apply_commit(old_version, new_version, records)
+                applied.append(time.perf_counter() - started)
+            graph_store._commit_listeners[:] = [timed_apply]
+            try:
+                for _ in range(WRITES):
+                    ontology.add_asana(name_id, source_id, meta)
+            finally:
+                graph_store._commit_listeners[:] = [projection._apply_commit]
+
+            p = projection.get_projection()
+            copy_ms = median_ms(lambda: p.copy(p.version), 200)
+            full_copy_ms = median_ms(lambda: full_copy(p), 5)
+            print(f"{size:>8} {statistics.median(applied) * 1000:>10.3f} {copy_ms:>9.3f} {full_copy_ms:>14.2f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 30000])
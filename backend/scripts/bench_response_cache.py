@@ -0,0 +1,52 @@
+"""
+Стоимость ответа GET /asanas: прежний путь FastAPI (jsonable_encoder + json.dumps),
+сериализация orjson и отдача из кэша готовых ответов, плюс размер тела с gzip.
+
+Запуск из каталога backend:
+    python scripts/bench_response_cache.py 1000 10000
+"""
+import logging
+import json
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app import http_cache, paging, projection
+from bench_projection import make_graph
+
+def timed(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    print(f"{'asanas':>8} {'body, KB':>9} {'gzip, KB':>9} {'FastAPI, ms':>12} {'orjson, ms':>11} {'cache hit, ms':>14} {'same JSON':>10}")
+    for size in sizes:
+        p = projection._build(make_graph(size), (size,))
+        page = paging.paginate(p.sorted_asanas())
+        repeat = max(3, 20000 // size)
+
+        fastapi_time, response = timed(lambda: JSONResponse(jsonable_encoder(page)), repeat)
+        orjson_time, body = timed(lambda: http_cache.encode_json(page), repeat)
+        cache = http_cache.ResponseCache(256 * 1024 * 1024)
+        cache._version = (size,)
+        cache.put((size,), "/asanas?[]", http_cache._CachedBody(body))
+        hit_time, _ = timed(lambda: cache.get((size,), "/asanas?[]").body, repeat * 100)
+        gzipped = http_cache.gzip.compress(body, compresslevel=http_cache.GZIP_LEVEL)
+
+        same = json.loads(response.body) == json.loads(body)
+        print(f"{size:>8} {len(body) / 1024:>9.0f} {len(gzipped) / 1024:>9.0f} {fastapi_time * 1000:>12.1f} "
+              f"{orjson_time * 1000:>11.1f} {hit_time * 1000:>14.4f} {str(same):>10}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000])
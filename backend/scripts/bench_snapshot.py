@@ -0,0 +1,51 @@
+"""
+Время загрузки графа: разбор RDF/XML против бинарного снимка.
+
+"Холодный старт" — загрузка при существующем снимке; "после загрузки онтологии" —
+первый старт с новым файлом (разбор RDF/XML плюс запись снимка).
+
+Запуск из каталога backend:
+    python scripts/bench_snapshot.py 1000 10000 100000
+"""
+import logging
+import tempfile
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from rdflib import Graph
+from app import snapshot
+from bench_projection import make_graph
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    print(f"{'asanas':>8} {'triples':>9} {'owl, KB':>9} {'snapshot, KB':>13} {'RDF/XML, ms':>12} {'after upload, ms':>17} {'snapshot, ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        owl_path = os.path.join(tmp, "ontology.owl")
+        snapshot_path = os.path.join(tmp, "ontology.owl.snapshot")
+        for size in sizes:
+            make_graph(size).serialize(destination=owl_path, format="xml")
+
+            started = time.perf_counter()
+            g = Graph()
+            g.parse(owl_path, format="xml")
+            parse_time = time.perf_counter() - started
+            snapshot.write_snapshot(g, snapshot_path, snapshot.file_hash(owl_path))
+            upload_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            loaded = snapshot.read_snapshot(snapshot_path, snapshot.file_hash(owl_path))
+            snapshot_time = time.perf_counter() - started
+            assert loaded is not None and len(loaded) == len(g)
+
+            print(f"{size:>8} {len(g):>9} {os.path.getsize(owl_path) // 1024:>9} {os.path.getsize(snapshot_path) // 1024:>13} "
+                  f"{parse_time * 1000:>12.0f} {upload_time * 1000:>17.0f} {snapshot_time * 1000:>13.0f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
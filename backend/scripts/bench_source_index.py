@@ -0,0 +1,66 @@
+"""
+Асаны источника (/asanas/by-source/{id}): обратный индекс проекции источник -> асаны -> фото
+против прежнего обхода всех асан с фильтрацией фото, плюс сводка числа асан и фото по источникам.
+
+Онтология синтетическая (см. bench_projection.make_graph): на каждые 10 асан — один источник.
+
+Запуск из каталога backend:
+    python scripts/bench_source_index.py 3000 30000
+"""
+import tempfile
+import logging
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from app import config, ontology
+from app.paging import asana_sort_key
+from app.projection import get_projection
+from bench_projection import make_graph
+
+def linear_scan(source_id: str):
+    """Прежняя реализация get_asanas_by_source: все асаны, фото каждой фильтруются по источнику"""
+    projection = get_projection()
+    asanas = []
+    for asana in projection.asanas.values():
+        if not projection.asana_name.get(asana["id"]):
+            continue
+        photos = [photo for photo in asana["photos"] if photo["source"] == source_id]
+        if photos:
+            asanas.append({"id": asana["id"], "name": asana["name"], "photos": photos, "photo": photos[0]["thumbnail_url"]})
+    asanas.sort(key=asana_sort_key)
+    return asanas
+
+def timed(fn, args):
+    started = time.perf_counter()
+    results = [fn(arg) for arg in args]
+    return (time.perf_counter() - started) / len(args) * 1000, results
+
+def main(sizes):
+    logging.disable(logging.CRITICAL)
+    print(f"{'asanas':>8} {'sources':>8} {'index, ms':>10} {'scan, ms':>9} {'counts, ms':>11} {'same':>6}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            config.OWL_FILE_PATH = os.path.join(tmp, "ontology.owl")
+            config.OWL_JOURNAL_PATH = os.path.join(tmp, "ontology.owl.journal")
+            config.OWL_SNAPSHOT_PATH = os.path.join(tmp, "ontology.owl.snapshot")
+            make_graph(size).serialize(destination=config.OWL_FILE_PATH, format="xml")
+            # Новый файл подхватывается проверкой внешних изменений; на время замеров она не нужна
+            config.GRAPH_RELOAD_CHECK_INTERVAL = 0
+            sources = list(get_projection().sources)[:50]
+            config.GRAPH_RELOAD_CHECK_INTERVAL = 3600
+
+            index_time, indexed = timed(ontology.get_asanas_by_source, sources)
+            scan_time, scanned = timed(linear_scan, sources)
+            counts_time, _ = timed(lambda _: ontology.get_source_counts(), range(20))
+            print(f"{size:>8} {len(get_projection().sources):>8} {index_time:>10.3f} {scan_time:>9.2f} "
+                  f"{counts_time:>11.2f} {str(indexed == scanned):>6}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [3000, 30000])
@@ -0,0 +1,104 @@
+"""
+Проверка поиска асан (триграммный индекс + пакетная оценка rapidfuzz): совпадение top-k с полным перебором
+на эталонном наборе запросов и время ответа при росте каталога.
+
+Запуск из каталога backend:
+    python scripts/check_search.py 1000 10000 50000
+"""
+import logging
+import random
+import sys
+import time
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в бенчмарке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "bench")
+
+from rapidfuzz import fuzz
+from app import collation, text_search
+from app.projection import Projection
+
+TOP_K = 10
+
+PREFIXES = ["Поза", "ПОЗА", "Асана", "Упражнение"]
+ADJECTIVES = ["вытянутого", "перевернутого", "сидячего", "стоячего", "боковой", "скрученной", "полной", "половинной", "спящего", "героического"]
+NOUNS = ["треугольника", "героя", "колеса", "горы", "дерева", "воина", "лотоса", "голубя", "орла", "кобры", "лука", "моста", "журавля", "черепахи", "ёлки"]
+SANSKRIT = ["тада", "врикша", "вирабхадра", "трикона", "падма", "бхуджанга", "дхану", "сету бандха", "бака", "курма", "гаруда", "капота", "уттана", "паривритта", "ардха"]
+
+GOLDEN_QUERIES = [
+    "поза", "тада", "тадасана", "врикшасана", "треуг", "треугольник", "трекгольника", "героя", "гироя",
+    "колесо", "поза колеса", "поза калеса", "лотос", "бхуджанг", "бхужангасана", "ёлки", "елки",
+    "вирабхадрасана", "вирабадрасана", "сету", "сетубандха", "ардха", "паривритта триконасана", "кобра", "журавль"
+]
+
+def make_names(count: int, rng: random.Random):
+    names = []
+    for i in range(count):
+        if i % 2:
+            names.append(f"{rng.choice(PREFIXES)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}")
+        else:
+            names.append(f"{rng.choice(SANSKRIT)}{rng.choice(SANSKRIT)}асана {i}")
+    return names
+
+def typo(query: str, rng: random.Random) -> str:
+    if len(query) < 5:
+        return query
+    i = rng.randrange(1, len(query) - 1)
+    return query[:i] + rng.choice("абвгдеклмнопрст") + query[i + 1:]
+
+def score(query: str, name: str, threshold: float = 0.7):
+    """Та же оценка, что в ontology.search_asanas_by_name"""
+    query, name = query.lower(), name.lower()
+    if query in name:
+        return 1.0
+    match_score = max(fuzz.ratio(query, name), fuzz.partial_ratio(query, name)) / 100.0
+    return match_score if match_score >= threshold else None
+
+def top_k(query: str, ids, names):
+    """Эталон: прежний перебор всех названий по одному"""
+    results = []
+    for asana_id in ids:
+        match_score = score(query, names[asana_id])
+        if match_score is not None:
+            results.append((-match_score, collation.sort_key(names[asana_id]), asana_id))
+    results.sort()
+    return [(asana_id, -neg_score) for neg_score, _, asana_id in results[:TOP_K]]
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    rng = random.Random(42)
+    print(f"{'asanas':>8} {'queries':>8} {'top-k equal':>12} {'scan, ms/q':>11} {'index, ms/q':>12} {'candidates/q':>13}")
+    for size in sizes:
+        names = {f"asana_{i}": name for i, name in enumerate(make_names(size, rng))}
+        p = Projection(None)
+        for asana_id, name in names.items():
+            p.index_name(asana_id, name)
+        queries = GOLDEN_QUERIES + [typo(name.rsplit(" ", 1)[0], rng) for name in rng.sample(list(names.values()), 25)]
+
+        equal = candidate_total = 0
+        scan_time = index_time = 0.0
+        for query in queries:
+            started = time.perf_counter()
+            expected = top_k(query, names.keys(), names)
+            scan_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            candidate_ids = text_search.candidates(p.trigrams, p.indexed_names.keys(), query)
+            scores = text_search.score_names(query.lower(), {i: p.search_names[i] for i in candidate_ids}, 0.7, TOP_K)
+            scores.sort(key=lambda item: (-item[1], collation.sort_key(names[item[0]])))
+            actual = scores[:TOP_K]
+            index_time += time.perf_counter() - started
+            candidate_total += len(candidate_ids)
+
+            if actual == expected:
+                equal += 1
+            else:
+                print(f"  mismatch for {query!r}: expected {expected[:3]}..., got {actual[:3]}...")
+        print(f"{size:>8} {len(queries):>8} {equal:>12} {scan_time / len(queries) * 1000:>11.2f} "
+              f"{index_time / len(queries) * 1000:>12.2f} {candidate_total // len(queries):>13}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000])
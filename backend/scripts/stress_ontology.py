@@ -0,0 +1,174 @@
+"""
+Нагрузочная проверка конкурентной работы с онтологией: параллельные писатели и читатели
+на копии онтологии во временном каталоге.
+
+Проверяется, что ни одно чтение не падает (читатели обходят проекцию, пока писатели
+ее обновляют), ни одна запись не теряется — ни в памяти, ни после перечитывания с диска —
+и что частые контрольные точки не оставляют недописанных файлов. Перед этим асаны
+одного источника добавляются и удаляются по очереди: проекция после каждой записи
+должна обновиться инкрементно (без ошибок в обработчиках записей) и совпасть с полной сборкой.
+
+Запуск из каталога backend:
+    python scripts/stress_ontology.py [писателей] [записей на писателя] [читателей]
+    ONTOLOGY_STORAGE=sqlite python scripts/stress_ontology.py
+"""
+import contextlib
+import threading
+import tempfile
+import logging
+import shutil
+import random
+import sys
+import time
+import io
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config требует настройки базы при импорте; сама база в проверке не используется
+for variable in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(variable, "stress")
+
+from PIL import Image
+from app import config, graph_store, ontology, projection
+
+BASE_OWL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ontology_updated.owl")
+LETTERS = "АБВГДЕЁЖЗИКЛМНОПРСТУ"
+
+def make_photo(seed: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (seed % 256, seed // 256 % 256, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def configure(tmp: str):
+    config.OWL_FILE_PATH = os.path.join(tmp, "ontology.owl")
+    config.OWL_JOURNAL_PATH = os.path.join(tmp, "ontology.owl.journal")
+    config.OWL_SNAPSHOT_PATH = os.path.join(tmp, "ontology.owl.snapshot")
+    config.ONTOLOGY_SQLITE_PATH = os.path.join(tmp, "ontology.sqlite3")
+    config.PHOTO_STORE_DIR = os.path.join(tmp, "photos")
+    # Маленький порог журнала: контрольные точки идут вперемешку с записями и чтениями
+    config.JOURNAL_CHECKPOINT_BYTES = 16 * 1024
+    shutil.copyfile(BASE_OWL, config.OWL_FILE_PATH)
+
+def track_listener_failures(errors: list):
+    """Исключение в обработчике записи (инкрементное обновление проекции) — ошибка проверки"""
+    def wrap(listener):
+        def wrapped(*args):
+            try:
+                listener(*args)
+            except Exception as e:
+                errors.append(f"commit listener {listener.__name__}: {e!r}")
+                raise
+        return wrapped
+    graph_store._commit_listeners[:] = [wrap(listener) for listener in graph_store._commit_listeners]
+
+def check_projection(label: str, errors: list):
+    """Проекция обновлена записью (не требует пересборки) и совпадает с полной сборкой графа"""
+    current = projection._current
+    version = graph_store.get_graph_version()
+    if current is None or current.version != version:
+        errors.append(f"{label}: projection was not updated incrementally")
+        return
+    full = projection._build(graph_store.get_graph(), version)
+    for name in projection.Projection._MAPS:
+        if getattr(current, name) != getattr(full, name):
+            errors.append(f"{label}: projection index {name} differs from full build")
+
+def shared_source_scenario(errors: list):
+    """Вторая асана источника, еще одно фото из него и удаление асаны: связи источника пересобираются"""
+    source_id = ontology.add_source({"title": "Общий", "author": "Тест", "year": 2024})
+    name_id = ontology.add_asana_name({"name_ru": "Тадасана"})
+    ontology.load_asanas()
+    first = ontology.add_asana(name_id, source_id, make_photo(100001))
+    check_projection("first asana of source", errors)
+    second = ontology.add_asana(name_id, source_id, make_photo(100002))
+    check_projection("second asana of source", errors)
+    ontology.add_photo_to_asana(first, make_photo(100003), source_id)
+    check_projection("photo from the same source", errors)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ontology.delete_asana_from_ontology(second)
+    check_projection("delete asana", errors)
+    if [asana["id"] for asana in ontology.get_asanas_by_source(source_id)] != [first]:
+        errors.append("get_asanas_by_source: wrong asanas after delete")
+
+def counts():
+    return len(ontology.load_asanas()), len(ontology.load_sources()), len(ontology.load_asana_names())
+
+def main(writers: int, writes: int, readers: int):
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(tmp)
+        errors, created = [], []
+        track_listener_failures(errors)
+        shared_source_scenario(errors)
+        source_id = ontology.add_source({"title": "Стресс", "author": "Тест", "year": 2024})
+        asanas_before, sources_before, names_before = counts()
+
+        stop = threading.Event()
+        read_count = [0] * readers
+
+        def writer(number: int):
+            rng = random.Random(number)
+            try:
+                for i in range(writes):
+                    name_id = ontology.add_asana_name({"name_ru": f"{rng.choice(LETTERS)}оза {number}-{i}"})
+                    asana_id = ontology.add_asana(name_id, source_id, make_photo(number * writes + i))
+                    if i % 5 == 0:
+                        ontology.add_source({"title": f"Источник {number}-{i}", "author": "Тест", "year": 2000 + i})
+                    created.append((name_id, asana_id))
+            except Exception as e:
+                errors.append(f"writer {number}: {e!r}")
+
+        def reader(number: int):
+            rng = random.Random(1000 + number)
+            try:
+                while not stop.is_set():
+                    asanas = ontology.load_asanas()
+                    if any(asana["name"] is None for asana in asanas):
+                        raise AssertionError("asana without name record")
+                    ontology.search_asanas_by_name(f"оза {rng.randrange(writers)}", limit=10)
+                    letter = rng.choice(LETTERS)
+                    by_letter = ontology.get_asanas_by_first_letter(letter)
+                    if any(not asana["name"]["name_ru"].upper().startswith(letter) for asana in by_letter):
+                        raise AssertionError(f"wrong asana under letter {letter}")
+                    ontology.get_alphabet()
+                    read_count[number] += 1
+            except Exception as e:
+                errors.append(f"reader {number}: {e!r}")
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        write_threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        started = time.perf_counter()
+        for thread in threads + write_threads:
+            thread.start()
+        for thread in write_threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        expected = (asanas_before + writers * writes,
+                    sources_before + writers * len(range(0, writes, 5)),
+                    names_before + writers * writes)
+        in_memory = counts()
+        # Сбрасываем граф процесса и читаем онтологию заново: все записи должны быть на диске
+        graph_store._graph = None
+        graph_store._file_signature = None
+        projection._current = None
+        on_disk = counts()
+        asana_ids = {asana["id"] for asana in ontology.load_asanas()}
+        missing = [asana_id for _, asana_id in created if asana_id not in asana_ids]
+
+        print(f"storage={config.ONTOLOGY_STORAGE} writers={writers} writes/writer={writes} readers={readers}")
+        print(f"writes: {len(created) * 2 + writers * len(range(0, writes, 5))} in {elapsed:.2f} s, reads: {sum(read_count)}")
+        print(f"(asanas, sources, names) expected={expected} in memory={in_memory} after reload={on_disk}")
+        for error in errors[:10]:
+            print(f"  {error}")
+        ok = not errors and not missing and in_memory == expected and on_disk == expected
+        print("OK" if ok else f"FAILED: {len(errors)} errors, {len(missing)} asanas missing")
+        return 0 if ok else 1
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(main(*(args + [8, 25, 4][len(args):])))
@@ -1,7 +1,9 @@
 import httpx
 import os
+import json
 import logging
-from typing import Optional, Dict, List, Any
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Dict, List, Any
 import asyncio
 from urllib.parse import quote
 
@@ -20,24 +22,46 @@ logger.info(f"Using backend URL: {BACKEND_URL}")
 MAX_RETRIES = 3
 RETRY_DELAY = 1  # секунды
 
+# Ответы GET с ETag: при повторном запросе бэкенд отвечает 304, если данные не изменились,
+# и тело берется отсюда. Храним байты, чтобы каждый вызов получал собственную копию данных.
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "256"))
+_etag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def _etag_cache_key(url: str, headers: Optional[dict], params: Optional[dict]) -> tuple:
+    return (url, tuple(sorted((params or {}).items())), (headers or {}).get("Authorization"))
+
 async def make_request(method: str, url: str, headers: Optional[dict] = None, **kwargs):
     """Общая функция для выполнения HTTP запросов с повторными попытками"""
+    cache_key = _etag_cache_key(url, headers, kwargs.get("params")) if method == "GET" else None
+    cached = _etag_cache.get(cache_key) if cache_key else None
     for attempt in range(MAX_RETRIES):
         try:
             async with httpx.AsyncClient() as client:
+                request_headers = {**(headers or {}), "If-None-Match": cached[0]} if cached else headers
                 response = await client.request(
                     method,
                     url,
-                    headers=headers,
+                    headers=request_headers,
                     timeout=30.0,  # Увеличиваем таймаут
                     **kwargs
                 )
+                if cached and response.status_code == 304:
+                    _etag_cache.move_to_end(cache_key)
+                    return json.loads(cached[1])
                 response.raise_for_status()
+                etag = response.headers.get("etag")
+                if cache_key and etag:
+                    _etag_cache[cache_key] = (etag, response.content)
+                    _etag_cache.move_to_end(cache_key)
+                    while len(_etag_cache) > ETAG_CACHE_SIZE:
+                        _etag_cache.popitem(last=False)
                 return response.json()
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 401:  # Unauthorized
                 logger.error("Authentication error")
                 raise
+            if e.response.status_code == 404:  # Повтор не поможет
+                raise
             logger.warning(f"Request failed (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
             if attempt == MAX_RETRIES - 1:
                 raise
@@ -150,14 +174,23 @@ async def reset_password_confirm(code: str, new_password: str):
         logger.error(f"Password reset confirmation error: {str(e)}")
         raise
 
-async def get_asanas(token: Optional[str] = None):
-    logger.info("Fetching asanas list")
+def page_params(limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[str] = None,
+                include_photos: Optional[str] = None) -> dict:
+    """Параметры постраничного списка асан; пустые не передаются"""
+    params = {"limit": limit, "cursor": cursor, "fields": fields, "include_photos": include_photos}
+    return {key: value for key, value in params.items() if value is not None}
+
+async def get_asanas(token: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                     fields: Optional[str] = None, include_photos: Optional[str] = None):
+    """Страница каталога: {"items", "total", "next_cursor", "limit"}"""
+    logger.info(f"Fetching asanas page: limit={limit}, cursor={cursor}")
     try:
         headers = {"Authorization": f"Bearer {token}"} if token else {}
         response = await make_request(
             "GET",
             f"{BACKEND_URL}/asanas",
-            headers=headers
+            headers=headers,
+            params=page_params(limit, cursor, fields, include_photos)
         )
         logger.info(f"Successfully fetched asanas")
         return response
@@ -165,14 +198,37 @@ async def get_asanas(token: Optional[str] = None):
         logger.error(f"Error fetching asanas: {str(e)}")
         raise
 
-async def get_asanas_by_letter(letter: str, token: Optional[str] = None):
+async def get_asana(asana_id: str, token: Optional[str] = None, include_photos: Optional[str] = None):
+    """Одна асана по короткому ID или полному URI; None — асана не найдена"""
+    logger.info(f"Fetching asana: {asana_id}")
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return await make_request(
+            "GET",
+            f"{BACKEND_URL}/asanas/{quote(asana_id, safe='')}",
+            headers=headers,
+            params=page_params(None, None, None, include_photos)
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            logger.info(f"Asana not found: {asana_id}")
+            return None
+        logger.error(f"Error fetching asana {asana_id}: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching asana {asana_id}: {str(e)}")
+        raise
+
+async def get_asanas_by_letter(letter: str, token: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                               fields: Optional[str] = None, include_photos: Optional[str] = None):
     logger.info(f"Fetching asanas starting with letter: {letter}")
     try:
         headers = {"Authorization": f"Bearer {token}"} if token else {}
         response = await make_request(
             "GET",
             f"{BACKEND_URL}/asanas/by-letter/{letter}",
-            headers=headers
+            headers=headers,
+            params=page_params(limit, cursor, fields, include_photos)
         )
         logger.info(f"Successfully fetched asanas for letter: {letter}")
         return response
@@ -180,14 +236,31 @@ async def get_asanas_by_letter(letter: str, token: Optional[str] = None):
         logger.error(f"Error fetching asanas by letter: {str(e)}")
         raise
 
-async def get_asanas_by_source(source_id: str, token: Optional[str] = None):
+async def get_alphabet(token: Optional[str] = None):
+    logger.info("Fetching asana alphabet")
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = await make_request(
+            "GET",
+            f"{BACKEND_URL}/asanas/alphabet",
+            headers=headers
+        )
+        logger.info("Successfully fetched asana alphabet")
+        return response
+    except Exception as e:
+        logger.error(f"Error fetching asana alphabet: {str(e)}")
+        raise
+
+async def get_asanas_by_source(source_id: str, token: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                               fields: Optional[str] = None, include_photos: Optional[str] = None):
     logger.info(f"Fetching asanas for source: {source_id}")
     try:
         headers = {"Authorization": f"Bearer {token}"} if token else {}
         response = await make_request(
             "GET",
             f"{BACKEND_URL}/asanas/by-source/{source_id}",
-            headers=headers
+            headers=headers,
+            params=page_params(limit, cursor, fields, include_photos)
         )
         logger.info(f"Successfully fetched asanas for source: {source_id}")
         return response
@@ -195,13 +268,14 @@ async def get_asanas_by_source(source_id: str, token: Optional[str] = None):
         logger.error(f"Error fetching asanas by source: {str(e)}")
         raise
 
-async def search_asanas(query: str, fuzzy: bool = True, token: Optional[str] = None):
+async def search_asanas(query: str, fuzzy: bool = True, token: Optional[str] = None, limit: Optional[int] = None):
     logger.info(f"Searching asanas with query: {query}, fuzzy: {fuzzy}")
     try:
         headers = {"Authorization": f"Bearer {token}"} if token else {}
+        limit_param = f"&limit={limit}" if limit else ""
         response = await make_request(
             "GET",
-            f"{BACKEND_URL}/asanas/search?query={quote(query)}&fuzzy={str(fuzzy).lower()}",
+            f"{BACKEND_URL}/asanas/search?query={quote(query)}&fuzzy={str(fuzzy).lower()}{limit_param}",
             headers=headers
         )
         logger.info(f"Successfully searched asanas with query: {query}")
@@ -282,22 +356,55 @@ async def get_sources(token: Optional[str] = None):
         raise
 
 async def get_source(source_id: str, token: Optional[str] = None):
-    """Получение информации об отдельном источнике"""
+    """Получение информации об отдельном источнике; None — источник не найден"""
     logger.info(f"Fetching source info for ID: {source_id}")
     try:
-        # Сначала получаем все источники
-        sources = await get_sources(token)
-        # Ищем нужный источник по ID
-        for source in sources:
-            if source['id'].split('#')[-1].replace('source_', '') == source_id:
-                logger.info(f"Successfully found source: {source_id}")
-                return source
-        logger.warning(f"Source not found: {source_id}")
-        return None
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return await make_request(
+            "GET",
+            f"{BACKEND_URL}/sources/{quote(source_id, safe='')}",
+            headers=headers
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            logger.warning(f"Source not found: {source_id}")
+            return None
+        logger.error(f"Error fetching source: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Error fetching source: {str(e)}")
         raise
 
+async def get_source_counts(token: Optional[str] = None):
+    """Число асан и фото в каждом источнике: {id источника: {"asanas", "photos"}}"""
+    logger.info("Fetching source counts")
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return await make_request(
+            "GET",
+            f"{BACKEND_URL}/sources/counts",
+            headers=headers
+        )
+    except Exception as e:
+        logger.error(f"Error fetching source counts: {str(e)}")
+        raise
+
+async def search_sources(query: str, token: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Поиск источников по началу слов: {"items", "total", "next_cursor", "limit"}"""
+    logger.info(f"Searching sources with query: {query}")
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        params = {key: value for key, value in {"q": query, "limit": limit, "cursor": cursor}.items() if value is not None}
+        return await make_request(
+            "GET",
+            f"{BACKEND_URL}/sources/search",
+            headers=headers,
+            params=params
+        )
+    except Exception as e:
+        logger.error(f"Error searching sources: {str(e)}")
+        raise
+
 async def get_names(token: Optional[str] = None):
     logger.info("Fetching asana names list")
     try:
@@ -355,10 +462,11 @@ async def delete_asana(asana_id: str, token: str):
         logger.error(f"Error deleting asana: {str(e)}")
         raise
 
-async def add_asana_photo(asana_id: str, photo: bytes, source_id: str, token: str):
-    logger.info(f"Добавление дополнительного фото для асаны: {asana_id}")
+async def add_asana_photo(asana_id: str, photos: List[BinaryIO], source_id: str, token: str):
+    logger.info(f"Добавление дополнительных фото для асаны: {asana_id}")
     headers = {"Authorization": f"Bearer {token}"}
-    files = {"photo": ("photo.jpg", photo, "image/jpeg")}
+    # Бэкенд принимает список фото в поле photos
+    files = [("photos", ("photo.jpg", photo, "image/jpeg")) for photo in photos]
     data = {"source_id": source_id}
     
     async with httpx.AsyncClient() as client:
@@ -371,6 +479,48 @@ async def add_asana_photo(asana_id: str, photo: bytes, source_id: str, token: st
         response.raise_for_status()
         return response.json()
 
+# Заголовки, которые прокси фото передает бэкенду (условные запросы и диапазоны) и обратно клиенту
+PHOTO_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+PHOTO_RESPONSE_HEADERS = ("content-type", "content-length", "content-range", "accept-ranges",
+                          "etag", "last-modified", "cache-control")
+
+async def open_photo(photo_hash: str, variant: Optional[str] = None, headers: Optional[dict] = None):
+    """
+    Потоковый ответ бэкенда с фото (или его копией thumb/medium) без чтения тела в память.
+    Возвращает (response, close): тело читается через response.aiter_raw(), затем вызывается await close().
+    """
+    logger.info(f"Fetching photo: {photo_hash}, variant: {variant}")
+    variant_path = f"/{quote(variant)}" if variant else ""
+    client = httpx.AsyncClient(timeout=30.0)
+    try:
+        request = client.build_request("GET", f"{BACKEND_URL}/photos/{quote(photo_hash)}{variant_path}", headers=headers)
+        response = await client.send(request, stream=True)
+    except Exception:
+        await client.aclose()
+        raise
+
+    async def close():
+        await response.aclose()
+        await client.aclose()
+
+    return response, close
+
+async def get_asana_photo_by_source(asana_id: str, source_id: str, token: Optional[str] = None):
+    """Метаданные фото асаны из источника (hash, url, thumbnail_url, ...) или None, если фото нет"""
+    logger.info(f"Fetching photo of asana {asana_id} from source {source_id}")
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = await make_request(
+            "GET",
+            # Короткие id: в полном URI есть "/", а эти id — сегменты пути
+            f"{BACKEND_URL}/asana/{quote(asana_id.rsplit('#', 1)[-1])}/photo-by-source/{quote(source_id.rsplit('#', 1)[-1])}",
+            headers=headers
+        )
+        return response["photo"]
+    except Exception as e:
+        logger.error(f"Error fetching photo of asana {asana_id} from source {source_id}: {str(e)}")
+        raise
+
 async def get_about_project():
     logger.info("Fetching about project info")
     try:
@@ -1,11 +1,13 @@
 from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException, Cookie, Response, Body, Query
-from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from typing import Optional
 from app import api_client
 import logging
 import time
+import asyncio
 from jose import jwt
 import os
 import datetime
@@ -274,27 +276,47 @@ async def logout(request: Request):
     await remove_token(response)
     return response
 
+# Асан на странице списка; карточкам нужны только id, название и первое фото
+ASANA_PAGE_SIZE = 60
+ASANA_CARD_FIELDS = "id,name,photo"
+
+def group_by_first_letter(asanas: list) -> dict:
+    """Группирует асаны по первой букве, сохраняя порядок каталога из бэкенда"""
+    grouped_asanas = {}
+    for asana in asanas:
+        first_letter = asana['name']['name_ru'][0].upper() if asana['name']['name_ru'] else "?"
+        grouped_asanas.setdefault(first_letter, []).append(asana)
+    return grouped_asanas
+
+def page_context(page: dict, page_url: str, cursor: Optional[str]) -> dict:
+    """Переменные шаблона pagination.html"""
+    return {
+        "page_url": page_url,
+        "cursor": cursor,
+        "next_cursor": page.get("next_cursor"),
+        "total": page.get("total", 0),
+        "shown": len(page.get("items", []))
+    }
+
 @app.get("/asanas", response_class=HTMLResponse)
-async def asanas_list(request: Request):
+async def asanas_list(request: Request, cursor: Optional[str] = None):
     try:
         token = await get_token_for_api(request)
         user_role = await get_user_role(request)
         is_admin = user_role == "admin"
         is_expert_or_admin = user_role in ["admin", "expert"]
         is_authenticated = token is not None
-        asanas = await api_client.get_asanas(token)
-        grouped_asanas = {}
-        for asana in asanas:
-            first_letter = asana['name']['name_ru'][0].upper() if asana['name']['name_ru'] else "?"
-            if first_letter not in grouped_asanas:
-                grouped_asanas[first_letter] = []
-            grouped_asanas[first_letter].append(asana)
-        sorted_groups = sorted(grouped_asanas.items())
-        alphabet = sorted(grouped_asanas.keys())
+        page = await api_client.get_asanas(token, limit=ASANA_PAGE_SIZE, cursor=cursor,
+                                           fields=ASANA_CARD_FIELDS, include_photos="none")
+        grouped_asanas = group_by_first_letter(page["items"])
+        # Панель алфавита строится по всему каталогу, а не по текущей странице
+        letters = await api_client.get_alphabet(token)
         return templates.TemplateResponse("asana_list.html", {
             "request": request, 
-            "grouped_asanas": sorted_groups,
-            "alphabet": alphabet,
+            "grouped_asanas": list(grouped_asanas.items()),
+            "alphabet": [item['letter'] for item in letters],
+            "alphabet_counts": {item['letter']: item['count'] for item in letters},
+            **page_context(page, "/asanas", cursor),
             "is_admin": is_admin,
             "is_expert_or_admin": is_expert_or_admin,
             "is_authenticated": is_authenticated,
@@ -309,20 +331,24 @@ async def asanas_list(request: Request):
         })
 
 @app.get("/asanas/by-letter/{letter}", response_class=HTMLResponse)
-async def asanas_by_letter(request: Request, letter: str):
+async def asanas_by_letter(request: Request, letter: str, cursor: Optional[str] = None):
     try:
         token = await get_token_for_api(request)
         user_role = await get_user_role(request)
         is_admin = user_role == "admin"
         is_expert_or_admin = user_role in ["admin", "expert"]
         is_authenticated = token is not None
-        asanas = await api_client.get_asanas_by_letter(letter, token)
-        all_asanas = await api_client.get_asanas(token)
-        alphabet = sorted(set(asana['name']['name_ru'][0].upper() for asana in all_asanas if asana['name']['name_ru']))
+        page = await api_client.get_asanas_by_letter(letter, token, limit=ASANA_PAGE_SIZE, cursor=cursor,
+                                                     fields=ASANA_CARD_FIELDS, include_photos="none")
+        # Для панели алфавита достаточно букв с количеством асан, весь каталог не нужен
+        letters = await api_client.get_alphabet(token)
+        alphabet = [item['letter'] for item in letters]
         return templates.TemplateResponse("asana_list.html", {
             "request": request, 
-            "asanas": asanas,
+            "asanas": page["items"],
             "alphabet": alphabet,
+            "alphabet_counts": {item['letter']: item['count'] for item in letters},
+            **page_context(page, f"/asanas/by-letter/{letter}", cursor),
             "current_letter": letter,
             "is_admin": is_admin,
             "is_expert_or_admin": is_expert_or_admin,
@@ -345,8 +371,10 @@ async def sources_list(request: Request):
         is_admin = user_role == "admin"
         is_expert_or_admin = user_role in ["admin", "expert"]
         is_authenticated = token is not None
-        sources = await api_client.get_sources(token)
+        sources, counts = await asyncio.gather(api_client.get_sources(token), api_client.get_source_counts(token))
         sources.sort(key=lambda s: s.get('author', '').lower())
+        for source in sources:
+            source["counts"] = counts.get(source["id"], {"asanas": 0, "photos": 0})
         return templates.TemplateResponse("sources.html", {
             "request": request,
             "sources": sources,
@@ -571,16 +599,12 @@ async def asana_detail(request: Request, asana_id: str):
         is_expert_or_admin = user_role in ["admin", "expert"]
         is_authenticated = token is not None
             
-        logger.info("FRONTEND: Получаем список всех асан...")
-        asanas = await api_client.get_asanas(token)
-        
         # Добавляем префикс asana_ если его нет
         if not asana_id.startswith('asana_'):
             asana_id = f"asana_{asana_id}"
         
-        # Формируем полный URI для сравнения
-        full_uri = f"http://www.semanticweb.org/platinum_watermelon/ontologies/Asana#{asana_id}"
-        asana = next((a for a in asanas if a.get('id') == full_uri), None)
+        logger.info("FRONTEND: Получаем асану по ID...")
+        asana = await api_client.get_asana(asana_id, token)
         
         if not asana:
             logger.error(f"FRONTEND: Асана не найдена: {asana_id}")
@@ -634,18 +658,20 @@ async def add_asana_photo(request: Request, asana_id: str):
     
     try:
         form = await request.form()
-        photo = form.get("photo")
+        # Страница асаны отправляет одно или несколько фото в поле photos
+        photos = form.getlist("photos")
         source_id = form.get("source_id")
         
-        if not photo or not source_id:
+        if not photos or not source_id:
             return JSONResponse(
                 status_code=400,
                 content={"detail": "Photo and source are required"}
             )
         
-        photo_bytes = await photo.read()
-        result = await api_client.add_asana_photo(asana_id, photo_bytes, source_id, token)
-        return JSONResponse(content={"success": True})
+        # Файл формы уже лежит во временном файле: передаем его бэкенду потоком, не читая в память
+        result = await api_client.add_asana_photo(asana_id, [photo.file for photo in photos], source_id, token)
+        # Бэкенд сообщает о совпадениях с фото каталога (exact/near) — отдаем их странице
+        return JSONResponse(content={"success": True, "duplicates": result.get("duplicates", [])})
     except Exception as e:
         logger.error(f"Error adding asana photo: {str(e)}")
         return JSONResponse(
@@ -688,8 +714,30 @@ async def check_asana_photo(request: Request, asana_id: str, source_id: str):
         logger.error(f"Error checking asana photo: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+async def proxy_photo(request: Request, photo_hash: str, variant: Optional[str] = None):
+    """Потоковое проксирование фото с бэкенда: Range, ETag и Cache-Control проходят в обе стороны"""
+    forwarded = {name: value for name, value in request.headers.items() if name in api_client.PHOTO_REQUEST_HEADERS}
+    try:
+        response, close = await api_client.open_photo(photo_hash, variant, forwarded)
+    except Exception as e:
+        logger.error(f"Error loading photo {photo_hash} ({variant}): {str(e)}")
+        raise HTTPException(status_code=404, detail="Photo not found")
+    headers = {name: response.headers[name] for name in api_client.PHOTO_RESPONSE_HEADERS if name in response.headers}
+    return StreamingResponse(response.aiter_raw(), status_code=response.status_code, headers=headers,
+                             background=BackgroundTask(close))
+
+@app.get("/photos/{photo_hash}")
+async def photo(request: Request, photo_hash: str):
+    """Проксирование фото из хранилища бэкенда"""
+    return await proxy_photo(request, photo_hash)
+
+@app.get("/photos/{photo_hash}/{variant}")
+async def photo_variant(request: Request, photo_hash: str, variant: str):
+    """Проксирование копии фото (thumb, medium, original) из хранилища бэкенда"""
+    return await proxy_photo(request, photo_hash, variant)
+
 @app.get("/sources/{source_id}/asanas", response_class=HTMLResponse)
-async def source_asanas(request: Request, source_id: str):
+async def source_asanas(request: Request, source_id: str, cursor: Optional[str] = None):
     try:
         logger.info(f"FRONTEND: Получен запрос на просмотр асан источника: {source_id}")
         token = await get_token_for_api(request)
@@ -717,28 +765,24 @@ async def source_asanas(request: Request, source_id: str):
             })
             
         logger.info("FRONTEND: Получаем список асан источника...")
-        asanas = await api_client.get_asanas_by_source(short_source_id, token)
+        page = await api_client.get_asanas_by_source(short_source_id, token, limit=ASANA_PAGE_SIZE, cursor=cursor,
+                                                     fields=ASANA_CARD_FIELDS, include_photos="none")
+        asanas = page["items"]
         
         # Добавляем логирование для проверки данных
         logger.info(f"FRONTEND: Получено {len(asanas)} асан")
         for asana in asanas:
             logger.info(f"FRONTEND: Асана {asana['name']['name_ru']} имеет фото: {'photo' in asana and bool(asana['photo'])}")
         
-        grouped_asanas = {}
-        for asana in asanas:
-            first_letter = asana['name']['name_ru'][0].upper() if asana['name']['name_ru'] else "?"
-            if first_letter not in grouped_asanas:
-                grouped_asanas[first_letter] = []
-            grouped_asanas[first_letter].append(asana)
-        sorted_groups = dict(sorted(grouped_asanas.items()))
-        alphabet = sorted(grouped_asanas.keys())
+        grouped_asanas = group_by_first_letter(asanas)
         
-        logger.info(f"FRONTEND: Найдено {len(asanas)} асан для источника")
+        logger.info(f"FRONTEND: Найдено {page['total']} асан для источника")
         return templates.TemplateResponse("source_asanas.html", {
             "request": request,
             "source": source,
-            "grouped_asanas": sorted_groups,
-            "alphabet": alphabet,
+            "grouped_asanas": grouped_asanas,
+            "alphabet": list(grouped_asanas.keys()),
+            **page_context(page, f"/sources/{source_id}/asanas", cursor),
             "is_expert_or_admin": is_expert_or_admin,
             "is_admin": is_admin,
             "is_authenticated": is_authenticated,
@@ -753,11 +797,11 @@ async def source_asanas(request: Request, source_id: str):
         })
 
 @app.get("/api/asanas/search")
-async def api_search_asanas(request: Request, query: str, fuzzy: bool = True):
+async def api_search_asanas(request: Request, query: str, fuzzy: bool = True, limit: Optional[int] = None):
     """API endpoint для поиска асан"""
     try:
         token = await get_token_for_api(request)
-        results = await api_client.search_asanas(query, fuzzy, token)
+        results = await api_client.search_asanas(query, fuzzy, token, limit)
         return results
     except Exception as e:
         logger.error(f"Error searching asanas: {str(e)}")
@@ -785,18 +829,8 @@ async def api_search_sources(request: Request, query: str):
     """API endpoint для поиска источников"""
     try:
         token = await get_token_for_api(request)
-        sources = await api_client.get_sources(token)
-        
-        # Поиск по названию, автору и аннотации
-        query = query.lower()
-        results = []
-        for source in sources:
-            if (query in source.get("title", "").lower() or 
-                query in source.get("author", "").lower() or 
-                query in source.get("annotation", "").lower()):
-                results.append(source)
-        
-        return results
+        # Поиск по началу слов названия, автора и издательства по индексу бэкенда
+        return (await api_client.search_sources(query, token))["items"]
     except Exception as e:
         logger.error(f"Error searching sources: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -809,6 +843,7 @@ async def add_asana(request: Request):
             return JSONResponse(status_code=401, content={"detail": "Session expired. Please login again."})
 
         form = await request.form()
+        photo = form.get("photo")
         result = await api_client.add_asana(
             selected_name=form.get("selected_name"),
             selected_source=form.get("selected_source"),
@@ -822,7 +857,7 @@ async def add_asana(request: Request):
             new_source_publisher=form.get("new_source_publisher"),
             new_source_pages=int(form.get("new_source_pages")) if form.get("new_source_pages") else None,
             new_source_annotation=form.get("new_source_annotation"),
-            photo=await form.get("photo").read() if form.get("photo") else None,
+            photo=photo.file if photo and getattr(photo, "filename", None) else None,
             token=token
         )
         return JSONResponse(content=result)